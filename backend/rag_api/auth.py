@@ -38,6 +38,11 @@ class SimpleUser:
     def is_authenticated(self) -> bool:
         return True
 
+    @property
+    def pk(self) -> str:
+        # UserRateThrottle keys its cache on user.pk
+        return self.username
+
 
 def _decode_token(token: str) -> dict:
     return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -10,6 +10,7 @@ urlpatterns = [
     path("ingest", views.ingest, name="ingest"),
     path("ask", views.AskView.as_view(), name="ask"),
     path("ask/stream", views.AskStreamView.as_view(), name="ask_stream"),
+    path("related/<str:chunk_hash>", views.related, name="related"),
     path("upload", views.upload_file, name="upload"),
     path("uploads", views.list_docs, name="list_docs"),
     # auth
@@ -4,24 +4,22 @@ import json
 import logging
 import os
 import sqlite3
+import threading
 import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor
-from concurrent.futures import TimeoutError as FutureTimeout
-from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
-from asgiref.sync import async_to_sync
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from jose import JWTError, jwt
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from rest_framework.views import APIView
 
 logger = logging.getLogger("backend.rag_api.views")
 
@@ -30,26 +28,20 @@ _GLOBAL = {
     "embed": None,
     "store": None,
     "llm": None,
+    "retriever": None,
+    "retrieval_cache": None,
+    "semantic_cache": None,
+    "answer_cache": None,
+    "retrieve_flight": None,
+    "answer_flight": None,
+    "stream_flight": None,
 }
 _ASK_SEMAPHORE = asyncio.Semaphore(
     int((settings and getattr(settings, "ASK_MAX_CONCURRENCY", None)) or 32)
 )
 
-# Small thread pool for running blocking retrievals without blocking the async loop
-_RETRIEVAL_POOL = ThreadPoolExecutor(max_workers=8)
-
-
-@lru_cache(maxsize=1024)
-def _cached_retrieve_key(query: str, k: int, bm25_weight: float) -> str:
-    # produce a short hash key for caching
-    key = f"{query}::k={k}::bm25={bm25_weight}"
-    return hashlib.sha256(key.encode("utf-8")).hexdigest()
-
-
-def _cached_retrieve(query: str, retriever: object, k: int, bm25_weight: float):
-    """Run retriever.get_relevant with a short cache layer (keyed by query and params)."""
-    # LRU cache on function will handle actual caching; we simply call the retriever
-    return retriever.get_relevant(query)
+# Guards (re)building the shared Retriever (BM25 over the whole corpus)
+_RETRIEVER_LOCK = threading.Lock()
 
 
 # Ingest job tracking for async mode
@@ -70,8 +62,12 @@ def _ensure_components():
         sys.path.insert(0, str(ROOT))
     load_dotenv()
     from src.config import get_settings as get_src_settings
+    from src.rag.answer_cache import AnswerCache
     from src.rag.embeddings import OllamaEmbeddings
     from src.rag.llm import get_default_llm
+    from src.rag.retrieval_cache import RetrievalCache
+    from src.rag.semantic_cache import SemanticCache
+    from src.rag.singleflight import SingleFlight, StreamFlight
     from src.rag.vector_store import FaissStore
 
     # read project settings locally for initialization
@@ -82,174 +78,501 @@ def _ensure_components():
         _GLOBAL["store"] = FaissStore(s.vector_store_path, s.metadata_store_path, dim=None)
     if _GLOBAL["llm"] is None:
         _GLOBAL["llm"] = get_default_llm()
+        # the API is long-running: keep local models loaded between asks
+        if hasattr(_GLOBAL["llm"], "keep_warm"):
+            _GLOBAL["llm"].keep_warm()
+    if _GLOBAL["retrieval_cache"] is None:
+        _GLOBAL["retrieval_cache"] = RetrievalCache.from_env()
+    if _GLOBAL["semantic_cache"] is None:
+        _GLOBAL["semantic_cache"] = SemanticCache.from_env()
+    if _GLOBAL["answer_cache"] is None:
+        _GLOBAL["answer_cache"] = AnswerCache.from_env()
+    if _GLOBAL["retrieve_flight"] is None:
+        _GLOBAL["retrieve_flight"] = SingleFlight("retrieve")
+        _GLOBAL["answer_flight"] = SingleFlight("answer")
+        _GLOBAL["stream_flight"] = StreamFlight(
+            "answer_stream", buffer=int(os.environ.get("ASK_STREAM_QUEUE", "32"))
+        )
+
+
+def _get_retriever():
+    """Shared Retriever over the global store, rebuilt when the corpus grows.
+
+    Per-request ``top_k``/``bm25_weight`` are passed to ``aget_relevant`` so the BM25
+    index is built once per corpus instead of once per request.
+    """
+    store = _GLOBAL["store"]
+    retriever = _GLOBAL["retriever"]
+    if retriever is not None and retriever.store is store:
+        if len(retriever._bm25_docs) == len(store._metas):
+            return retriever
+    with _RETRIEVER_LOCK:
+        retriever = _GLOBAL["retriever"]
+        if (
+            retriever is None
+            or retriever.store is not store
+            or len(retriever._bm25_docs) != len(store._metas)
+        ):
+            from src.rag.retriever import Retriever
+
+            retriever = Retriever(store, _GLOBAL["embed"])
+            _GLOBAL["retriever"] = retriever
+        return retriever
 
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def health(request: HttpRequest):
-    return Response({"status": "ok", "backend": "django"})
+    payload = {"status": "ok", "backend": "django"}
+    if _GLOBAL["retrieval_cache"] is not None:
+        payload["retrieval_cache"] = _GLOBAL["retrieval_cache"].stats()
+    if _GLOBAL["answer_cache"] is not None:
+        payload["answer_cache"] = _GLOBAL["answer_cache"].stats()
+    if _GLOBAL["retrieve_flight"] is not None:
+        payload["singleflight"] = {
+            name: _GLOBAL[f"{name}_flight"].stats() for name in ("retrieve", "answer", "stream")
+        }
+    if hasattr(_GLOBAL["llm"], "stats"):
+        payload["llm"] = _GLOBAL["llm"].stats()
+    if _GLOBAL["llm"] is not None:
+        from src.rag.rate_limit import limiter_stats
 
+        payload["rate_limits"] = limiter_stats()
+    return Response(payload)
 
-@method_decorator(csrf_exempt, name="dispatch")
-class AskView(APIView):
-    permission_classes = [AllowAny]
 
-    def post(self, request, *args, **kwargs):
-        if request.method != "POST":
-            return Response({"error": "method not allowed"}, status=405)
-        try:
-            body = json.loads(request.body.decode("utf-8")) if request.body else {}
-        except Exception:
-            body = {}
-        question = body.get("question") or body.get("query") or ""
-        top_k = int(body.get("top_k") or 6)
-        bm25_weight = float(body.get("bm25_weight") or 0.35)
-        include_content = bool(body.get("include_content") or False)
-        if not question:
-            return Response({"error": "empty question"}, status=400)
+def _guard(request: HttpRequest, view) -> Optional[JsonResponse]:
+    """DRF authentication and throttling for plain async Django views.
 
-        # use async_to_sync to interact with async primitives in sync view
-        async_to_sync(_ASK_SEMAPHORE.acquire)()
-        try:
-            _ensure_components()
-            # import Retriever lazily after components ensured
-            from src.rag.retriever import Retriever
+    Runs the default authenticators (JWT) so ``request.user`` is what an APIView would
+    see, then the default throttles, which then apply the user rate to logged-in callers
+    and the per-IP anon rate to everyone else. Returns the error response, if any.
+    """
+    from rest_framework import exceptions
+    from rest_framework.request import Request
+    from rest_framework.settings import api_settings
 
-            retriever = Retriever(
-                _GLOBAL["store"], _GLOBAL["embed"], k=top_k, bm25_weight=bm25_weight
-            )
-            # if Retriever.get_relevant is async, call via async_to_sync; otherwise it's fine
-            try:
-                # Run retrieval in a thread to avoid blocking, with timeout
-                timeout_sec = int(os.environ.get("ASK_TIMEOUT", "10"))
-                if asyncio.iscoroutinefunction(retriever.get_relevant):
-                    # if async, run directly but guard with wait_for
-                    docs = async_to_sync(asyncio.wait_for)(
-                        retriever.get_relevant(question), timeout=timeout_sec
-                    )
-                else:
-                    future = _RETRIEVAL_POOL.submit(
-                        _cached_retrieve, question, retriever, top_k, bm25_weight
-                    )
-                    try:
-                        docs = future.result(timeout=timeout_sec)
-                    except FutureTimeout:
-                        future.cancel()
-                        raise TimeoutError(f"retriever timeout after {timeout_sec}s")
-            except Exception as e:
-                logger.error("retriever failed: %s", e, exc_info=True)
-                return Response({"error": "embed_error", "detail": str(e)}, status=502)
-            timeout_sec = int(os.environ.get("ASK_TIMEOUT", "60"))
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    drf_request = Request(request, authenticators=authenticators)
+    try:
+        drf_request.user  # authenticates, and sets request.user on the Django request
+    except exceptions.AuthenticationFailed as e:
+        # same status APIView would use: 401 only with a WWW-Authenticate challenge
+        challenge = authenticators[0].authenticate_header(request) if authenticators else None
+        return JsonResponse({"detail": str(e.detail)}, status=401 if challenge else 403)
+    if any(
+        not throttle().allow_request(request, view)
+        for throttle in api_settings.DEFAULT_THROTTLE_CLASSES
+    ):
+        return JsonResponse({"detail": "Request was throttled."}, status=429)
+    return None
+
+
+def _parse_ask_body(request: HttpRequest) -> dict:
+    try:
+        body = json.loads(request.body.decode("utf-8")) if request.body else {}
+    except Exception:
+        body = {}
+    fusion = body.get("fusion")
+    # Retrieval latency budget: clients may tighten, never extend, RETRIEVE_BUDGET_MS
+    budget_ms = float(os.environ.get("RETRIEVE_BUDGET_MS", "3000"))
+    try:
+        if body.get("budget_ms"):
+            budget_ms = min(budget_ms, max(float(body["budget_ms"]), 0.0))
+    except (TypeError, ValueError):
+        pass
+    return {
+        "question": body.get("question") or body.get("query") or "",
+        "top_k": int(body.get("top_k") or 6),
+        "bm25_weight": float(body.get("bm25_weight") or 0.35),
+        "include_content": bool(body.get("include_content") or False),
+        "filters": body.get("filters") if isinstance(body.get("filters"), dict) else None,
+        "fusion": str(fusion).lower() if fusion else None,
+        "budget": budget_ms / 1000 if budget_ms > 0 else None,
+    }
+
+
+def _invalid_fusion(fusion: Optional[str]) -> Optional[JsonResponse]:
+    from src.rag.fusion import METHODS
+
+    if fusion is None or fusion in METHODS:
+        return None
+    return JsonResponse(
+        {"error": "invalid fusion", "detail": f"expected one of {', '.join(METHODS)}"}, status=400
+    )
+
+
+def _context_items(docs, include_content: bool) -> list:
+    contexts = []
+    for d in docs:
+        item = {"score": d.get("score"), "source": d.get("source"), "hash": d.get("hash")}
+        if include_content and "content" in d:
+            c = d["content"]
+            if isinstance(c, str) and len(c) > 2000:
+                c = c[:2000] + "..."
+            item["content"] = c
+        contexts.append(item)
+    return contexts
+
+
+def _cached_retrieve_key(
+    query: str, k: int, bm25_weight: float, filters=None, fusion: Optional[str] = None
+) -> str:
+    from src.rag.retrieval_cache import make_key
+
+    store = _GLOBAL["store"]
+    return make_key(query, k, bm25_weight, filters, getattr(store, "generation", ""), fusion)
+
+
+async def _cached_retrieve(
+    question: str,
+    top_k: int,
+    bm25_weight: float,
+    filters=None,
+    fusion: Optional[str] = None,
+    budget: Optional[float] = None,
+):
+    """Retrieve contexts through the retrieval cache.
+
+    ``budget`` (seconds) is honored stage by stage by the retriever, which degrades to
+    BM25-only contexts rather than waiting on a slow embedding; degraded results are
+    not cached. ASK_TIMEOUT (default 10s) remains the hard ceiling.
+
+    On a miss, concurrent identical requests share one retrieval (the leader's budget
+    applies); only that retrieval takes an ask semaphore slot.
+    """
+    await sync_to_async(_ensure_components, thread_sensitive=False)()
+    cache = _GLOBAL["retrieval_cache"]
+    key = _cached_retrieve_key(question, top_k, bm25_weight, filters, fusion)
+    docs = await cache.aget(key)
+    if docs is not None:
+        return docs
+
+    async def retrieve():
+        retriever = await sync_to_async(_get_retriever, thread_sensitive=False)()
+        timeout_sec = int(os.environ.get("ASK_TIMEOUT", "10"))
+        async with _ASK_SEMAPHORE:
             try:
-                # await _GLOBAL["llm"].acomplete(...) in sync context
-                answer = async_to_sync(asyncio.wait_for)(
-                    _GLOBAL["llm"].acomplete(question, docs), timeout=timeout_sec
+                docs = await asyncio.wait_for(
+                    retriever.aget_relevant(
+                        question,
+                        k=top_k,
+                        bm25_weight=bm25_weight,
+                        filters=filters,
+                        fusion=fusion,
+                        budget=budget,
+                    ),
+                    timeout=timeout_sec,
                 )
-            except Exception as e:
-                return Response({"error": "llm_error", "detail": str(e)}, status=502)
-            contexts = []
-            for d in docs:
-                item = {"score": d.get("score"), "source": d.get("source"), "hash": d.get("hash")}
-                if include_content and "content" in d:
-                    c = d["content"]
-                    if isinstance(c, str) and len(c) > 2000:
-                        c = c[:2000] + "..."
-                    item["content"] = c
-                contexts.append(item)
-            return Response({"answer": answer, "contexts": contexts})
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"retriever timeout after {timeout_sec}s")
+        if not getattr(docs, "degraded", None):
+            await cache.aset(key, docs)
+        return docs
+
+    return await _GLOBAL["retrieve_flight"].do(key, retrieve)
+
+
+async def _semantic_vector(question: str, docs):
+    """Query vector for the semantic cache, or None when the cache should be skipped.
+
+    Only a vector the retriever already embedded is used: a retrieval-cache hit never
+    pays an embedding round trip just to probe the semantic cache.
+    """
+    semantic_cache = _GLOBAL["semantic_cache"]
+    # degraded retrieval means the embedding host is struggling: don't wait on it again
+    if semantic_cache is None or not semantic_cache.enabled or getattr(docs, "degraded", None):
+        return None
+    try:
+        retriever = await sync_to_async(_get_retriever, thread_sensitive=False)()
+        return retriever.cached_query_vector(question)
+    except Exception as e:
+        logger.warning("semantic cache lookup skipped: %s", e)
+        return None
+
+
+def _answer_key(question: str, hashes) -> str:
+    from src.rag.answer_cache import answer_key
+
+    return answer_key(_GLOBAL["llm"], question, hashes)
+
+
+def _answer_scope() -> str:
+    from src.rag.answer_cache import answer_scope
+
+    return answer_scope(_GLOBAL["llm"])
+
+
+async def _cached_answer(question: str, docs, hashes, key: str):
+    """Look ``question`` up in the exact answer cache, then the semantic cache.
+
+    Returns ``(answer, qvec)``; ``answer`` is None on a miss and ``qvec`` is what the
+    fresh answer is stored under in the semantic cache.
+    """
+    answer_cache = _GLOBAL["answer_cache"]
+    if answer_cache is not None and answer_cache.enabled:
+        cached = await answer_cache.aget(key)
+        if cached is not None:
+            return cached, None
+    qvec = await _semantic_vector(question, docs)
+    if qvec is not None:
+        cached = _GLOBAL["semantic_cache"].lookup(qvec, hashes, scope=_answer_scope())
+        if cached is not None:
+            return cached, qvec
+    return None, qvec
+
+
+async def _store_answer(key: str, qvec, hashes, answer: str) -> None:
+    answer_cache = _GLOBAL["answer_cache"]
+    if answer_cache is not None and answer_cache.enabled:
+        await answer_cache.aset(key, answer)
+    if qvec is not None:
+        _GLOBAL["semantic_cache"].add(qvec, hashes, answer, scope=_answer_scope())
+
+
+async def _answer(question: str, docs) -> str:
+    """LLM completion behind the exact answer cache and the semantic cache.
+
+    Concurrent identical asks (same question, contexts and model) share one completion.
+    """
+    hashes = [d.get("hash") for d in docs]
+    key = _answer_key(question, hashes)
+
+    async def complete() -> str:
+        cached, qvec = await _cached_answer(question, docs, hashes, key)
+        if cached is not None:
+            return cached
+        timeout_sec = int(os.environ.get("ASK_TIMEOUT", "60"))
+        async with _ASK_SEMAPHORE:
+            answer = await asyncio.wait_for(
+                _GLOBAL["llm"].acomplete(question, docs), timeout=timeout_sec
+            )
+        await _store_answer(key, qvec, hashes, answer)
+        return answer
+
+    return await _GLOBAL["answer_flight"].do(key, complete)
+
+
+async def _answer_stream(question: str, docs):
+    """Answer deltas from ``llm.astream``; cached answers are replayed as synthetic chunks.
+
+    Concurrent identical asks subscribe to one upstream stream, which holds the ask
+    semaphore while the LLM is generating.
+    """
+    hashes = [d.get("hash") for d in docs]
+    key = _answer_key(question, hashes)
+
+    async def upstream():
+        cached, qvec = await _cached_answer(question, docs, hashes, key)
+        if cached is not None:
+            size = max(int(os.environ.get("ANSWER_REPLAY_CHUNK", "64")), 1)
+            for i in range(0, len(cached), size):
+                yield cached[i : i + size]
+            return
+        parts = []
+        async with _ASK_SEMAPHORE:
+            async for delta in _GLOBAL["llm"].astream(question, docs):
+                parts.append(delta)
+                yield delta
+        # only complete answers are cached; a cancelled stream never gets here
+        if parts:
+            await _store_answer(key, qvec, hashes, "".join(parts))
+
+    subscription = _GLOBAL["stream_flight"].subscribe(key, upstream)
+    try:
+        async for delta in subscription:
+            yield delta
+    finally:
+        await subscription.aclose()
+
+
+def _sse(event: dict) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+_STREAM_DONE = object()
+
+
+async def _stream_events(question: str, docs, contexts_event: dict):
+    """SSE body for /ask/stream: contexts first, then answer deltas as the LLM emits them.
+
+    The LLM stream is read by a producer task into a bounded queue (ASK_STREAM_QUEUE), so
+    a slow client stops the upstream read instead of buffering the answer in memory; a
+    stream shared by identical asks runs at most ASK_STREAM_QUEUE deltas ahead of its
+    slowest subscriber (see ``StreamFlight``). A
+    ``: ping`` comment is sent after ASK_STREAM_PING_SECONDS without a delta to keep
+    proxies from closing the connection, ASK_TIMEOUT bounds the whole answer, and a
+    client disconnect cancels the producer (and, once no identical ask is still reading
+    it, the upstream request).
+    """
+    from src.logging_utils import emit_metric
+
+    t0 = time.perf_counter()
+    yield _sse(contexts_event)
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=int(os.environ.get("ASK_STREAM_QUEUE", "32")))
+    ping_sec = float(os.environ.get("ASK_STREAM_PING_SECONDS", "15"))
+    timeout_sec = int(os.environ.get("ASK_TIMEOUT", "60"))
+    deadline = t0 + timeout_sec
+
+    async def produce():
+        stream = _answer_stream(question, docs)
+        try:
+            async for delta in stream:
+                await queue.put(delta)
+            await queue.put(_STREAM_DONE)
+        except Exception as e:
+            await queue.put(e)
         finally:
-            _ASK_SEMAPHORE.release()
+            # close now rather than at garbage collection so a shared upstream sees us leave
+            await stream.aclose()
+
+    ttft_ms = None
+    chunks = chars = 0
+    status = "ok"
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=min(ping_sec, remaining))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if item is _STREAM_DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if ttft_ms is None:
+                ttft_ms = round((time.perf_counter() - t0) * 1000, 1)
+            chunks += 1
+            chars += len(item)
+            yield _sse({"type": "chunk", "data": item})
+    except (asyncio.CancelledError, GeneratorExit):
+        status = "cancelled"
+        raise
+    except Exception as e:
+        status = "error"
+        # some exceptions (like asyncio.TimeoutError) have empty str(); provide a useful message
+        if isinstance(e, asyncio.TimeoutError):
+            detail = f"llm_timeout after {timeout_sec}s"
+        else:
+            detail = str(e) or repr(e)
+        logger.error("llm failed (stream): %s", detail, exc_info=True)
+        yield _sse({"type": "error", "detail": detail})
+    finally:
+        producer.cancel()
+        emit_metric(
+            "ask_stream",
+            status=status,
+            ttft_ms=ttft_ms,
+            total_ms=round((time.perf_counter() - t0) * 1000, 1),
+            chunks=chunks,
+            chars=chars,
+        )
+    yield _sse({"type": "end"})
 
 
 @method_decorator(csrf_exempt, name="dispatch")
-class AskStreamView(APIView):
-    permission_classes = [AllowAny]
+class AskView(View):
+    """Async ask endpoint: retrieval and completion are awaited without parking a thread."""
+
+    async def post(self, request, *args, **kwargs):
+        denied = await sync_to_async(_guard)(request, self)
+        if denied is not None:
+            return denied
+        params = _parse_ask_body(request)
+        question = params["question"]
+        if not question:
+            return JsonResponse({"error": "empty question"}, status=400)
+        invalid = _invalid_fusion(params["fusion"])
+        if invalid is not None:
+            return invalid
 
-    def post(self, request: HttpRequest):
-        # Synchronous stream endpoint: produce SSE but call LLM non-streaming to avoid async generator issues
-        if request.method != "POST":
-            return Response({"error": "method not allowed"}, status=405)
         try:
-            body = json.loads(request.body.decode("utf-8")) if request.body else {}
-        except Exception:
-            body = {}
-        question = body.get("question") or body.get("query") or ""
-        top_k = int(body.get("top_k") or 6)
-        bm25_weight = float(body.get("bm25_weight") or 0.35)
-        include_content = bool(body.get("include_content") or False)
+            docs = await _cached_retrieve(
+                question,
+                params["top_k"],
+                params["bm25_weight"],
+                params["filters"],
+                params["fusion"],
+                params["budget"],
+            )
+        except Exception as e:
+            logger.error("retriever failed: %s", e, exc_info=True)
+            return JsonResponse({"error": "embed_error", "detail": str(e)}, status=502)
+        try:
+            answer = await _answer(question, docs)
+        except Exception as e:
+            return JsonResponse({"error": "llm_error", "detail": str(e)}, status=502)
+        payload = {
+            "answer": answer,
+            "contexts": _context_items(docs, params["include_content"]),
+        }
+        if getattr(docs, "degraded", None):
+            payload["degraded"] = docs.degraded
+        return JsonResponse(payload)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AskStreamView(View):
+    """SSE ask endpoint: contexts as soon as retrieval finishes, then the answer token by token."""
+
+    async def post(self, request: HttpRequest):
+        denied = await sync_to_async(_guard)(request, self)
+        if denied is not None:
+            return denied
+        params = _parse_ask_body(request)
+        question = params["question"]
         if not question:
-            return Response({"error": "empty question"}, status=400)
+            return JsonResponse({"error": "empty question"}, status=400)
+        invalid = _invalid_fusion(params["fusion"])
+        if invalid is not None:
+            return invalid
 
-        # acquire semaphore synchronously
-        async_to_sync(_ASK_SEMAPHORE.acquire)()
         try:
-            _ensure_components()
-            from src.rag.retriever import Retriever
-
-            retriever = Retriever(
-                _GLOBAL["store"], _GLOBAL["embed"], k=top_k, bm25_weight=bm25_weight
+            docs = await _cached_retrieve(
+                question,
+                params["top_k"],
+                params["bm25_weight"],
+                params["filters"],
+                params["fusion"],
+                params["budget"],
             )
-            try:
-                timeout_sec = int(os.environ.get("ASK_TIMEOUT", "10"))
-                if asyncio.iscoroutinefunction(retriever.get_relevant):
-                    docs = async_to_sync(asyncio.wait_for)(
-                        retriever.get_relevant(question), timeout=timeout_sec
-                    )
-                else:
-                    future = _RETRIEVAL_POOL.submit(
-                        _cached_retrieve, question, retriever, top_k, bm25_weight
-                    )
-                    try:
-                        docs = future.result(timeout=timeout_sec)
-                    except FutureTimeout:
-                        future.cancel()
-                        raise TimeoutError(f"retriever timeout after {timeout_sec}s")
-            except Exception as e:
-                logger.error("retriever failed (stream sync): %s", e, exc_info=True)
-                return Response({"error": "embed_error", "detail": str(e)}, status=502)
-
-            base_contexts = []
-            for d in docs:
-                item = {"score": d.get("score"), "source": d.get("source"), "hash": d.get("hash")}
-                if include_content and "content" in d:
-                    c = d["content"]
-                    if isinstance(c, str) and len(c) > 2000:
-                        c = c[:2000] + "..."
-                    item["content"] = c
-                base_contexts.append(item)
-
-            # Use non-streaming LLM completion and wrap into SSE stream as a single chunk
-            try:
-                answer = async_to_sync(asyncio.wait_for)(
-                    _GLOBAL["llm"].acomplete(question, docs),
-                    timeout=int(os.environ.get("ASK_TIMEOUT", "60")),
-                )
-            except Exception as e:
-                # capture exception detail immediately (exception vars are cleared after except block)
-                # some exceptions (like asyncio.TimeoutError) have empty str(); provide a useful message
-                if isinstance(e, asyncio.TimeoutError):
-                    detail = f"llm_timeout after {int(os.environ.get('ASK_TIMEOUT', '60'))}s"
-                else:
-                    detail = str(e) or repr(e)
-                logger.error("llm failed (stream): %s", detail, exc_info=True)
-
-                # return an async generator so Django ASGI can iterate it with `async for`
-                async def error_gen():
-                    yield f"data: {json.dumps({'type':'error','detail': detail}, ensure_ascii=False)}\n\n"
-                    yield 'data: {"type":"end"}\n\n'
-
-                return StreamingHttpResponse(error_gen(), content_type="text/event-stream")
-
-            async def event_gen():
-                # yield contexts first
-                yield f"data: {json.dumps({'type':'contexts','data': base_contexts}, ensure_ascii=False)}\n\n"
-                # send full answer as one chunk
-                yield f"data: {json.dumps({'type':'chunk','data': answer}, ensure_ascii=False)}\n\n"
-                yield 'data: {"type":"end"}\n\n'
-
-            return StreamingHttpResponse(event_gen(), content_type="text/event-stream")
-        finally:
-            _ASK_SEMAPHORE.release()
+        except Exception as e:
+            logger.error("retriever failed (stream): %s", e, exc_info=True)
+            return JsonResponse({"error": "embed_error", "detail": str(e)}, status=502)
+
+        event = {"type": "contexts", "data": _context_items(docs, params["include_content"])}
+        if getattr(docs, "degraded", None):
+            event["degraded"] = docs.degraded
+        response = StreamingHttpResponse(
+            _stream_events(question, docs, event), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # stop nginx-style proxies from buffering the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+@api_view(["GET"])
+def related(request: HttpRequest, chunk_hash: str):
+    """Precomputed "more like this" passages for a chunk (see ``cli knn``)."""
+    _ensure_components()
+    try:
+        n = min(max(int(request.GET.get("n") or 5), 1), 50)
+    except ValueError:
+        n = 5
+    include_content = request.GET.get("include_content", "").lower() in ("1", "true")
+    store = _GLOBAL["store"]
+    if store.row_of(chunk_hash) is None:
+        return Response({"error": "chunk_not_found"}, status=404)
+    hits = store.neighbors(chunk_hash, n)
+    if hits is None:
+        return Response({"error": "related_unavailable"}, status=503)
+    return Response({"hash": chunk_hash, "related": _context_items(hits, include_content)})
 
 
 @csrf_exempt
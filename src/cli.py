@@ -3,24 +3,21 @@ import asyncio
 import json
 import os
 import sys
+import time
 from importlib import import_module
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from .config import get_settings
 from .ingestion.chunking import adaptive_chunk
-from .ingestion.docx_parser import (
-    PARSER_VERSION,
-    ingest_files,
-    ingest_to_raw,
-    list_docx_paths,
-)
 from .rag.embeddings import OllamaEmbeddings
+from .rag.http_pool import aclose_clients
 from .rag.llm import BaseLLM, get_default_llm
+from .rag.rate_limit import BATCH, priority
 from .rag.retriever import Retriever
-from .rag.vector_store import FaissStore, build_or_update
+from .rag.vector_store import FaissStore, build_or_update, index_sidecars
 
 
 def cmd_ingest(args) -> int:
@@ -31,6 +28,7 @@ def cmd_ingest(args) -> int:
     # rebuild: 删除旧索引文件
     if getattr(args, "rebuild", False):
         vs = [settings.vector_store_path, settings.metadata_store_path]
+        vs += [str(p) for p in index_sidecars(settings.vector_store_path)]
         removed = []
         for p in vs:
             if os.path.exists(p):
@@ -44,6 +42,14 @@ def cmd_ingest(args) -> int:
     # Show resolved path & docx count
     from pathlib import Path
 
+    # python-docx is only needed to ingest; asking works without it
+    from .ingestion.docx_parser import (
+        PARSER_VERSION,
+        ingest_files,
+        ingest_to_raw,
+        list_docx_paths,
+    )
+
     root_path = Path(settings.docs_root)
     if not root_path.is_absolute():
         proj_root = Path(__file__).resolve().parents[2]
@@ -154,9 +160,8 @@ def format_contexts(ctxs: List[Dict], limit: int = 220) -> str:
         snippet = c.get("content", "")
         if len(snippet) > limit:
             snippet = snippet[:limit] + "…"
-        lines.append(
-            f"[ref {i} | score={c.get('score'):.3f}] {c.get('source')}\n  {snippet.replace('\n',' ')}"
-        )
+        snippet = snippet.replace("\n", " ")
+        lines.append(f"[ref {i} | score={c.get('score'):.3f}] {c.get('source')}\n  {snippet}")
     return "\n".join(lines)
 
 
@@ -165,38 +170,185 @@ async def _call_llm(llm: BaseLLM, question: str, docs: List[Dict]):
     return await llm.acomplete(question, docs)
 
 
-async def async_answer(
-    question: str, top_k: int, show_ctx: bool, json_out: bool, bm25_weight: float
-):
+def _load_retriever(top_k: int, bm25_weight: float):
+    """Embeddings + index + BM25, built once per process; None when there is no index."""
     settings = get_settings()
     embed = OllamaEmbeddings(settings.embed_model)
     store = FaissStore(settings.vector_store_path, settings.metadata_store_path, dim=None)
     if store._index is None:
         print("[ASK] 未找到向量索引，请先运行 ingest 命令。", file=sys.stderr)
-        return 2
-    retriever = Retriever(store, embed, k=top_k, bm25_weight=bm25_weight)
-    docs = retriever.get_relevant(question)
-    llm = get_default_llm()
-    answer = await _call_llm(llm, question, docs)
+        return None
+    return Retriever(store, embed, k=top_k, bm25_weight=bm25_weight)
+
+
+def _result(question: str, answer: str, docs: List[Dict]) -> Dict:
+    return {
+        "question": question,
+        "answer": answer,
+        "contexts": [
+            {"ref": i + 1, "score": d["score"], "source": d["source"], "hash": d["hash"]}
+            for i, d in enumerate(docs)
+        ],
+    }
+
+
+def _print_answer(question: str, answer: str, docs: List[Dict], show_ctx: bool, json_out: bool):
     if json_out:
-        payload = {
-            "question": question,
-            "answer": answer,
-            "contexts": [
-                {"ref": i + 1, "score": d["score"], "source": d["source"], "hash": d["hash"]}
-                for i, d in enumerate(docs)
-            ],
-        }
-        print(json.dumps(payload, ensure_ascii=False, indent=2))
+        print(json.dumps(_result(question, answer, docs), ensure_ascii=False, indent=2))
     else:
         print("================= ANSWER =================")
         print(answer)
         if show_ctx:
             print("\n================= CONTEXTS =================")
             print(format_contexts(docs))
+
+
+async def _answer_and_close(llm: BaseLLM, question: str, docs: List[Dict]):
+    try:
+        return await _call_llm(llm, question, docs)
+    finally:
+        # pooled clients are bound to this asyncio.run loop; close them before it ends
+        await aclose_clients()
+
+
+async def async_answer(
+    question: str, top_k: int, show_ctx: bool, json_out: bool, bm25_weight: float
+):
+    retriever = _load_retriever(top_k, bm25_weight)
+    if retriever is None:
+        return 2
+    docs = retriever.get_relevant(question)
+    llm = get_default_llm()
+    answer = await _answer_and_close(llm, question, docs)
+    _print_answer(question, answer, docs, show_ctx, json_out)
     return 0
 
 
+def _write_records(out_path: str, records: Dict[int, Dict]) -> None:
+    """Replace ``out_path`` with ``records`` in index order (atomically)."""
+    tmp = out_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for idx in sorted(records):
+            f.write(json.dumps(records[idx], ensure_ascii=False) + "\n")
+    os.replace(tmp, out_path)
+
+
+def _load_done(out_path: str, questions: List[str]) -> Dict[int, Dict]:
+    """Answered records of a previous (possibly interrupted) run, keyed by input index.
+
+    Only records whose question still matches the input at that index are kept. The
+    file is rewritten with just those records so a torn last line, earlier failures
+    or answers to since-edited questions don't stay in the output; the other
+    questions are asked again.
+    """
+    done: Dict[int, Dict] = {}
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(rec, dict) or "answer" not in rec:
+                continue
+            idx = rec.get("index")
+            if isinstance(idx, int) and 0 < idx <= len(questions):
+                if rec.get("question") == questions[idx - 1]:
+                    done[idx] = rec
+    _write_records(out_path, done)
+    return done
+
+
+async def async_answer_batch(
+    questions: List[str],
+    top_k: int,
+    bm25_weight: float,
+    concurrency: int = 4,
+    out_path: Optional[str] = None,
+    resume: bool = False,
+    show_ctx: bool = False,
+    json_out: bool = False,
+) -> int:
+    """Answer many questions with one retriever/LLM and at most ``concurrency`` in flight.
+
+    Results are emitted in input order as soon as every earlier question is done: as
+    JSONL records (``index``, ``question``, ``answer``/``error``, ``contexts``) appended
+    to ``out_path``, or printed like single answers. With ``resume`` the questions
+    already answered in ``out_path`` (matched by index and text) are skipped, and the
+    file is rewritten in index order once the run ends. LLM calls
+    run at batch priority, so a shared rate limit keeps serving interactive asks first.
+    """
+    retriever = _load_retriever(top_k, bm25_weight)
+    if retriever is None:
+        return 2
+    llm = get_default_llm()
+    done = _load_done(out_path, questions) if out_path and resume else {}
+    todo = [(idx, q) for idx, q in enumerate(questions, 1) if idx not in done]
+    resumed = bool(done)
+    if resumed:
+        print(f"[BATCH] 续跑: 跳过已完成 {len(questions) - len(todo)} 题", file=sys.stderr)
+    sem = asyncio.Semaphore(max(concurrency, 1))
+    failed = 0
+
+    async def run(idx: int, q: str):
+        async with sem:
+            t0 = time.perf_counter()
+            docs: List[Dict] = []
+            try:
+                docs = await retriever.aget_relevant(q)
+                answer = await _call_llm(llm, q, docs)
+                rec = _result(q, answer, docs)
+            except Exception as e:
+                rec = _result(q, "", docs)
+                del rec["answer"]
+                rec["error"] = str(e) or repr(e)
+            rec["index"] = idx
+            rec["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            return rec, docs
+
+    out = open(out_path, "a" if resume else "w", encoding="utf-8") if out_path else None
+    t0 = time.time()
+    tasks: List[asyncio.Task] = []
+    try:
+        with priority(BATCH):
+            tasks = [asyncio.create_task(run(idx, q)) for idx, q in todo]
+        # tasks finish out of order; each record is written once all earlier ones are
+        for n, task in enumerate(tasks, 1):
+            rec, docs = await task
+            failed += "error" in rec
+            if out is not None:
+                done[rec["index"]] = rec
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                out.flush()
+                status = "失败" if "error" in rec else "完成"
+                print(
+                    f"[BATCH] {n}/{len(tasks)} {status} #{rec['index']} "
+                    f"({rec['elapsed_ms'] / 1000:.1f}s)",
+                    file=sys.stderr,
+                )
+            else:
+                print(f"\n### 问题 {rec['index']}/{len(questions)}: {rec['question']}")
+                if "error" in rec:
+                    print(f"[ASK] 回答失败: {rec['error']}", file=sys.stderr)
+                else:
+                    _print_answer(rec["question"], rec["answer"], docs, show_ctx, json_out)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if out is not None:
+            out.close()
+            if resumed:
+                # resumed records were appended after earlier answers: restore input order
+                _write_records(out_path, done)
+        await aclose_clients()
+    print(
+        f"[BATCH] {len(todo)} 题用时 {time.time() - t0:.1f}s，失败 {failed}，并发 {concurrency}",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
 def cmd_ask(args) -> int:
     questions: List[str] = []
     if args.file:
@@ -213,16 +365,38 @@ def cmd_ask(args) -> int:
     if not questions:
         print("需要 --question 或 --file", file=sys.stderr)
         return 1
-    exit_code = 0
-    for idx, q in enumerate(questions, 1):
-        if len(questions) > 1:
-            print(f"\n### 问题 {idx}/{len(questions)}: {q}")
-        exit_code = asyncio.run(
-            async_answer(q, args.top_k, args.show_context, args.json, args.bm25_weight)
+    if args.resume and not args.out:
+        print("--resume 需要配合 --out 使用", file=sys.stderr)
+        return 1
+    if len(questions) == 1 and not args.out:
+        return asyncio.run(
+            async_answer(questions[0], args.top_k, args.show_context, args.json, args.bm25_weight)
         )
-        if exit_code != 0:
-            break
-    return exit_code
+    return asyncio.run(
+        async_answer_batch(
+            questions,
+            args.top_k,
+            args.bm25_weight,
+            concurrency=args.concurrency,
+            out_path=args.out,
+            resume=args.resume,
+            show_ctx=args.show_context,
+            json_out=args.json,
+        )
+    )
+
+
+def cmd_knn(args) -> int:
+    settings = get_settings()
+    store = FaissStore(settings.vector_store_path, settings.metadata_store_path, dim=None)
+    if store._index is None:
+        print("未找到向量索引，请先运行: python -m src.cli ingest", file=sys.stderr)
+        return 1
+    t0 = time.time()
+    rows = store.build_neighbors(n=args.neighbors, batch=args.batch)
+    print(f"[KNN] 已计算 {rows} 个片段的前 {args.neighbors} 近邻，用时 {time.time()-t0:.1f}s")
+    print(f"[KNN] 输出: {store.knn_ids_path} / {store.knn_scores_path}")
+    return 0
 
 
 def cmd_repl(args) -> int:
@@ -257,7 +431,7 @@ def cmd_repl(args) -> int:
             continue
         # normal question
         docs = retriever.get_relevant(q)
-        answer = asyncio.run(_call_llm(llm, q, docs))
+        answer = asyncio.run(_answer_and_close(llm, q, docs))
         print("\n答>")
         print(answer)
         if args.show_context:
@@ -291,8 +465,18 @@ def build_parser() -> argparse.ArgumentParser:
     pask.add_argument("--show-context", action="store_true", help="显示引用上下文")
     pask.add_argument("--bm25-weight", type=float, default=0.35, help="BM25混合权重[0-1]")
     pask.add_argument("--json", action="store_true", help="JSON 输出")
+    pask.add_argument("--out", help="批量结果按输入顺序逐条写入该 JSONL 文件")
+    pask.add_argument("--concurrency", type=int, default=4, help="批量模式同时处理的问题数")
+    pask.add_argument(
+        "--resume", action="store_true", help="跳过 --out 中已回答的问题，续跑中断的批量任务"
+    )
     pask.set_defaults(func=cmd_ask)
 
+    pknn = sub.add_parser("knn", help="离线计算片段近邻图 (相关片段推荐)")
+    pknn.add_argument("-n", "--neighbors", type=int, default=10, help="每个片段保留的近邻数")
+    pknn.add_argument("--batch", type=int, default=1024, help="每批检索的片段数")
+    pknn.set_defaults(func=cmd_knn)
+
     prepl = sub.add_parser("repl", help="交互式多轮问答")
     prepl.add_argument("-k", "--top-k", type=int, default=6)
     prepl.add_argument("--bm25-weight", type=float, default=0.35)
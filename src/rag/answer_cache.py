@@ -0,0 +1,223 @@
+"""Persistent exact-match LLM answer cache.
+
+An answer is reused only when everything that determines it is identical: provider,
+model, system prompt version, normalized question, the ordered context hashes and the
+sampling temperature (see ``make_key``). Entries live in SQLite so they survive
+restarts, with TTL expiry and LRU eviction past ``max_entries``; an optional Redis tier
+(``ANSWER_CACHE_REDIS_URL``) shares them across API workers and hosts.
+
+This sits in front of the semantic cache: an exact hit costs one primary-key lookup and
+no embedding call.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from ..logging_utils import emit_metric, get_logger
+from .prompt import prompt_version
+from .retrieval_cache import normalize_query
+
+logger = get_logger("answer_cache")
+
+
+def make_key(
+    provider: str,
+    model: str,
+    prompt_version: str,
+    question: str,
+    context_hashes: Iterable[Optional[str]],
+    temperature: Optional[float] = None,
+) -> str:
+    raw = json.dumps(
+        {
+            "p": provider,
+            "m": model,
+            "v": prompt_version,
+            "q": normalize_query(question),
+            # order matters: contexts are numbered [ref i] in the prompt
+            "c": [h or "" for h in context_hashes],
+            "t": None if temperature is None else round(float(temperature), 4),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def answer_scope(llm) -> str:
+    """Provider/model/prompt part of the answer key, shared with the semantic cache."""
+    return make_key(
+        getattr(llm, "provider", type(llm).__name__),
+        getattr(llm, "model", ""),
+        prompt_version(),
+        "",
+        (),
+        getattr(llm, "temperature", None),
+    )
+
+
+def answer_key(llm, question: str, context_hashes: Iterable[Optional[str]]) -> str:
+    """Cache key for ``llm`` answering ``question`` over contexts with these hashes."""
+    return make_key(
+        getattr(llm, "provider", type(llm).__name__),
+        getattr(llm, "model", ""),
+        prompt_version(),
+        question,
+        context_hashes,
+        getattr(llm, "temperature", None),
+    )
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 10000,
+        ttl: float = 7 * 24 * 3600.0,
+        redis_url: Optional[str] = None,
+        namespace: str = "rag:answer:",
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path and max_entries > 0:
+            try:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    """CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    answer TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+                )
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed_at)"
+                )
+                self._conn.commit()
+            except Exception as e:
+                logger.warning("answer cache sqlite tier disabled (%s): %s", path, e)
+                self._conn = None
+        self._redis = None
+        if redis_url and max_entries > 0:
+            try:
+                import redis.asyncio as aioredis
+
+                self._redis = aioredis.from_url(redis_url, socket_timeout=0.2)
+            except Exception as e:  # redis is optional
+                logger.warning("answer cache redis tier disabled: %s", e)
+
+    @classmethod
+    def from_env(cls) -> "AnswerCache":
+        return cls(
+            path=os.getenv("ANSWER_CACHE_PATH", "vector_store/answer_cache.db"),
+            max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600))),
+            redis_url=os.getenv("ANSWER_CACHE_REDIS_URL") or None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None or self._redis is not None
+
+    def get(self, key: str) -> Optional[str]:
+        if self._conn is None:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, expires_at FROM answers WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM answers WHERE key=?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE answers SET accessed_at=? WHERE key=?", (now, key))
+            self._conn.commit()
+        return row[0]
+
+    def set(self, key: str, answer: str) -> None:
+        if self._conn is None or not answer:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, answer, now + self.ttl, now),
+            )
+            self._conn.execute("DELETE FROM answers WHERE expires_at < ?", (now,))
+            # least recently used entries go first once the table is over its bound
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers"
+                " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def _record(self, hit: bool, tier: str) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        emit_metric("answer_cache", result="hit" if hit else "miss", tier=tier)
+
+    async def aget(self, key: str) -> Optional[str]:
+        if self._conn is not None:
+            answer = await asyncio.to_thread(self.get, key)
+            if answer is not None:
+                self._record(True, "sqlite")
+                return answer
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(self.namespace + key)
+            except Exception as e:
+                logger.debug("answer cache redis get failed: %s", e)
+                raw = None
+            if raw is not None:
+                answer = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+                if self._conn is not None:
+                    await asyncio.to_thread(self.set, key, answer)
+                self._record(True, "redis")
+                return answer
+        self._record(False, "redis" if self._redis is not None else "sqlite")
+        return None
+
+    async def aset(self, key: str, answer: str) -> None:
+        if not answer:
+            return
+        if self._conn is not None:
+            await asyncio.to_thread(self.set, key, answer)
+        if self._redis is not None:
+            try:
+                await self._redis.set(self.namespace + key, answer, ex=int(self.ttl))
+            except Exception as e:
+                logger.debug("answer cache redis set failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        entries = 0
+        if self._conn is not None:
+            with self._lock:
+                entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "redis": self._redis is not None,
+        }
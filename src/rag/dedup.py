@@ -0,0 +1,83 @@
+"""MinHash signatures for near-duplicate detection of chunks.
+
+Signatures are computed once per chunk at ingest time (see ``build_or_update``)
+and stored hex-encoded in the chunk metadata under ``minhash``. Query-time
+dedup only compares fixed-size signatures, so its cost does not depend on
+chunk length and no tokenization happens on the hot path.
+"""
+
+import zlib
+from typing import Iterable, List, Optional
+
+import jieba
+import numpy as np
+
+NUM_PERM = 64
+_SEED = 1895
+
+# Multiply-shift hash family: h_i(x) = (a_i * x + b_i) mod 2**64 >> 32, a_i odd.
+_rng = np.random.RandomState(_SEED)
+_A = (_rng.randint(0, 2**32, size=NUM_PERM, dtype=np.uint64) << np.uint64(32)) | (
+    _rng.randint(0, 2**32, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+)
+_B = (_rng.randint(0, 2**32, size=NUM_PERM, dtype=np.uint64) << np.uint64(32)) | _rng.randint(
+    0, 2**32, size=NUM_PERM, dtype=np.uint64
+)
+_EMPTY = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+
+def minhash_tokens(tokens: Iterable[str]) -> np.ndarray:
+    """Return the uint32 MinHash signature of a token set."""
+    uniq = {t for t in tokens if t and not t.isspace()}
+    if not uniq:
+        return _EMPTY.copy()
+    h = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in uniq), dtype=np.uint64, count=len(uniq))
+    with np.errstate(over="ignore"):
+        permuted = (h[:, None] * _A[None, :] + _B[None, :]) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def minhash_text(text: str) -> np.ndarray:
+    """Tokenize with jieba (same tokens the old Jaccard filter used) and sign."""
+    return minhash_tokens(jieba.cut(text))
+
+
+def encode_signature(sig: np.ndarray) -> str:
+    return sig.astype("<u4").tobytes().hex()
+
+
+def decode_signature(value: str) -> Optional[np.ndarray]:
+    try:
+        sig = np.frombuffer(bytes.fromhex(value), dtype="<u4")
+    except (TypeError, ValueError):
+        return None
+    return sig if sig.shape[0] == NUM_PERM else None
+
+
+def signature_for(meta: dict) -> np.ndarray:
+    """Signature stored on ``meta``, or computed for legacy chunks without one.
+
+    ``meta`` is shared with other readers and is never modified here; legacy chunks
+    are signed persistently by ``FaissStore.backfill_signatures`` at ingest."""
+    sig = decode_signature(meta.get("minhash") or "")
+    if sig is None:
+        sig = minhash_text(meta.get("content", ""))
+    return sig
+
+
+def near_duplicate_mask(sigs: np.ndarray, threshold: float = 0.8) -> List[bool]:
+    """Greedy dedup over signatures in rank order.
+
+    ``sigs`` is a ``(n, NUM_PERM)`` matrix. Row ``i`` is a duplicate when its
+    estimated Jaccard similarity with any earlier *kept* row exceeds
+    ``threshold``. The pairwise agreement matrix is computed in one NumPy call.
+    """
+    n = sigs.shape[0]
+    if n == 0:
+        return []
+    sim = (sigs[:, None, :] == sigs[None, :, :]).mean(axis=2)
+    keep = np.ones(n, dtype=bool)
+    for i in range(1, n):
+        if (sim[i, :i][keep[:i]] > threshold).any():
+            keep[i] = False
+    return [not k for k in keep]
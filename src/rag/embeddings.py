@@ -1,10 +1,12 @@
+import asyncio
 import os
 import time
-from typing import List
+from typing import List, Optional
 
 import httpx
 
 from ..logging_utils import emit_metric, get_logger
+from .http_pool import async_client, sync_client
 
 logger = get_logger("embeddings")
 
@@ -16,6 +18,57 @@ OLLAMA_PROBE_ENV = "OLLAMA_PROBE"  # set to '0' to disable probe
 OLLAMA_FORCE_PROMPT_ENV = "OLLAMA_FORCE_PROMPT"  # set to '1' to prefer prompt-only payloads
 
 
+def _extract_embedding(data) -> Optional[List[float]]:
+    """Pull the embedding vector out of an Ollama response, tolerating version drift."""
+    # accomodate different response shapes across Ollama versions
+    vec = None
+    # common shapes: {"embedding": [...]}, {"embeddings": [...]}, {"data": [{"embedding": [...]}]}
+    if isinstance(data, dict):
+        if "embedding" in data and isinstance(data["embedding"], list):
+            vec = data["embedding"]
+        elif "embeddings" in data and isinstance(data["embeddings"], list) and data["embeddings"]:
+            # embeddings may be list of lists
+            vec = data["embeddings"][0]
+        elif "data" in data and isinstance(data["data"], list) and data["data"]:
+            first = data["data"][0]
+            if isinstance(first, dict) and "embedding" in first:
+                vec = first["embedding"]
+    # sometimes API returns a list at top level
+    if vec is None and isinstance(data, list) and data:
+        first = data[0]
+        if isinstance(first, dict) and "embedding" in first:
+            vec = first["embedding"]
+    # normalize dict-shaped embeddings (some versions may return dict keyed by index)
+    if isinstance(vec, dict):
+        # try convert {'0': val0, '1': val1} or {0: val0, ...} -> [val0, val1, ...]
+        try:
+            # sort keys numerically when possible
+            items = sorted(
+                vec.items(),
+                key=lambda kv: (
+                    int(kv[0])
+                    if isinstance(kv[0], str) and kv[0].isdigit()
+                    else (kv[0] if isinstance(kv[0], int) else 0)
+                ),
+            )
+            vec = [v for _, v in items]
+        except Exception:
+            # fallback: try common nested field
+            if "values" in vec and isinstance(vec["values"], list):
+                vec = vec["values"]
+            elif not vec:
+                logger.debug("Empty embedding dict in response: %s", data)
+                return None
+    return vec
+
+
+_RETRIES = 4
+
+
+class _ClientError(RuntimeError):
+    """Ollama rejected the request (4xx)."""
+
+
 class LocalOllamaEmbedding:
     def __init__(self, model: str | None = None, host: str | None = None, batch_size: int = 8):
         self.model = model or os.getenv(MODEL_ENV_NAME, DEFAULT_MODEL)
@@ -31,7 +84,8 @@ class LocalOllamaEmbedding:
         self.max_chars = int(
             os.getenv("EMBED_MAX_CHARS", "3500")
         )  # truncate overly long chunk to avoid 5xx
-        self.client = httpx.Client(timeout=120)
+        # pooled keep-alive clients shared with the Ollama LLM provider
+        self.client = sync_client("ollama")
         # Probe optionally (can be disabled via env OLLAMA_PROBE=0)
         probe_enabled = os.getenv(OLLAMA_PROBE_ENV, "1") not in ("0", "false", "False")
         if probe_enabled:
@@ -40,141 +94,91 @@ class LocalOllamaEmbedding:
             except Exception as e:
                 logger.debug("Ollama probe failed: %s", e)
 
-    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
-        # Ollama embeddings API is single prompt per call currently; loop inside
-        vectors: List[List[float]] = []
-        for text in batch:
-            original_len = len(text)
-            if original_len > self.max_chars:
-                text = text[: self.max_chars]
-            payload = {"model": self.model, "prompt": text}
-            retries = 4
-            backoff = 1.5
-            for attempt in range(1, retries + 1):
+    def _variants(self, text: str) -> List[dict]:
+        # Two payload shapes to tolerate different Ollama versions: prefer prompt; with
+        # OLLAMA_FORCE_PROMPT=1 do not fall back to the input variant
+        force_prompt = os.getenv(OLLAMA_FORCE_PROMPT_ENV, "0") in ("1", "true", "True")
+        variants = [{"model": self.model, "prompt": text}]
+        if not force_prompt:
+            variants.append({"model": self.model, "input": [text]})
+        return variants
+
+    def _parse(self, r: httpx.Response, payload: dict) -> List[float]:
+        """Vector from an /api/embeddings response.
+
+        Raises ``_ClientError`` for a 4xx (the same request cannot succeed on retry) and
+        RuntimeError for failures worth retrying (5xx, missing embedding field).
+        """
+        logger.debug(
+            "Ollama resp status=%s headers=%s body=%s",
+            r.status_code,
+            dict(r.headers),
+            (r.text or "")[:2000],
+        )
+        if r.status_code >= 500:
+            # include response body in log to help debug 502/5xx
+            logger.debug("Ollama 5xx body: %s", (r.text or "")[:4000])
+            raise RuntimeError(f"Server {r.status_code}")
+        if r.status_code >= 400:
+            raise _ClientError(f"Client {r.status_code}: {(r.text or '')[:200]}")
+        data = r.json()
+        # If the server returns an empty dict ({}), log it distinctly to aid debugging
+        if isinstance(data, dict) and not data:
+            logger.warning(
+                "Ollama returned empty JSON object for payload type; payload=%s",
+                "prompt" if "prompt" in payload else "input",
+            )
+            logger.debug("Empty body: %s", r.text)
+        vec = _extract_embedding(data)
+        if vec is None:
+            logger.debug("Unexpected embedding response shape: %s", data)
+            raise RuntimeError("no embedding field in response")
+        return vec
+
+    def _give_up(self, text: str, attempt: int, e: Exception) -> RuntimeError:
+        emit_metric("embed_error", length=len(text), attempt=attempt, error=str(e))
+        logger.error(f"embed_error length={len(text)} attempts={attempt} err={e}")
+        return RuntimeError(f"Ollama embeddings request failed after {attempt} attempts: {e}")
+
+    def _retry_text(self, text: str, attempt: int, e: Exception) -> str:
+        """Log a retry; on a 502 the text is truncated further for the next attempt."""
+        if "Server 502" in str(e) and len(text) > 800:
+            text = text[: max(800, int(len(text) * 0.6))]
+        emit_metric("embed_retry", length=len(text), attempt=attempt, error=str(e))
+        logger.warning(f"embed_retry attempt={attempt} len={len(text)} err={e}")
+        return text
+
+    def _embed_one(self, text: str) -> List[float]:
+        original_len = len(text)
+        if original_len > self.max_chars:
+            text = text[: self.max_chars]
+        backoff = 1.5
+        attempt = 0
+        while True:
+            attempt += 1
+            errors: List[Exception] = []
+            for p in self._variants(text):
                 try:
-                    # Try two common payload formats to be tolerant to different Ollama versions
-                    last_exc = None
-                    # Decide payload variants: prefer prompt; if OLLAMA_FORCE_PROMPT=1 then do not fall back to input variants
-                    force_prompt = os.getenv(OLLAMA_FORCE_PROMPT_ENV, "0") in ("1", "true", "True")
-                    variants = (
-                        (payload,)
-                        if force_prompt
-                        else (payload, {"model": self.model, "input": [text]})
+                    logger.debug(
+                        "Ollama request payload=%s",
+                        p if len(str(p)) < 1000 else "payload(len>1000)",
                     )
-                    for p in variants:
-                        try:
-                            logger.debug(
-                                "Ollama request payload=%s",
-                                p if len(str(p)) < 1000 else "payload(len>1000)",
-                            )
-                            r = self.client.post(f"{self.host}/api/embeddings", json=p)
-                            logger.debug(
-                                "Ollama resp status=%s headers=%s body=%s",
-                                r.status_code,
-                                dict(r.headers),
-                                (r.text or "")[:2000],
-                            )
-                            if r.status_code >= 500:
-                                # include response body in log to help debug 502/5xx
-                                logger.debug("Ollama 5xx body: %s", (r.text or "")[:4000])
-                                last_exc = RuntimeError(f"Server {r.status_code}")
-                                # try next payload variant
-                                continue
-                            r.raise_for_status()
-                            data = r.json()
-                            # If the server returns an empty dict ({}), log it distinctly to aid debugging
-                            if isinstance(data, dict) and not data:
-                                logger.warning(
-                                    "Ollama returned empty JSON object for payload type; payload=%s",
-                                    "prompt" if "prompt" in p else "input",
-                                )
-                                logger.debug("Empty body: %s", r.text)
-                            # accomodate different response shapes across Ollama versions
-                            vec = None
-                            # common shapes: {"embedding": [...]}, {"embeddings": [...]}, {"data": [{"embedding": [...]}]}
-                            if isinstance(data, dict):
-                                if "embedding" in data and isinstance(data["embedding"], list):
-                                    vec = data["embedding"]
-                                elif (
-                                    "embeddings" in data
-                                    and isinstance(data["embeddings"], list)
-                                    and data["embeddings"]
-                                ):
-                                    # embeddings may be list of lists
-                                    vec = data["embeddings"][0]
-                                elif (
-                                    "data" in data
-                                    and isinstance(data["data"], list)
-                                    and data["data"]
-                                ):
-                                    first = data["data"][0]
-                                    if isinstance(first, dict) and "embedding" in first:
-                                        vec = first["embedding"]
-                            # sometimes API returns a list at top level
-                            if vec is None and isinstance(data, list) and data:
-                                first = data[0]
-                                if isinstance(first, dict) and "embedding" in first:
-                                    vec = first["embedding"]
-                            # normalize dict-shaped embeddings (some versions may return dict keyed by index)
-                            if isinstance(vec, dict):
-                                # try convert {'0': val0, '1': val1} or {0: val0, ...} -> [val0, val1, ...]
-                                try:
-                                    # sort keys numerically when possible
-                                    items = sorted(
-                                        vec.items(),
-                                        key=lambda kv: (
-                                            int(kv[0])
-                                            if isinstance(kv[0], str) and kv[0].isdigit()
-                                            else (kv[0] if isinstance(kv[0], int) else 0)
-                                        ),
-                                    )
-                                    vec = [v for _, v in items]
-                                except Exception:
-                                    # fallback: try common nested field
-                                    if "values" in vec and isinstance(vec["values"], list):
-                                        vec = vec["values"]
-                                    else:
-                                        if not vec:
-                                            last_exc = RuntimeError(
-                                                "empty embedding dict returned by server"
-                                            )
-                                            logger.debug(
-                                                "Empty embedding dict in response: %s", data
-                                            )
-                                            continue
-                            if vec is None:
-                                last_exc = RuntimeError("no embedding field in response")
-                                logger.debug("Unexpected embedding response shape: %s", data)
-                                continue
-                            vectors.append(vec)
-                            emit_metric(
-                                "embed_ok", length=len(text), truncated=(original_len != len(text))
-                            )
-                            raise StopIteration  # success: break outer retry loop
-                        except StopIteration:
-                            break
-                        except Exception as inner_e:
-                            last_exc = inner_e
-                            logger.debug("Ollama inner attempt failed: %s", inner_e)
-                    else:
-                        # both payload attempts failed for this retry
-                        raise last_exc or RuntimeError("unknown embedding error")
+                    vec = self._parse(self.client.post(f"{self.host}/api/embeddings", json=p), p)
+                    emit_metric("embed_ok", length=len(text), truncated=(original_len != len(text)))
+                    return vec
                 except Exception as e:
-                    if attempt == retries:
-                        emit_metric("embed_error", length=len(text), attempt=attempt, error=str(e))
-                        logger.error(f"embed_error length={len(text)} attempts={attempt} err={e}")
-                        raise RuntimeError(
-                            f"Ollama embeddings request failed after {retries} attempts: {e}"
-                        )
-                    # Adaptive fallback: if server error, progressively truncate further
-                    if "Server 502" in str(e) and len(text) > 800:
-                        text = text[: max(800, int(len(text) * 0.6))]
-                        payload["prompt"] = text
-                    emit_metric("embed_retry", length=len(text), attempt=attempt, error=str(e))
-                    logger.warning(f"embed_retry attempt={attempt} len={len(text)} err={e}")
-                    time.sleep(backoff)
-                    backoff *= 2
-        return vectors
+                    errors.append(e)
+                    logger.debug("Ollama inner attempt failed: %s", e)
+            # every payload shape was rejected as a bad request: retrying won't help
+            if attempt == _RETRIES or all(isinstance(e, _ClientError) for e in errors):
+                raise self._give_up(text, attempt, errors[-1])
+            text = self._retry_text(text, attempt, errors[-1])
+            time.sleep(backoff)
+            backoff *= 2
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        # Ollama embeddings API is single prompt per call currently; loop inside
+        return [self._embed_one(text) for text in batch]
 
     def _probe_host(self) -> None:
         """Lightweight probe to list models — logs model list or errors to help diagnose 5xx."""
@@ -221,6 +225,35 @@ class LocalOllamaEmbedding:
     def embed_query(self, text: str) -> List[float]:
         return self.embed_documents([text])[0]
 
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async single-query embedding; cancellable while waiting on Ollama.
+
+        Same payload variants, retry and 4xx rules as the sync path.
+        """
+        original_len = len(text)
+        if original_len > self.max_chars:
+            text = text[: self.max_chars]
+        client = async_client("ollama")
+        backoff = 1.5
+        attempt = 0
+        while True:
+            attempt += 1
+            errors: List[Exception] = []
+            for p in self._variants(text):
+                try:
+                    r = await client.post(f"{self.host}/api/embeddings", json=p)
+                    vec = self._parse(r, p)
+                    emit_metric("embed_ok", length=len(text), truncated=(original_len != len(text)))
+                    return vec
+                except (httpx.HTTPError, RuntimeError, ValueError) as e:
+                    errors.append(e)
+                    logger.debug("Ollama async attempt failed: %s", e)
+            if attempt == _RETRIES or all(isinstance(e, _ClientError) for e in errors):
+                raise self._give_up(text, attempt, errors[-1])
+            text = self._retry_text(text, attempt, errors[-1])
+            await asyncio.sleep(backoff)
+            backoff *= 2
+
 
 # LangChain adapter
 try:
@@ -236,5 +269,8 @@ try:
         def embed_query(self, text: str) -> List[float]:
             return self.client.embed_query(text)
 
+        async def aembed_query(self, text: str) -> List[float]:
+            return await self.client.aembed_query(text)
+
 except ImportError:
     pass
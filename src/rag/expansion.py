@@ -0,0 +1,213 @@
+"""Domain dictionary query expansion backed by an Aho-Corasick automaton.
+
+The dictionary lives in ``configs/query_expansion.json`` (override with
+``QUERY_EXPANSION_PATH``) and maps a trigger term to related terms. It is compiled
+into an Aho-Corasick automaton so all triggers in a query are found in a single
+pass, independent of dictionary size. The compiled automaton is cached beside the
+source file and the source is re-checked for changes at most every
+``QUERY_EXPANSION_RELOAD_SECONDS`` (hot reload).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from ..logging_utils import get_logger
+
+logger = get_logger("expansion")
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / "configs" / "query_expansion.json"
+
+# Used when no dictionary file is present
+DEFAULT_TERMS: Dict[str, List[str]] = {
+    "优化": ["线性规划", "整数规划", "非线性规划", "多目标优化", "约束优化"],
+    "模型": ["数学模型", "建模", "模型建立", "模型求解", "模型验证"],
+    "算法": ["遗传算法", "模拟退火", "粒子群优化", "动态规划", "贪心算法"],
+    "统计": ["回归分析", "时间序列", "概率模型", "假设检验", "方差分析"],
+    "预测": ["预测模型", "趋势分析", "时间序列预测", "机器学习预测"],
+    "评价": ["评价体系", "层次分析法", "模糊评价", "综合评价"],
+}
+
+
+class AhoCorasick:
+    """Minimal Aho-Corasick automaton over characters.
+
+    State 0 is the root. ``goto[s]`` maps a character to the next state, ``fail[s]``
+    is the failure link and ``out[s]`` lists the indices of keys ending at ``s``
+    (including those inherited through failure links).
+    """
+
+    def __init__(self, goto: List[Dict[str, int]], fail: List[int], out: List[List[int]]):
+        self.goto = goto
+        self.fail = fail
+        self.out = out
+
+    @classmethod
+    def build(cls, keys: Sequence[str]) -> "AhoCorasick":
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for idx, key in enumerate(keys):
+            state = 0
+            for ch in key:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(idx)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt].extend(out[fail[nxt]])
+        return cls(goto, fail, out)
+
+    def find(self, text: str) -> List[int]:
+        """Key indices matched in ``text``, in order of match end position."""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        found: List[int] = []
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.extend(out[state])
+        return found
+
+    def to_json(self) -> dict:
+        return {"goto": self.goto, "fail": self.fail, "out": self.out}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "AhoCorasick":
+        return cls(data["goto"], data["fail"], data["out"])
+
+
+class ExpansionDictionary:
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        cache_path: Optional[Path] = None,
+        reload_interval: float = 5.0,
+    ):
+        self.path = Path(path) if path else None
+        self.cache_path = Path(cache_path) if cache_path else None
+        if self.cache_path is None and self.path is not None:
+            self.cache_path = self.path.with_suffix(".cache.json")
+        self.reload_interval = reload_interval
+        self.version = ""
+        self._keys: List[str] = []
+        # (automaton, expansions, max terms per match), replaced as a unit on reload
+        self._compiled = (AhoCorasick.build([]), [], 2)
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _read_source(self) -> tuple:
+        if self.path is not None and self.path.exists():
+            raw = self.path.read_bytes()
+            self._mtime = self.path.stat().st_mtime
+            data = json.loads(raw.decode("utf-8"))
+            return hashlib.sha256(raw).hexdigest()[:16], data
+        self._mtime = None
+        raw = json.dumps(DEFAULT_TERMS, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()[:16], {"terms": DEFAULT_TERMS}
+
+    def _load(self) -> None:
+        version, data = self._read_source()
+        compiled = self._read_cache(version)
+        if compiled is None:
+            terms = {str(k).lower(): list(v) for k, v in (data.get("terms") or {}).items() if k}
+            keys = list(terms)
+            compiled = {
+                "version": version,
+                "max_per_term": int(data.get("max_expansions_per_term", 2)),
+                "keys": keys,
+                "expansions": [terms[k] for k in keys],
+                "automaton": AhoCorasick.build(keys).to_json(),
+            }
+            self._write_cache(compiled)
+        automaton = AhoCorasick.from_json(compiled["automaton"])
+        # swap in one step so concurrent readers see a consistent dictionary
+        self._compiled = (automaton, compiled["expansions"], compiled["max_per_term"])
+        self._keys = compiled["keys"]
+        self.version = version
+        logger.info(f"expansion dictionary loaded terms={len(self._keys)} version={version}")
+
+    def _read_cache(self, version: str) -> Optional[dict]:
+        if self.cache_path is None or not self.cache_path.exists():
+            return None
+        try:
+            with self.cache_path.open("r", encoding="utf-8") as f:
+                compiled = json.load(f)
+        except Exception as e:
+            logger.warning("expansion cache unreadable %s: %s", self.cache_path, e)
+            return None
+        return compiled if compiled.get("version") == version else None
+
+    def _write_cache(self, compiled: dict) -> None:
+        if self.cache_path is None:
+            return
+        try:
+            tmp = self.cache_path.with_suffix(".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(compiled, f, ensure_ascii=False)
+            os.replace(tmp, self.cache_path)
+        except Exception as e:
+            logger.warning("failed to write expansion cache %s: %s", self.cache_path, e)
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if self.path is None or now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                mtime = self.path.stat().st_mtime if self.path.exists() else None
+                if mtime != self._mtime:
+                    self._load()
+            except Exception as e:
+                logger.warning("expansion dictionary reload failed: %s", e)
+
+    def terms_for(self, query: str) -> List[str]:
+        """Expansion terms for every dictionary term found in ``query`` (one pass)."""
+        self._maybe_reload()
+        automaton, expansions, limit = self._compiled
+        seen_keys = set()
+        terms: List[str] = []
+        for idx in automaton.find(query.lower()):
+            if idx in seen_keys:
+                continue
+            seen_keys.add(idx)
+            for term in expansions[idx][:limit]:
+                if term not in terms:
+                    terms.append(term)
+        return terms
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+@lru_cache
+def get_expansion_dictionary() -> ExpansionDictionary:
+    path = Path(os.getenv("QUERY_EXPANSION_PATH") or DEFAULT_PATH)
+    return ExpansionDictionary(
+        path, reload_interval=float(os.getenv("QUERY_EXPANSION_RELOAD_SECONDS", "5"))
+    )
@@ -0,0 +1,323 @@
+"""Hedged, failover-capable composite LLM.
+
+``FailoverLLM`` wraps an ordered list of providers (``LLM_PROVIDERS``, e.g.
+``openrouter:deepseek/deepseek-chat-v3.1:free,google:gemini-2.5-flash,ollama:qwen2.5:7b``)
+and implements the ``BaseLLM`` interface:
+
+- The first provider whose circuit breaker is closed gets the request.
+- If it has not answered within its observed p95 latency (``LLM_HEDGE_DELAY`` until
+  ``LLM_HEDGE_MIN_SAMPLES`` calls have been seen), a hedged request goes to the next
+  provider; whichever answers first wins and the other is cancelled.
+- An error starts the next provider immediately. ``LLM_BREAKER_FAILURES`` consecutive
+  errors open a provider's breaker for ``LLM_BREAKER_COOLDOWN`` seconds, after which
+  one trial call is let through.
+
+Streams race on the first token (hedging on p95 time-to-first-token); once a provider
+has produced a token the answer stays with it.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..logging_utils import emit_metric, get_logger
+
+logger = get_logger("failover")
+
+
+class LatencyWindow:
+    """Latencies (seconds) of the most recent successful calls."""
+
+    def __init__(self, size: int = 200):
+        self._samples: "deque[float]" = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        return float(np.percentile(np.fromiter(self._samples, dtype=np.float64), q))
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = 3, cooldown: float = 30.0):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # a half-open trial call is in flight; other callers keep skipping the provider
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.trial)
+
+    def begin(self) -> bool:
+        """Claim a call: always granted when closed, once per cooldown when half-open."""
+        if not self.allow():
+            return False
+        if self.opened_at is not None:
+            self.trial = True
+        return True
+
+    def release(self) -> None:
+        """A claimed call ended without a verdict (cancelled): free the trial slot."""
+        self.trial = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self) -> None:
+        self.trial = False
+        self.failures += 1
+        # a failed half-open trial re-opens the breaker for another cooldown
+        if self.failures >= self.max_failures or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class _Provider:
+    def __init__(self, name: str, llm, breaker: CircuitBreaker):
+        self.name = name
+        self.llm = llm
+        self.breaker = breaker
+        self.latency = LatencyWindow()
+        self.ttft = LatencyWindow()
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+
+    def stats(self) -> Dict:
+        def ms(window: LatencyWindow, q: float):
+            value = window.percentile(q)
+            return None if value is None else round(value * 1000, 1)
+
+        return {
+            "provider": self.name,
+            "breaker": self.breaker.state,
+            "calls": self.calls,
+            "errors": self.errors,
+            "wins": self.wins,
+            "p50_ms": ms(self.latency, 50),
+            "p95_ms": ms(self.latency, 95),
+            "ttft_p95_ms": ms(self.ttft, 95),
+        }
+
+
+class FailoverLLM:
+    provider = "failover"
+    temperature = None
+
+    def __init__(
+        self,
+        providers: List[tuple],
+        hedge: bool = True,
+        hedge_delay: float = 10.0,
+        min_samples: int = 20,
+        breaker_failures: int = 3,
+        breaker_cooldown: float = 30.0,
+    ):
+        if not providers:
+            raise ValueError("FailoverLLM needs at least one provider")
+        self.providers = [
+            _Provider(name, llm, CircuitBreaker(breaker_failures, breaker_cooldown))
+            for name, llm in providers
+        ]
+        # answers differ per backend, so the answer cache keys on the whole chain
+        self.model = ",".join(p.name for p in self.providers)
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+
+    @classmethod
+    def from_env(cls, spec: Optional[str] = None) -> "FailoverLLM":
+        from .llm import get_llm
+
+        providers = []
+        for item in (spec or os.getenv("LLM_PROVIDERS", "")).split(","):
+            item = item.strip()
+            if not item:
+                continue
+            # model names may contain ':' (ollama tags, openrouter ':free'), providers don't
+            prov, _, model = item.partition(":")
+            try:
+                llm = get_llm(prov, model or None)
+            except Exception as e:
+                logger.warning("skipping LLM provider %s: %s", item, e)
+                continue
+            providers.append((f"{prov}/{getattr(llm, 'model', model)}", llm))
+        return cls(
+            providers,
+            hedge=os.getenv("LLM_HEDGE", "1").lower() not in ("0", "false", "off"),
+            hedge_delay=float(os.getenv("LLM_HEDGE_DELAY", "10")),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            breaker_failures=int(os.getenv("LLM_BREAKER_FAILURES", "3")),
+            breaker_cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+        )
+
+    def stats(self) -> List[Dict]:
+        return [p.stats() for p in self.providers]
+
+    def keep_warm(self) -> None:
+        for p in self.providers:
+            if hasattr(p.llm, "keep_warm"):
+                p.llm.keep_warm()
+
+    def _order(self) -> Tuple[List[_Provider], bool]:
+        """Providers to try, and whether breakers are bypassed because none allows a call
+        (trying them anyway beats failing outright)."""
+        allowed = [p for p in self.providers if p.breaker.allow()]
+        return (allowed, False) if allowed else (list(self.providers), True)
+
+    def _delay(self, provider: _Provider, window: LatencyWindow) -> float:
+        if len(window) < self.min_samples:
+            return self.hedge_delay
+        return window.percentile(95)
+
+    def _failed(self, provider: _Provider, role: str, t0: float, e: Exception) -> None:
+        provider.errors += 1
+        provider.breaker.record_failure()
+        logger.warning("LLM provider %s failed (%s): %s", provider.name, role, e)
+        emit_metric(
+            "llm_call",
+            provider=provider.name,
+            role=role,
+            ok=False,
+            latency_ms=round((time.perf_counter() - t0) * 1000, 1),
+            error=str(e) or repr(e),
+        )
+
+    async def _race(self, start, window_of, discard=None):
+        """Run ``start(provider)`` coroutines with hedging/failover; first success wins.
+
+        Returns ``(provider, role, result)``. Attempts still running are cancelled; the
+        results of attempts that finished but lost are handed to ``discard``.
+        """
+        order, forced = self._order()
+        pending: Dict[asyncio.Task, tuple] = {}
+        errors: List[str] = []
+        nxt = 0
+
+        def launch(role: str) -> None:
+            nonlocal nxt
+            while nxt < len(order):
+                provider = order[nxt]
+                nxt += 1
+                if forced:
+                    trial = False
+                    break
+                # another request may have claimed a half-open trial since _order()
+                if provider.breaker.begin():
+                    trial = provider.breaker.opened_at is not None
+                    break
+            else:
+                return
+            provider.calls += 1
+            t0 = time.perf_counter()
+            # ``trial``: this attempt holds the breaker's half-open slot and must free it
+            pending[asyncio.create_task(start(provider))] = (provider, role, t0, trial)
+            if role == "hedge":
+                emit_metric("llm_hedge", provider=provider.name)
+
+        launch("primary")
+        try:
+            while pending:
+                timeout = None
+                if self.hedge and nxt < len(order):
+                    last = order[nxt - 1]
+                    timeout = self._delay(last, window_of(last))
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    launch("hedge")
+                    continue
+                for task in done:
+                    provider, role, t0, _ = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self._failed(provider, role, t0, e)
+                        errors.append(f"{provider.name}: {str(e) or repr(e)}")
+                        continue
+                    provider.breaker.record_success()
+                    provider.wins += 1
+                    emit_metric(
+                        "llm_call",
+                        provider=provider.name,
+                        role=role,
+                        ok=True,
+                        latency_ms=round((time.perf_counter() - t0) * 1000, 1),
+                        raced=len(pending),
+                    )
+                    return provider, role, result
+                if nxt < len(order):
+                    launch("failover")
+            raise RuntimeError("all LLM providers failed: " + "; ".join(errors))
+        finally:
+            for task, (provider, _, _, trial) in pending.items():
+                task.cancel()
+                if trial:
+                    provider.breaker.release()
+            if pending:
+                results = await asyncio.gather(*pending, return_exceptions=True)
+                for result in results:
+                    if discard is not None and not isinstance(result, BaseException):
+                        await discard(result)
+
+    async def acomplete(self, question: str, contexts: List[Dict], stream: bool = False) -> str:
+        async def start(provider: _Provider) -> str:
+            t0 = time.perf_counter()
+            answer = await provider.llm.acomplete(question, contexts, stream=stream)
+            provider.latency.add(time.perf_counter() - t0)
+            return answer
+
+        _, _, answer = await self._race(start, lambda p: p.latency)
+        return answer
+
+    async def astream(self, question: str, contexts: List[Dict]) -> AsyncGenerator[str, None]:
+        async def start(provider: _Provider):
+            t0 = time.perf_counter()
+            gen = provider.llm.astream(question, contexts)
+            try:
+                first = await gen.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except BaseException:
+                await gen.aclose()
+                raise
+            provider.ttft.add(time.perf_counter() - t0)
+            return t0, gen, first
+
+        async def discard(result) -> None:
+            await result[1].aclose()
+
+        provider, role, (t0, gen, first) = await self._race(start, lambda p: p.ttft, discard)
+        try:
+            if first is None:
+                return
+            yield first
+            async for delta in gen:
+                yield delta
+            provider.latency.add(time.perf_counter() - t0)
+        except Exception as e:
+            # too late to switch providers once tokens have been sent
+            self._failed(provider, role, t0, e)
+            raise
+        finally:
+            await gen.aclose()
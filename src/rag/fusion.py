@@ -0,0 +1,102 @@
+"""Hybrid score fusion over (row id, score) arrays.
+
+Each retrieval stage reports its hits as a ``Ranked`` pair of NumPy arrays. ``fuse``
+aligns the two lists on row id, normalizes each according to ``method`` and returns
+the combined ranking, truncated to ``limit`` rows, without building per-hit dicts.
+
+Methods:
+
+- ``weighted``: ``(1 - w) * vector + w * bm25`` on the stage scores as reported
+  (cosine similarity and max-normalized BM25), the historical behaviour.
+- ``minmax``: each list rescaled to [0, 1] before the weighted sum.
+- ``zscore``: each list standardized; rows missing from a list get its lowest score.
+- ``rrf``: weighted reciprocal rank fusion, ``w / (rrf_k + rank)``; ignores score scales.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+METHODS = ("weighted", "minmax", "zscore", "rrf")
+
+
+class Ranked(NamedTuple):
+    rows: np.ndarray  # int64 row ids into the store, best first
+    scores: np.ndarray  # float32 stage score used for fusion
+    raw: np.ndarray  # float32 unnormalized score (e.g. raw BM25)
+
+    @classmethod
+    def empty(cls) -> "Ranked":
+        return cls(np.zeros(0, np.int64), np.zeros(0, np.float32), np.zeros(0, np.float32))
+
+    def select(self, mask: np.ndarray) -> "Ranked":
+        return Ranked(self.rows[mask], self.scores[mask], self.raw[mask])
+
+
+class Fused(NamedTuple):
+    rows: np.ndarray
+    combined: np.ndarray
+    vec: np.ndarray  # vector stage score, 0 where the row was not a vector hit
+    bm25: np.ndarray  # bm25 stage score, 0 where the row was not a bm25 hit
+    bm25_raw: np.ndarray
+    in_vec: np.ndarray
+    in_bm25: np.ndarray
+
+
+def _normalize(scores: np.ndarray, method: str, rrf_k: int) -> np.ndarray:
+    if scores.size == 0 or method == "weighted":
+        return scores
+    if method == "minmax":
+        lo, hi = scores.min(), scores.max()
+        return (scores - lo) / (hi - lo) if hi > lo else np.ones_like(scores)
+    if method == "zscore":
+        std = scores.std()
+        return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+    # rrf: lists arrive best first, so the position is the rank
+    return (1.0 / (rrf_k + 1 + np.arange(scores.size))).astype(np.float32)
+
+
+def fuse(
+    vec: Ranked,
+    bm25: Ranked,
+    bm25_weight: float,
+    method: str = "weighted",
+    limit: Optional[int] = None,
+    rrf_k: int = 60,
+) -> Fused:
+    if method not in METHODS:
+        raise ValueError(f"unknown fusion method {method!r}, expected one of {METHODS}")
+    rows = np.union1d(vec.rows, bm25.rows)
+    n = rows.size
+    vi = np.searchsorted(rows, vec.rows)
+    bi = np.searchsorted(rows, bm25.rows)
+
+    def scatter(idx, values, fill=0.0):
+        out = np.full(n, fill, dtype=np.float32)
+        out[idx] = values
+        return out
+
+    vnorm = _normalize(vec.scores, method, rrf_k)
+    bnorm = _normalize(bm25.scores, method, rrf_k)
+    vfill = float(vnorm.min()) if method == "zscore" and vnorm.size else 0.0
+    bfill = float(bnorm.min()) if method == "zscore" and bnorm.size else 0.0
+    combined = scatter(vi, vnorm, vfill) * (1 - bm25_weight) + scatter(bi, bnorm, bfill) * (
+        bm25_weight
+    )
+
+    order = np.argsort(-combined, kind="stable")
+    if limit is not None:
+        order = order[:limit]
+    in_vec = np.zeros(n, dtype=bool)
+    in_vec[vi] = True
+    in_bm25 = np.zeros(n, dtype=bool)
+    in_bm25[bi] = True
+    return Fused(
+        rows=rows[order],
+        combined=combined[order],
+        vec=scatter(vi, vec.scores)[order],
+        bm25=scatter(bi, bm25.scores)[order],
+        bm25_raw=scatter(bi, bm25.raw)[order],
+        in_vec=in_vec[order],
+        in_bm25=in_bm25[order],
+    )
@@ -0,0 +1,96 @@
+"""Compact retrieval result.
+
+A ``Hit`` holds a row id, the scores computed for it and a reference to the store's
+metadata list; content, source and hash are read from the shared metadata on access
+instead of being copied into a new dict at every retrieval stage. Hits support the
+read-only dict protocol (``hit["score"]``, ``hit.get("source")``, ``"content" in hit``)
+so existing consumers keep working, and ``to_dict()`` materializes one at the API
+boundary.
+"""
+
+from typing import Any, Dict, List, Optional
+
+# Per-chunk fields that are internal to the index and never leave it
+_INTERNAL_FIELDS = ("vector", "minhash")
+
+
+class Hit:
+    __slots__ = ("row", "score", "combined", "vec_score", "bm25_score", "bm25_raw", "_metas")
+
+    _SCORE_FIELDS = ("combined", "vec_score", "bm25_score", "score")
+
+    def __init__(
+        self,
+        metas: List[Dict[str, Any]],
+        row: int,
+        score: float,
+        combined: Optional[float] = None,
+        vec_score: Optional[float] = None,
+        bm25_score: Optional[float] = None,
+        bm25_raw: Optional[float] = None,
+    ):
+        self._metas = metas
+        self.row = row
+        self.score = score
+        self.combined = combined
+        self.vec_score = vec_score
+        self.bm25_score = bm25_score
+        self.bm25_raw = bm25_raw
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        return self._metas[self.row]
+
+    @property
+    def content(self) -> str:
+        return self.meta.get("content", "")
+
+    @property
+    def source(self) -> Optional[str]:
+        return self.meta.get("source")
+
+    @property
+    def hash(self) -> Optional[str]:
+        return self.meta.get("hash")
+
+    def _field(self, key: str):
+        if key == "row":
+            return self.row
+        if key in self._SCORE_FIELDS or key == "bm25_raw":
+            return getattr(self, key)
+        return self.meta.get(key)
+
+    def __getitem__(self, key: str):
+        value = self._field(key)
+        if value is None and key not in self:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default=None):
+        value = self._field(key)
+        return default if value is None else value
+
+    def __contains__(self, key: str) -> bool:
+        if key == "row":
+            return True
+        if key in self._SCORE_FIELDS or key == "bm25_raw":
+            return getattr(self, key) is not None
+        return key in self.meta
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for key in self._SCORE_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                out[key] = value
+        out.update((k, v) for k, v in self.meta.items() if k not in _INTERNAL_FIELDS)
+        out["row"] = self.row
+        if self.bm25_raw is not None:
+            out["bm25_raw"] = self.bm25_raw
+        return out
+
+    def __repr__(self) -> str:
+        return (
+            f"Hit(row={self.row}, score={self.score:.4f}, "
+            f"source={self.source!r}, hash={self.hash!r})"
+        )
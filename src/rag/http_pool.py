@@ -0,0 +1,113 @@
+"""Shared, long-lived HTTP clients for LLM and embedding providers.
+
+Opening an ``httpx.AsyncClient`` per call pays a fresh TCP (+TLS) handshake on every
+answer. Clients here are created lazily, keyed by a provider name, and reused with
+keep-alive (and HTTP/2 when the optional ``h2`` package is installed).
+
+An ``AsyncClient``'s connection pool is bound to the event loop it first ran on, while
+Django's ``async_to_sync`` and the CLI's ``asyncio.run`` create their own loops, so async
+clients are kept per (event loop, name). Clients for a loop are dropped together with
+the loop; ``aclose_clients()`` closes them explicitly and ``close_clients()`` runs at
+interpreter exit.
+
+Pool sizing is configured with ``HTTP_MAX_CONNECTIONS``, ``HTTP_MAX_KEEPALIVE``,
+``HTTP_KEEPALIVE_EXPIRY``, ``HTTP_TIMEOUT``, ``HTTP_CONNECT_TIMEOUT`` and ``HTTP_HTTP2``.
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+from typing import Dict
+
+import httpx
+
+from ..logging_utils import get_logger
+
+logger = get_logger("http_pool")
+
+_LOCK = threading.Lock()
+_SYNC_CLIENTS: Dict[str, httpx.Client] = {}
+_ASYNC_CLIENTS: (
+    "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]"
+) = weakref.WeakKeyDictionary()
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("HTTP_HTTP2", "1").lower() in ("0", "false", "off"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_kwargs() -> dict:
+    return {
+        "timeout": httpx.Timeout(
+            float(os.getenv("HTTP_TIMEOUT", "120")),
+            connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "10")),
+        ),
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+        ),
+        "http2": _http2_enabled(),
+    }
+
+
+def async_client(name: str) -> httpx.AsyncClient:
+    """Pooled async client for ``name`` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _LOCK:
+        clients = _ASYNC_CLIENTS.get(loop)
+        if clients is None:
+            clients = _ASYNC_CLIENTS[loop] = {}
+        client = clients.get(name)
+        if client is None or client.is_closed:
+            kwargs = _client_kwargs()
+            client = clients[name] = httpx.AsyncClient(**kwargs)
+            logger.debug("created async http client name=%s http2=%s", name, kwargs["http2"])
+    return client
+
+
+def sync_client(name: str) -> httpx.Client:
+    """Pooled blocking client for ``name`` (thread-safe, shared across threads)."""
+    with _LOCK:
+        client = _SYNC_CLIENTS.get(name)
+        if client is None or client.is_closed:
+            client = _SYNC_CLIENTS[name] = httpx.Client(**_client_kwargs())
+    return client
+
+
+async def aclose_clients() -> None:
+    """Close the async clients bound to the running loop (e.g. before ``asyncio.run`` ends)."""
+    with _LOCK:
+        clients = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+def close_clients() -> None:
+    """Close every pooled client; registered to run at interpreter exit."""
+    with _LOCK:
+        sync_clients = list(_SYNC_CLIENTS.values())
+        _SYNC_CLIENTS.clear()
+        loops = list(_ASYNC_CLIENTS.items())
+        _ASYNC_CLIENTS.clear()
+    for client in sync_clients:
+        client.close()
+    for loop, clients in loops:
+        if loop.is_closed() or loop.is_running():
+            continue
+        for client in clients.values():
+            try:
+                loop.run_until_complete(client.aclose())
+            except Exception as e:  # best effort at shutdown
+                logger.debug("closing http client failed: %s", e)
+
+
+atexit.register(close_clients)
@@ -1,56 +1,45 @@
+import atexit
 import json
 import os
-from typing import AsyncGenerator, Dict, List, Optional, Protocol
-
-import httpx
+import threading
+import time
+from typing import AsyncGenerator, Dict, List, Optional, Protocol, Tuple
+
+from ..logging_utils import emit_metric, get_logger
+from .http_pool import async_client
+
+# SYSTEM_PROMPT / PROMPT_VERSION are re-exported for existing importers
+from .prompt import (  # noqa: F401
+    PROMPT_VERSION,
+    SYSTEM_PROMPT,
+    build_user_prompt,
+    estimate_tokens,
+    prompt_tokens,
+)
+from .rate_limit import get_limiter
 
 OPENROUTER_ENDPOINT = "https://openrouter.ai/api/v1/chat/completions"
 MODEL = "deepseek/deepseek-chat-v3.1:free"
 
-SYSTEM_PROMPT = (
-    "# Role：数学建模竞赛专家助理"
-    "## Background：用户正在寻求一个在数学建模竞赛（如MathorCup、美赛、国赛等）方面提供专业指导的智能助理。他们可能需要解决实际问题、选择合适的模型、撰写论文或提高竞赛经验。用户希望获得结构化的建议，并参考相关资料，以确保解决方案的严谨性和准确性。"
-    "## Attention：请务必挑选提供的资料以便进行严谨推理，给出最合理的宏观建议和确保正确的细节指导，需要注意的是提供的资料不一定与问题是强相关的所以需要辨别。对于模型选择问题，需着重说明选择的原因。如果信息不足，应明确指出缺口并提出建议。避免编造不存在的内容，保持学术、清晰、严谨的风格。始终牢记你的目标是帮助用户在数学建模竞赛中取得成功。"
-    "## Profile："
-    "- Language: 中文"
-    "- Description: 专注于为数学建模竞赛提供专业指导的智能助理，擅长实际问题抽象、模型选择、方案验证和论文写作指导。"
-    "### Skills:"
-    "- 深刻理解各种数学建模竞赛（MathorCup、美赛、国赛等）的规则和评分标准"
-    "- 能够将实际问题抽象成标准的数学模型，如优化模型、微分方程模型、统计模型等"
-    "- 熟练掌握各种常用的数学建模方法和算法，如线性规划、整数规划、动态规划、模拟退火、遗传算法等"
-    "- 具备严谨的数学推理能力和清晰的逻辑思维能力，确保提出的解决方案的正确性和可行性"
-    "- 能够撰写符合学术规范的数学建模论文，包括摘要、问题重述、模型建立、求解方法、结果分析、参考文献等"
-    "## Goals:"
-    "- 准确理解用户提出的问题，并重述问题和关键建模要素，确保双方理解一致"
-    "- 基于提供的资料，构建清晰的建模思路，包括数据收集与预处理、模型选择与建立、模型求解与验证等环节"
-    "- 对于不同的建模方法进行比较，并以表格形式呈现，方便用户选择最合适的方法"
-    "- 使用[ref i] 标记引用参考资料，并在末尾列出所有来源文件及简短原文，确保方案的可追溯性"
-    "- 针对用户在建模过程中遇到的具体问题，提供详细的模型选择建议，并解释选择该模型的原因"
-    "## Constrains:"
-    "- 必须基于提供的资料进行回答，不得编造不存在的内容或提供未经证实的建议"
-    "- 必须保持学术、清晰、严谨的风格，避免使用口语化或不专业的表达"
-    "- 必须确保所有建议和方案符合数学建模的基本原则和规范"
-    "- 如果信息不足以回答用户的问题，必须明确指出缺口，并提出获取数据或补充分析的建议"
-    "- 当用户提的是“论文写作/经验/流程”时，必须结合数模竞赛的特点进行建议，不得泛泛而谈"
-    "## Workflow:"
-    "1. 仔细阅读用户提出的问题，并分析问题的核心需求和背景信息"
-    "2. 查阅提供的资料，提取与问题相关的关键信息和建模要素"
-    "3. 构建结构化的建模思路，包括数据收集与预处理、模型选择与建立、模型求解与验证等环节"
-    "4. 基于资料和建模思路，给出合理的宏观建议和确保正确的细节指导"
-    "5. 使用[ref i] 标记引用参考资料，并在末尾列出所有来源文件及简短原文"
-    "## OutputFormat:"
-    "- 重述问题与关键建模要素，确保清晰简洁"
-    "- 给出结构化的建模思路，包括数据->预处理->模型->求解->验证等环节"
-    "- 对于不同的建模方法进行比较，并以表格形式呈现"
-    "## Suggestions:"
-    "- 注重对实际问题的深刻理解，将实际问题转化为数学模型时，要抓住问题的本质和核心要素"
-    "- 持续学习和掌握新的数学建模方法和算法，保持知识的更新和扩展"
-    "- 在建模过程中，要注重数据的质量和预处理，确保数据的准确性和可靠性"
-    "- 提高模型的求解和验证能力，确保模型的有效性和实用性"
-    "- 培养良好的论文写作习惯，注重论文的逻辑性和可读性"
-    "## Initialization"
-    "作为数学建模竞赛专家助理，你必须遵守以上约束条件，使用默认中文与用户交流。"
-)
+logger = get_logger("llm")
+
+
+async def _admit(provider: str, user_prompt: str):
+    """Wait for the provider's rate-limit quota; returns (limiter, estimated tokens)."""
+    limiter = get_limiter(provider)
+    tokens = prompt_tokens(user_prompt) + limiter.completion_reserve
+    await limiter.acquire(tokens)
+    return limiter, tokens
+
+
+def _settle_stream(
+    limiter, est: int, user_prompt: str, parts: List[str], reported: Optional[int]
+) -> None:
+    """Correct a streamed call's estimate with the usage the stream reported, or else the
+    prompt plus the tokens actually emitted (also when the stream was cut short)."""
+    if reported is None:
+        reported = prompt_tokens(user_prompt) + estimate_tokens("".join(parts))
+    limiter.settle(est, reported)
 
 
 class BaseLLM(Protocol):
@@ -59,6 +48,9 @@ class BaseLLM(Protocol):
 
 
 class OpenRouterLLM:
+    provider = "openrouter"
+    temperature = 0.2
+
     def __init__(self, api_key: str | None = None, model: str | None = None):
         self.api_key = api_key or os.getenv("OPENROUTER_API_KEY", "")
         self.model = model or MODEL
@@ -66,20 +58,14 @@ class OpenRouterLLM:
             raise ValueError("OPENROUTER_API_KEY 未设置")
 
     async def acomplete(self, question: str, contexts: List[Dict], stream: bool = False) -> str:
-        context_blocks = []
-        for i, c in enumerate(contexts):
-            snippet = c.get("content", "")[:1600]
-            src = c.get("source", "")
-            context_blocks.append(f"[ref {i+1}] 来源: {src}\n{snippet}")
-        context_text = "\n\n".join(context_blocks)
-        user_prompt = f"问题：{question}\n\n已检索片段：\n{context_text}\n\n请依据片段回答。"
+        user_prompt = build_user_prompt(question, contexts)
         payload = {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
-            "temperature": 0.2,
+            "temperature": self.temperature,
             "stream": stream,
         }
         headers = {
@@ -87,18 +73,24 @@ class OpenRouterLLM:
             "HTTP-Referer": "http://localhost",
             "X-Title": "math-modeling-rag",
         }
-        async with httpx.AsyncClient(timeout=120) as client:
-            if not stream:
-                r = await client.post(OPENROUTER_ENDPOINT, json=payload, headers=headers)
-                r.raise_for_status()
-                data = r.json()
-                return data["choices"][0]["message"]["content"]
-            # streaming mode
-            async with client.stream(
-                "POST", OPENROUTER_ENDPOINT, json=payload, headers=headers
-            ) as resp:
-                resp.raise_for_status()
-                full = []
+        client = async_client("openrouter")
+        limiter, est = await _admit(self.provider, user_prompt)
+        if not stream:
+            r = await client.post(OPENROUTER_ENDPOINT, json=payload, headers=headers)
+            limiter.observe(r.headers, r.status_code)
+            r.raise_for_status()
+            data = r.json()
+            limiter.settle(est, (data.get("usage") or {}).get("total_tokens"))
+            return data["choices"][0]["message"]["content"]
+        # streaming mode
+        async with client.stream(
+            "POST", OPENROUTER_ENDPOINT, json=payload, headers=headers
+        ) as resp:
+            limiter.observe(resp.headers, resp.status_code)
+            resp.raise_for_status()
+            full: List[str] = []
+            usage = None
+            try:
                 async for line in resp.aiter_lines():
                     if not line:
                         continue
@@ -108,29 +100,26 @@ class OpenRouterLLM:
                             break
                         try:
                             js = json.loads(data_str)
+                            usage = (js.get("usage") or {}).get("total_tokens", usage)
                             delta = js.get("choices", [{}])[0].get("delta", {}).get("content")
                             if delta:
                                 full.append(delta)
                         except Exception:
                             continue
-                return "".join(full)
+            finally:
+                _settle_stream(limiter, est, user_prompt, full, usage)
+            return "".join(full)
 
     async def astream(self, question: str, contexts: List[Dict]) -> AsyncGenerator[str, None]:
         "Yield markdown text chunks as they arrive."
-        context_blocks = []
-        for i, c in enumerate(contexts):
-            snippet = c.get("content", "")[:1600]
-            src = c.get("source", "")
-            context_blocks.append(f"[ref {i+1}] 来源: {src}\n{snippet}")
-        context_text = "\n\n".join(context_blocks)
-        user_prompt = f"问题：{question}\n\n已检索片段：\n{context_text}\n\n请依据片段回答。"
+        user_prompt = build_user_prompt(question, contexts)
         payload = {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
-            "temperature": 0.2,
+            "temperature": self.temperature,
             "stream": True,
         }
         headers = {
@@ -138,10 +127,15 @@ class OpenRouterLLM:
             "HTTP-Referer": "http://localhost",
             "X-Title": "math-modeling-rag",
         }
-        async with httpx.AsyncClient(timeout=120) as client:
+        client = async_client("openrouter")
+        limiter, est = await _admit(self.provider, user_prompt)
+        parts: List[str] = []
+        usage = None
+        try:
             async with client.stream(
                 "POST", OPENROUTER_ENDPOINT, json=payload, headers=headers
             ) as resp:
+                limiter.observe(resp.headers, resp.status_code)
                 resp.raise_for_status()
                 async for line in resp.aiter_lines():
                     if not line:
@@ -152,11 +146,15 @@ class OpenRouterLLM:
                             break
                         try:
                             js = json.loads(data_str)
+                            usage = (js.get("usage") or {}).get("total_tokens", usage)
                             delta = js.get("choices", [{}])[0].get("delta", {}).get("content")
-                            if delta:
-                                yield delta
                         except Exception:
                             continue
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+        finally:
+            _settle_stream(limiter, est, user_prompt, parts, usage)
 
 
 # --- Provider registry and factory (minimal, backward-compatible) ---
@@ -199,8 +197,13 @@ def get_llm(
 def get_default_llm() -> BaseLLM:
     """Convenience: use env LLM_PROVIDER/LLM_MODEL and provider-specific keys.
 
-    Fallbacks to OpenRouter + default MODEL for backwards compatibility.
+    With LLM_PROVIDERS set (``provider:model`` list), returns a hedged FailoverLLM over
+    those providers. Fallbacks to OpenRouter + default MODEL for backwards compatibility.
     """
+    if os.getenv("LLM_PROVIDERS"):
+        from .failover import FailoverLLM
+
+        return FailoverLLM.from_env()
     return get_llm()
 
 
@@ -208,11 +211,17 @@ class GeminiLLM:
     """Google AI Studio Gemini API wrapper, compatible with BaseLLM.
 
     Notes:
-    - Use v1 endpoint and append API key as query parameter.
-    - Send a single user message; prefix with SYSTEM_PROMPT to instruct the model.
-    - Streaming is not implemented (Gemini streaming requires different handling).
+    - Use v1 endpoint and append API key as query parameter; on a 400 retry once on
+      v1beta and keep using it for later calls.
+    - SYSTEM_PROMPT is sent as ``systemInstruction``, the question and contexts as a
+      single user message.
+    - ``astream`` reads ``streamGenerateContent?alt=sse`` and yields text parts as
+      each SSE event arrives.
     """
 
+    provider = "google"
+    temperature = None
+
     def __init__(self, api_key: str, model: str = "gemini-1.5-pro-latest"):
         self.api_key = api_key
         # default to a stable published model
@@ -222,89 +231,171 @@ class GeminiLLM:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY 未设置")
 
-    def _build_endpoint(self, use_beta: bool) -> str:
+    def _build_endpoint(self, use_beta: bool, stream: bool = False) -> str:
         base = "https://generativelanguage.googleapis.com"
         version = "v1beta" if use_beta else "v1"
+        if stream:
+            return (
+                f"{base}/{version}/models/{self.model}:streamGenerateContent"
+                f"?alt=sse&key={self.api_key}"
+            )
         return f"{base}/{version}/models/{self.model}:generateContent?key={self.api_key}"
 
-    async def acomplete(self, question: str, contexts: List[Dict], stream: bool = False) -> str:
+    def _payload(self, question: str, contexts: List[Dict]) -> dict:
         # build context summary
-        ctx = []
-        for i, c in enumerate(contexts):
-            snip = c.get("content", "")[:1600]
-            src = c.get("source", "")
-            ctx.append(f"[ref {i+1}] 来源: {src}\n{snip}")
-        context_text = "\n\n".join(ctx)
-
-        # combine system prompt + user prompt into a single user message to avoid role issues
-        user_prompt = (
-            SYSTEM_PROMPT
-            + "\n\n"
-            + f"问题：{question}\n\n已检索片段：\n{context_text}\n\n请依据片段回答。"
-        )
+        # contexts are packed into the token budget; the question is never cut
+        user_prompt = build_user_prompt(question, contexts)
 
-        # keep prompt within reasonable size to avoid API rejections
-        max_len = 28000
-        if len(user_prompt) > max_len:
-            user_prompt = user_prompt[:max_len]
+        return {
+            "systemInstruction": {"parts": [{"text": SYSTEM_PROMPT}]},
+            "contents": [{"role": "user", "parts": [{"text": user_prompt}]}],
+        }
 
-        payload = {"contents": [{"role": "user", "parts": [{"text": user_prompt}]}]}
+    @staticmethod
+    def _parts_text(data: dict) -> Optional[str]:
+        """Concatenated text of the first candidate, or None if the response has none."""
+        feedback = data.get("promptFeedback") or {}
+        if feedback.get("blockReason"):
+            raise RuntimeError(f"Gemini blocked the prompt: {feedback['blockReason']}")
+        try:
+            parts = data["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError, TypeError):
+            return None
+        return "".join(p.get("text", "") for p in parts if isinstance(p, dict))
+
+    @staticmethod
+    def _error(status: int, body: bytes) -> RuntimeError:
+        text = body.decode("utf-8", "replace") if body else f"<no body, status={status}>"
+        return RuntimeError(f"Gemini API request failed (status={status}): {text}")
 
+    async def acomplete(self, question: str, contexts: List[Dict], stream: bool = False) -> str:
+        if stream:
+            return "".join([delta async for delta in self.astream(question, contexts)])
+        payload = self._payload(question, contexts)
         headers = {"Content-Type": "application/json"}
 
-        # Try primary endpoint (v1). If 400 and model is 2.5-series, retry with v1beta.
-        tried_beta = False
-        async with httpx.AsyncClient(timeout=120) as client:
-            endpoint = self.endpoint
-            for attempt in range(2):
-                r = await client.post(endpoint, headers=headers, json=payload)
-                if r.status_code == 200:
-                    data = r.json()
-                    # response parsing - try common locations
-                    try:
-                        return data["candidates"][0]["content"]["parts"][0]["text"]
-                    except Exception:
-                        if isinstance(data.get("output"), dict):
-                            parts = data["output"].get("content", {}).get("parts")
-                            if parts:
-                                return parts[0].get("text", "")
-                        return json.dumps(data, ensure_ascii=False)
-
-                # if bad request and model is 2.5, try beta endpoint once
-                if r.status_code == 400 and not tried_beta and "2.5" in self.model:
-                    tried_beta = True
-                    endpoint = self._build_endpoint(use_beta=True)
-                    continue
-
-                # otherwise surface helpful error text
-                text = ""
-                try:
-                    text = r.text
-                except Exception:
-                    text = f"<no body, status={r.status_code}>"
-                raise RuntimeError(f"Gemini API request failed (status={r.status_code}): {text}")
+        # Try primary endpoint (v1). If 400, retry with v1beta once.
+        use_beta = self._use_beta_by_default
+        client = async_client("gemini")
+        user_prompt = payload["contents"][0]["parts"][0]["text"]
+        # admitted once: the v1beta retry of a rejected v1 request is the same prompt
+        limiter, est = await _admit(self.provider, user_prompt)
+        while True:
+            r = await client.post(self._build_endpoint(use_beta), headers=headers, json=payload)
+            limiter.observe(r.headers, r.status_code)
+            if r.status_code == 200:
+                self._use_beta_by_default = use_beta
+                data = r.json()
+                limiter.settle(est, (data.get("usageMetadata") or {}).get("totalTokenCount"))
+                # response parsing - try common locations
+                text = self._parts_text(data)
+                if text is not None:
+                    return text
+                if isinstance(data.get("output"), dict):
+                    parts = data["output"].get("content", {}).get("parts")
+                    if parts:
+                        return parts[0].get("text", "")
+                return json.dumps(data, ensure_ascii=False)
+
+            # if bad request on v1 (e.g. 2.5-series models), try beta endpoint once
+            if r.status_code == 400 and not use_beta:
+                use_beta = True
+                continue
+
+            # otherwise surface helpful error text
+            raise self._error(r.status_code, r.content)
+
+    def _sse_event(self, data_str: str) -> Tuple[Optional[str], Optional[int]]:
+        """(text, total tokens so far) of one SSE event; the last event has the total."""
+        try:
+            js = json.loads(data_str)
+        except ValueError:
+            return None, None
+        return self._parts_text(js), (js.get("usageMetadata") or {}).get("totalTokenCount")
 
     async def astream(self, question: str, contexts: List[Dict]) -> AsyncGenerator[str, None]:
-        # Gemini streaming requires SSE / bidi; not implemented here — return full answer
-        result = await self.acomplete(question, contexts, stream=False)
-        yield result
+        "Yield text parts as Gemini emits them (one SSE event per partial response)."
+        payload = self._payload(question, contexts)
+        headers = {"Content-Type": "application/json"}
+        use_beta = self._use_beta_by_default
+        client = async_client("gemini")
+        user_prompt = payload["contents"][0]["parts"][0]["text"]
+        limiter, est = await _admit(self.provider, user_prompt)
+        parts: List[str] = []
+        usage = None
+        try:
+            while True:
+                endpoint = self._build_endpoint(use_beta, stream=True)
+                async with client.stream("POST", endpoint, headers=headers, json=payload) as resp:
+                    limiter.observe(resp.headers, resp.status_code)
+                    if resp.status_code != 200:
+                        body = await resp.aread()
+                        if resp.status_code == 400 and not use_beta:
+                            use_beta = True
+                            continue
+                        raise self._error(resp.status_code, body)
+                    self._use_beta_by_default = use_beta
+                    # an SSE event may span several data: lines; it ends at a blank line
+                    buf: List[str] = []
+                    async for line in resp.aiter_lines():
+                        if line.startswith("data:"):
+                            buf.append(line[len("data:") :].strip())
+                            continue
+                        if line or not buf:
+                            continue
+                        (delta, total), buf = self._sse_event("".join(buf)), []
+                        usage = total or usage
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                    if buf:
+                        delta, total = self._sse_event("".join(buf))
+                        usage = total or usage
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                    return
+        finally:
+            _settle_stream(limiter, est, user_prompt, parts, usage)
 
 
 class OllamaLLM:
-    """Minimal Ollama chat wrapper, compatible with BaseLLM interface."""
+    """Minimal Ollama chat wrapper, compatible with BaseLLM interface.
+
+    Requests carry ``keep_alive`` (OLLAMA_KEEP_ALIVE) so the model stays loaded between
+    asks. Long-running processes may call :meth:`keep_warm` to also ping it every
+    OLLAMA_PING_INTERVAL seconds through idle periods, until OLLAMA_KEEPWARM_IDLE
+    seconds pass without a real request. SYSTEM_PROMPT is always the first message, byte-identical,
+    so the server can reuse the KV cache of that prefix. ``options`` (plus
+    OLLAMA_NUM_CTX / OLLAMA_NUM_THREAD / OLLAMA_OPTIONS) are passed through. Each
+    answer's load and prompt-eval durations are reported as an ``ollama_timing`` metric.
+    """
 
-    def __init__(self, model: str, base_url: str = "http://127.0.0.1:11434"):
+    provider = "ollama"
+    temperature = None
+
+    def __init__(
+        self,
+        model: str,
+        base_url: str = "http://127.0.0.1:11434",
+        keep_alive: Optional[str] = None,
+        options: Optional[Dict] = None,
+    ):
         self.model = model
         self.base_url = base_url.rstrip("/")
-
-    async def acomplete(self, question: str, contexts: List[Dict], stream: bool = False) -> str:
-        ctx = []
-        for i, c in enumerate(contexts):
-            snip = c.get("content", "")[:1600]
-            src = c.get("source", "")
-            ctx.append(f"[ref {i+1}] 来源: {src}\n{snip}")
-        context_text = "\n\n".join(ctx)
-        user_prompt = f"问题：{question}\n\n已检索片段：\n{context_text}\n\n请依据片段回答。"
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        self.options = _ollama_options_from_env()
+        self.options.update(options or {})
+
+    def keep_warm(self) -> None:
+        """Start the background keep-alive ping for this server and model (API process)."""
+        interval = float(os.getenv("OLLAMA_PING_INTERVAL", "240"))
+        if interval > 0:
+            idle = float(os.getenv("OLLAMA_KEEPWARM_IDLE", "3600"))
+            _OllamaKeepWarm.start(self.base_url, self.model, self.keep_alive, interval, idle)
+
+    def _payload(self, question: str, contexts: List[Dict], stream: bool) -> Tuple[dict, str]:
+        user_prompt = build_user_prompt(question, contexts)
         payload = {
             "model": self.model,
             "messages": [
@@ -312,58 +403,173 @@ class OllamaLLM:
                 {"role": "user", "content": user_prompt},
             ],
             "stream": stream,
+            "keep_alive": self.keep_alive,
         }
+        if self.options:
+            payload["options"] = self.options
+        return payload, user_prompt
+
+    def _report(self, data: dict, limiter, est: int) -> None:
+        """Record the timings Ollama returns with the final response (durations in ns)."""
+        if "eval_count" in data:
+            limiter.settle(est, data.get("prompt_eval_count", 0) + data["eval_count"])
+        if "total_duration" not in data:
+            return
+
+        def ms(key: str):
+            value = data.get(key)
+            return None if value is None else round(value / 1e6, 1)
+
+        emit_metric(
+            "ollama_timing",
+            model=self.model,
+            load_ms=ms("load_duration"),
+            prompt_eval_ms=ms("prompt_eval_duration"),
+            prompt_eval_count=data.get("prompt_eval_count"),
+            eval_ms=ms("eval_duration"),
+            eval_count=data.get("eval_count"),
+            total_ms=ms("total_duration"),
+        )
+
+    async def acomplete(self, question: str, contexts: List[Dict], stream: bool = False) -> str:
+        if stream:
+            return "".join([delta async for delta in self.astream(question, contexts)])
+        payload, user_prompt = self._payload(question, contexts, stream=False)
+        _OllamaKeepWarm.touch(self.base_url, self.model)
         url = f"{self.base_url}/api/chat"
-        async with httpx.AsyncClient(timeout=120) as client:
-            if not stream:
-                r = await client.post(url, json=payload)
-                r.raise_for_status()
-                data = r.json()
-                return (
-                    (data.get("message", {}) or {}).get("content") or data.get("response", "") or ""
-                )
-            parts: List[str] = []
-            async with client.stream("POST", url, json=payload) as resp:
-                resp.raise_for_status()
-                async for line in resp.aiter_lines():
-                    if not line:
-                        continue
-                    try:
-                        js = json.loads(line)
-                    except Exception:
-                        continue
-                    delta = (js.get("message", {}) or {}).get("content") or js.get("response")
-                    if delta:
-                        parts.append(delta)
-            return "".join(parts)
+        client = async_client("ollama")
+        limiter, est = await _admit(self.provider, user_prompt)
+        r = await client.post(url, json=payload)
+        limiter.observe(r.headers, r.status_code)
+        r.raise_for_status()
+        data = r.json()
+        self._report(data, limiter, est)
+        return (data.get("message", {}) or {}).get("content") or data.get("response", "") or ""
 
     async def astream(self, question: str, contexts: List[Dict]) -> AsyncGenerator[str, None]:
-        ctx = []
-        for i, c in enumerate(contexts):
-            snip = c.get("content", "")[:1600]
-            src = c.get("source", "")
-            ctx.append(f"[ref {i+1}] 来源: {src}\n{snip}")
-        context_text = "\n\n".join(ctx)
-        user_prompt = f"问题：{question}\n\n已检索片段：\n{context_text}\n\n请依据片段回答。"
-        payload = {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt},
-            ],
-            "stream": True,
-        }
+        payload, user_prompt = self._payload(question, contexts, stream=True)
+        _OllamaKeepWarm.touch(self.base_url, self.model)
         url = f"{self.base_url}/api/chat"
-        async with httpx.AsyncClient(timeout=120) as client:
-            async with client.stream("POST", url, json=payload) as resp:
-                resp.raise_for_status()
-                async for line in resp.aiter_lines():
-                    if not line:
-                        continue
-                    try:
-                        js = json.loads(line)
-                    except Exception:
-                        continue
-                    delta = (js.get("message", {}) or {}).get("content") or js.get("response")
-                    if delta:
-                        yield delta
+        client = async_client("ollama")
+        limiter, est = await _admit(self.provider, user_prompt)
+        async with client.stream("POST", url, json=payload) as resp:
+            limiter.observe(resp.headers, resp.status_code)
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line:
+                    continue
+                try:
+                    js = json.loads(line)
+                except Exception:
+                    continue
+                delta = (js.get("message", {}) or {}).get("content") or js.get("response")
+                if delta:
+                    yield delta
+                if js.get("done"):
+                    self._report(js, limiter, est)
+
+
+def _ollama_options_from_env() -> Dict:
+    options: Dict = {}
+    raw = os.getenv("OLLAMA_OPTIONS")
+    if raw:
+        try:
+            options.update(json.loads(raw))
+        except ValueError:
+            logger.warning("ignoring invalid OLLAMA_OPTIONS: %s", raw)
+    for key, env in (("num_ctx", "OLLAMA_NUM_CTX"), ("num_thread", "OLLAMA_NUM_THREAD")):
+        if os.getenv(env):
+            options[key] = int(os.getenv(env))
+    return options
+
+
+class _OllamaKeepWarm:
+    """One daemon thread per (server, model) that periodically asks Ollama to keep the
+    model loaded; an empty ``/api/generate`` request loads it without generating.
+
+    The thread exits once ``idle`` seconds (0: never) pass without a real request, so
+    an unused model can unload; the next request starts it again.
+    """
+
+    _threads: Dict[Tuple[str, str], threading.Thread] = {}
+    # (server, model) -> (keep_alive, interval, idle) for servers keep-warm was enabled on
+    _enabled: Dict[Tuple[str, str], Tuple[str, float, float]] = {}
+    _last_used: Dict[Tuple[str, str], float] = {}
+    _lock = threading.Lock()
+    _stop = threading.Event()
+
+    @classmethod
+    def start(
+        cls, base_url: str, model: str, keep_alive: str, interval: float, idle: float = 0
+    ) -> None:
+        key = (base_url, model)
+        with cls._lock:
+            cls._enabled[key] = (keep_alive, interval, idle)
+            cls._last_used[key] = time.monotonic()
+            cls._spawn(key, ping_now=True)
+
+    @classmethod
+    def touch(cls, base_url: str, model: str) -> None:
+        """Note a real request; restarts a keep-warm thread that stopped while idle."""
+        key = (base_url, model)
+        cls._last_used[key] = time.monotonic()
+        if key in cls._enabled and not cls._threads[key].is_alive():
+            with cls._lock:
+                # the request itself loads the model: the first ping can wait
+                cls._spawn(key, ping_now=False)
+
+    @classmethod
+    def _spawn(cls, key: Tuple[str, str], ping_now: bool) -> None:
+        if key in cls._threads and cls._threads[key].is_alive():
+            return
+        thread = threading.Thread(
+            target=cls._run,
+            args=(*key, *cls._enabled[key], ping_now),
+            name=f"ollama-keepwarm-{key[1]}",
+            daemon=True,
+        )
+        cls._threads[key] = thread
+        thread.start()
+
+    @classmethod
+    def _run(
+        cls,
+        base_url: str,
+        model: str,
+        keep_alive: str,
+        interval: float,
+        idle: float,
+        ping_now: bool,
+    ) -> None:
+        from .http_pool import sync_client
+
+        # first ping right away so the model is loaded before the first question
+        if not ping_now:
+            cls._stop.wait(interval)
+        while not cls._stop.is_set():
+            idle_for = time.monotonic() - cls._last_used.get((base_url, model), 0.0)
+            if idle and idle_for >= idle:
+                logger.info("ollama keep-warm for %s paused after %.0fs idle", model, idle_for)
+                emit_metric("ollama_keepalive", model=model, ok=True, paused=True)
+                return
+            t0 = time.perf_counter()
+            try:
+                r = sync_client("ollama").post(
+                    f"{base_url}/api/generate", json={"model": model, "keep_alive": keep_alive}
+                )
+                r.raise_for_status()
+                load_ns = r.json().get("load_duration") or 0
+                emit_metric(
+                    "ollama_keepalive",
+                    model=model,
+                    ok=True,
+                    load_ms=round(load_ns / 1e6, 1),
+                    latency_ms=round((time.perf_counter() - t0) * 1000, 1),
+                )
+            except Exception as e:
+                logger.debug("ollama keep-alive ping failed for %s: %s", model, e)
+                emit_metric("ollama_keepalive", model=model, ok=False, error=str(e))
+            cls._stop.wait(interval)
+
+
+atexit.register(_OllamaKeepWarm._stop.set)
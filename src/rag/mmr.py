@@ -0,0 +1,29 @@
+"""Maximal marginal relevance (MMR) selection over stored chunk embeddings."""
+
+from typing import List
+
+import numpy as np
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, lam: float = 0.7) -> List[int]:
+    """Greedy MMR: pick ``k`` indices balancing relevance against redundancy.
+
+    ``vectors`` are L2-normalized candidate embeddings ``(n, d)``; the whole
+    candidate similarity matrix is computed with one matrix product and the greedy
+    loop only updates a running max-similarity vector.
+    """
+    n = relevance.shape[0]
+    if n == 0 or k <= 0:
+        return []
+    sim = vectors @ vectors.T
+    selected: List[int] = []
+    available = np.ones(n, dtype=bool)
+    max_sim = np.zeros(n, dtype=np.float32)
+    for _ in range(min(k, n)):
+        score = lam * relevance - (1 - lam) * max_sim
+        score[~available] = -np.inf
+        best = int(np.argmax(score))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_sim, sim[best], out=max_sim)
+    return selected
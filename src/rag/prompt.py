@@ -0,0 +1,188 @@
+"""Shared prompt construction for every LLM provider.
+
+The system prompt lives here with its token count computed once. Retrieved contexts
+are packed into a token budget (``PROMPT_CONTEXT_TOKENS``): highest-scoring contexts
+first, each capped at ``PROMPT_CONTEXT_MAX_TOKENS`` and trimmed at a sentence
+boundary, so the question itself is never truncated. ``[ref i]`` keeps the position
+of the context in the retrieval result, which is what the API returns to clients.
+"""
+
+import hashlib
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+from ..logging_utils import emit_metric
+
+SYSTEM_PROMPT = (
+    "# Role：数学建模竞赛专家助理"
+    "## Background：用户正在寻求一个在数学建模竞赛（如MathorCup、美赛、国赛等）方面提供专业指导的智能助理。他们可能需要解决实际问题、选择合适的模型、撰写论文或提高竞赛经验。用户希望获得结构化的建议，并参考相关资料，以确保解决方案的严谨性和准确性。"
+    "## Attention：请务必挑选提供的资料以便进行严谨推理，给出最合理的宏观建议和确保正确的细节指导，需要注意的是提供的资料不一定与问题是强相关的所以需要辨别。对于模型选择问题，需着重说明选择的原因。如果信息不足，应明确指出缺口并提出建议。避免编造不存在的内容，保持学术、清晰、严谨的风格。始终牢记你的目标是帮助用户在数学建模竞赛中取得成功。"
+    "## Profile："
+    "- Language: 中文"
+    "- Description: 专注于为数学建模竞赛提供专业指导的智能助理，擅长实际问题抽象、模型选择、方案验证和论文写作指导。"
+    "### Skills:"
+    "- 深刻理解各种数学建模竞赛（MathorCup、美赛、国赛等）的规则和评分标准"
+    "- 能够将实际问题抽象成标准的数学模型，如优化模型、微分方程模型、统计模型等"
+    "- 熟练掌握各种常用的数学建模方法和算法，如线性规划、整数规划、动态规划、模拟退火、遗传算法等"
+    "- 具备严谨的数学推理能力和清晰的逻辑思维能力，确保提出的解决方案的正确性和可行性"
+    "- 能够撰写符合学术规范的数学建模论文，包括摘要、问题重述、模型建立、求解方法、结果分析、参考文献等"
+    "## Goals:"
+    "- 准确理解用户提出的问题，并重述问题和关键建模要素，确保双方理解一致"
+    "- 基于提供的资料，构建清晰的建模思路，包括数据收集与预处理、模型选择与建立、模型求解与验证等环节"
+    "- 对于不同的建模方法进行比较，并以表格形式呈现，方便用户选择最合适的方法"
+    "- 使用[ref i] 标记引用参考资料，并在末尾列出所有来源文件及简短原文，确保方案的可追溯性"
+    "- 针对用户在建模过程中遇到的具体问题，提供详细的模型选择建议，并解释选择该模型的原因"
+    "## Constrains:"
+    "- 必须基于提供的资料进行回答，不得编造不存在的内容或提供未经证实的建议"
+    "- 必须保持学术、清晰、严谨的风格，避免使用口语化或不专业的表达"
+    "- 必须确保所有建议和方案符合数学建模的基本原则和规范"
+    "- 如果信息不足以回答用户的问题，必须明确指出缺口，并提出获取数据或补充分析的建议"
+    "- 当用户提的是“论文写作/经验/流程”时，必须结合数模竞赛的特点进行建议，不得泛泛而谈"
+    "## Workflow:"
+    "1. 仔细阅读用户提出的问题，并分析问题的核心需求和背景信息"
+    "2. 查阅提供的资料，提取与问题相关的关键信息和建模要素"
+    "3. 构建结构化的建模思路，包括数据收集与预处理、模型选择与建立、模型求解与验证等环节"
+    "4. 基于资料和建模思路，给出合理的宏观建议和确保正确的细节指导"
+    "5. 使用[ref i] 标记引用参考资料，并在末尾列出所有来源文件及简短原文"
+    "## OutputFormat:"
+    "- 重述问题与关键建模要素，确保清晰简洁"
+    "- 给出结构化的建模思路，包括数据->预处理->模型->求解->验证等环节"
+    "- 对于不同的建模方法进行比较，并以表格形式呈现"
+    "## Suggestions:"
+    "- 注重对实际问题的深刻理解，将实际问题转化为数学模型时，要抓住问题的本质和核心要素"
+    "- 持续学习和掌握新的数学建模方法和算法，保持知识的更新和扩展"
+    "- 在建模过程中，要注重数据的质量和预处理，确保数据的准确性和可靠性"
+    "- 提高模型的求解和验证能力，确保模型的有效性和实用性"
+    "- 培养良好的论文写作习惯，注重论文的逻辑性和可读性"
+    "## Initialization"
+    "作为数学建模竞赛专家助理，你必须遵守以上约束条件，使用默认中文与用户交流。"
+)
+
+
+USER_TEMPLATE = "问题：{question}\n\n已检索片段：\n{contexts}\n\n请依据片段回答。"
+
+# Changes whenever the system prompt, the template or the packing rules do; part of the
+# answer cache key
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT + USER_TEMPLATE + "pack-v1").encode("utf-8")
+).hexdigest()[:12]
+
+
+def context_budget() -> Tuple[int, int]:
+    """Configured ``(total, per_context)`` token allowance for retrieved contexts."""
+    return (
+        int(os.getenv("PROMPT_CONTEXT_TOKENS", "3000")),
+        int(os.getenv("PROMPT_CONTEXT_MAX_TOKENS", "800")),
+    )
+
+
+def prompt_version() -> str:
+    """``PROMPT_VERSION`` plus the packing budget in effect: the same question and
+    contexts packed under another budget produce a different prompt."""
+    budget, per_context = context_budget()
+    return f"{PROMPT_VERSION}-{budget}-{per_context}"
+
+
+# Sentence ends (Chinese and Western punctuation, line breaks) a context may be cut after
+_SENTENCE_END = re.compile(r"[。！？；!?;…]|\.(?=\s)|\n")
+
+
+def _is_cjk(ch: str) -> bool:
+    return "\u4e00" <= ch <= "\u9fff"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: one per CJK character, one per four other characters."""
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@lru_cache(maxsize=1)
+def system_prompt_tokens() -> int:
+    return estimate_tokens(SYSTEM_PROMPT)
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> Tuple[str, bool]:
+    """Cut ``text`` to about ``max_tokens``, preferably right after a sentence end.
+
+    Returns ``(text, trimmed)``. Falls back to a hard cut marked with "…" when the
+    last sentence end would throw away more than half of the allowance.
+    """
+    if max_tokens <= 0:
+        return "", bool(text)
+    used = 0.0
+    cut = len(text)
+    for i, ch in enumerate(text):
+        used += 1.0 if _is_cjk(ch) else 0.25
+        if used > max_tokens:
+            cut = i
+            break
+    else:
+        return text, False
+    head = text[:cut]
+    ends = [m.end() for m in _SENTENCE_END.finditer(head)]
+    if ends and ends[-1] >= cut // 2:
+        return head[: ends[-1]].rstrip(), True
+    return head.rstrip() + "…", True
+
+
+def pack_contexts(
+    contexts: Sequence[Dict],
+    budget: int | None = None,
+    per_context: int | None = None,
+) -> List[Tuple[int, str, str]]:
+    """Choose and trim contexts to fit ``budget`` tokens.
+
+    Returns ``(ref, source, snippet)`` in retrieval order, where ``ref`` is the 1-based
+    position in ``contexts``. Contexts are admitted by descending score; one that does
+    not fit whole is trimmed to the remaining budget if a useful part fits.
+    """
+    default_budget, default_per_context = context_budget()
+    if budget is None:
+        budget = default_budget
+    if per_context is None:
+        per_context = default_per_context
+    min_useful = min(64, per_context)
+
+    def score(i: int) -> float:
+        c = contexts[i]
+        value = c.get("combined")
+        value = c.get("score") if value is None else value
+        return float(value) if value is not None else 0.0
+
+    packed: Dict[int, str] = {}
+    remaining = budget
+    trimmed = 0
+    for i in sorted(range(len(contexts)), key=lambda i: -score(i)):
+        if remaining < min_useful:
+            break
+        snippet, cut = trim_to_tokens(contexts[i].get("content", ""), min(per_context, remaining))
+        if not snippet:
+            continue
+        packed[i] = snippet
+        trimmed += cut
+        remaining -= estimate_tokens(snippet)
+    emit_metric(
+        "prompt_pack",
+        contexts=len(contexts),
+        packed=len(packed),
+        trimmed=trimmed,
+        context_tokens=budget - remaining,
+    )
+    return [(i + 1, contexts[i].get("source", ""), packed[i]) for i in sorted(packed)]
+
+
+def build_user_prompt(question: str, contexts: Sequence[Dict], budget: int = None) -> str:
+    """User message: the full question plus the packed ``[ref i]`` contexts."""
+    blocks = [
+        f"[ref {ref}] 来源: {src}\n{snippet}"
+        for ref, src, snippet in pack_contexts(contexts, budget)
+    ]
+    return USER_TEMPLATE.format(question=question, contexts="\n\n".join(blocks))
+
+
+def prompt_tokens(user_prompt: str) -> int:
+    """Estimated input tokens of a request: system prompt (cached) plus user message."""
+    return system_prompt_tokens() + estimate_tokens(user_prompt)
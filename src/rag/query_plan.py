@@ -0,0 +1,46 @@
+"""Single-pass query analysis shared by all retrieval stages.
+
+``Retriever.plan`` tokenizes and normalizes a question once; vector search, BM25,
+adaptive k and filtering all read from the resulting ``QueryPlan`` instead of
+re-running jieba and the regex passes per stage.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    raw: str
+    normalized: str  # special characters stripped, whitespace collapsed
+    tokens: Tuple[str, ...]  # jieba.cut(raw), drives adaptive k
+    search_tokens: Tuple[str, ...]  # jieba.cut_for_search(normalized), BM25 query
+    expansion_terms: Tuple[str, ...]  # domain keyword expansions for the vector query
+    k: int
+    adaptive_k: int
+    filters: Optional[Dict[str, Any]] = field(default=None, compare=False)
+    analysis_ms: float = field(default=0.0, compare=False)
+
+    @property
+    def vector_text(self) -> str:
+        if not self.expansion_terms:
+            return self.normalized
+        return self.normalized + " " + " ".join(self.expansion_terms)
+
+    @property
+    def candidate_k(self) -> int:
+        """Per-stage candidate depth for hybrid fusion."""
+        return min(max(self.adaptive_k * 2, self.adaptive_k + 2), self.adaptive_k * 4)
+
+    def matches(self, meta: Dict[str, Any]) -> bool:
+        """Metadata filter: each filter value must equal (or, for lists, contain) the field."""
+        if not self.filters:
+            return True
+        for key, expected in self.filters.items():
+            value = meta.get(key)
+            if isinstance(expected, (list, tuple, set)):
+                if value not in expected:
+                    return False
+            elif value != expected:
+                return False
+        return True
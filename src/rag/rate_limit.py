@@ -0,0 +1,284 @@
+"""Per-provider LLM rate limiting with a priority queue.
+
+Each provider gets a ``ProviderLimiter`` with two token buckets: requests per minute
+and tokens per minute (``LLM_RPM_<PROVIDER>`` / ``LLM_TPM_<PROVIDER>``, ``0`` means no
+limit until the provider reports one). Limits and remaining quota are updated from
+rate-limit response headers, and a 429 blocks the provider for its ``Retry-After``
+so callers queue instead of hammering it.
+
+Callers wait in a priority queue: interactive asks (the default) are admitted before
+batch or evaluation jobs, which run their calls under ``with priority(BATCH):``. The
+priority is a context variable, so it follows the call into tasks it spawns. Quota is
+shared process-wide, but waiters queue per event loop (the CLI and Django run several):
+each loop's queue is drained by a task on that loop, so futures resolve on their own loop.
+"""
+
+import asyncio
+import heapq
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+from ..logging_utils import emit_metric, get_logger
+
+logger = get_logger("rate_limit")
+
+INTERACTIVE = 0
+BATCH = 10
+
+_PRIORITY: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int):
+    """Run LLM calls made inside the block at ``level`` (lower is served first)."""
+    token = _PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def current_priority() -> int:
+    return _PRIORITY.get()
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float = 0.0):
+        self.per_minute = 0.0
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.set_limit(per_minute)
+
+    @property
+    def limited(self) -> bool:
+        return self.per_minute > 0
+
+    def set_limit(self, per_minute: float) -> None:
+        self._refill(time.monotonic())
+        first = not self.limited
+        self.per_minute = float(per_minute)
+        # the bucket holds one minute of quota
+        self.level = self.per_minute if first else min(self.level, self.per_minute)
+
+    def _refill(self, now: float) -> None:
+        if self.limited:
+            self.level = min(
+                self.per_minute, self.level + (now - self.updated) * self.per_minute / 60
+            )
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        blocked = max(self.blocked_until - now, 0.0)
+        if not self.limited:
+            return blocked
+        self._refill(now)
+        # a request larger than the whole bucket waits for a full bucket, not forever
+        amount = min(amount, self.per_minute)
+        if self.level >= amount:
+            return blocked
+        return max(blocked, (amount - self.level) * 60 / self.per_minute)
+
+    def take(self, amount: float) -> None:
+        if self.limited:
+            self._refill(time.monotonic())
+            self.level -= amount
+
+    def clamp(self, remaining: float) -> None:
+        if self.limited:
+            self._refill(time.monotonic())
+            self.level = min(self.level, remaining)
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    seconds = _number(value)
+    if seconds is not None:
+        return seconds
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class _LoopQueue:
+    """Callers of one event loop waiting for quota, and the task draining them."""
+
+    def __init__(self):
+        self.waiters: list = []
+        self.drainer: Optional[asyncio.Task] = None
+
+
+class ProviderLimiter:
+    def __init__(self, name: str, rpm: float = 0.0, tpm: float = 0.0):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.completion_reserve = int(os.getenv("LLM_COMPLETION_RESERVE", "1024"))
+        # futures only ever resolve on their own loop; a queue is dropped once it drains
+        # (or its loop is closed)
+        self._queues: Dict[asyncio.AbstractEventLoop, _LoopQueue] = {}
+        self._seq = 0
+        self.admitted = 0
+        self.throttled = 0
+
+    @classmethod
+    def from_env(cls, name: str) -> "ProviderLimiter":
+        suffix = name.upper().replace("-", "_")
+        return cls(
+            name,
+            rpm=float(os.getenv(f"LLM_RPM_{suffix}", "0")),
+            tpm=float(os.getenv(f"LLM_TPM_{suffix}", "0")),
+        )
+
+    def _wait_time(self, tokens: int) -> float:
+        now = time.monotonic()
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+    def _take(self, tokens: int) -> None:
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.admitted += 1
+
+    def _queued(self) -> int:
+        """Callers waiting on any live event loop."""
+        for loop in [loop for loop in list(self._queues) if loop.is_closed()]:
+            self._queues.pop(loop, None)
+        return sum(len(q.waiters) for q in list(self._queues.values()))
+
+    async def _drain(self, loop: asyncio.AbstractEventLoop, queue: _LoopQueue) -> None:
+        try:
+            await self._serve(queue.waiters)
+        finally:
+            if self._queues.get(loop) is queue:
+                del self._queues[loop]
+
+    async def _serve(self, waiters: list) -> None:
+        while waiters:
+            _, _, fut, tokens = waiters[0]
+            if fut.done():  # cancelled while queued
+                heapq.heappop(waiters)
+                continue
+            wait = self._wait_time(tokens)
+            if wait <= 0:
+                heapq.heappop(waiters)
+                self._take(tokens)
+                fut.set_result(None)
+                continue
+            # re-check at least every second so a newly queued higher priority call
+            # becomes the head without waiting out someone else's refill
+            await asyncio.sleep(min(wait, 1.0))
+
+    async def acquire(self, tokens: int = 0, priority: Optional[int] = None) -> float:
+        """Wait for one request and ``tokens`` tokens of quota; returns seconds waited."""
+        level = current_priority() if priority is None else priority
+        t0 = time.monotonic()
+        if not self._queued() and self._wait_time(tokens) <= 0:
+            self._take(tokens)
+            self._record(level, 0.0)
+            return 0.0
+        loop = asyncio.get_running_loop()
+        queue = self._queues.get(loop)
+        if queue is None:
+            queue = self._queues[loop] = _LoopQueue()
+        fut = loop.create_future()
+        self._seq += 1
+        heapq.heappush(queue.waiters, (level, self._seq, fut, tokens))
+        if queue.drainer is None or queue.drainer.done():
+            queue.drainer = loop.create_task(self._drain(loop, queue))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        waited = time.monotonic() - t0
+        self.throttled += 1
+        self._record(level, waited)
+        return waited
+
+    def _record(self, level: int, waited: float) -> None:
+        emit_metric(
+            "llm_queue",
+            provider=self.name,
+            priority=level,
+            wait_ms=round(waited * 1000, 1),
+            depth=self._queued(),
+        )
+
+    def observe(self, headers: Mapping[str, str], status_code: int = 200) -> None:
+        """Update quota from a response's rate-limit headers (and back off on 429)."""
+        h = {k.lower(): v for k, v in headers.items()}
+        # OpenAI-style per-minute request / token limits
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = _number(h.get(f"x-ratelimit-limit-{kind}"))
+            if limit:
+                bucket.set_limit(limit)
+            remaining = _number(h.get(f"x-ratelimit-remaining-{kind}"))
+            if remaining is not None:
+                bucket.clamp(remaining)
+        # OpenRouter-style: X-RateLimit-Limit/Remaining/Reset (reset in epoch ms)
+        limit = _number(h.get("x-ratelimit-limit"))
+        if limit:
+            self.requests.set_limit(limit)
+        remaining = _number(h.get("x-ratelimit-remaining"))
+        if remaining is not None:
+            self.requests.clamp(remaining)
+            reset = _number(h.get("x-ratelimit-reset"))
+            if remaining <= 0 and reset:
+                self.requests.block(max(reset / 1000 - time.time(), 0.0))
+        if status_code == 429:
+            seconds = _retry_after(h)
+            seconds = float(os.getenv("LLM_429_BACKOFF", "5")) if seconds is None else seconds
+            self.requests.block(seconds)
+            logger.warning("provider %s rate limited, backing off %.1fs", self.name, seconds)
+            emit_metric("llm_rate_limited", provider=self.name, backoff_s=round(seconds, 2))
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Correct the token bucket once the provider reports actual usage."""
+        if actual is not None and self.tokens.limited:
+            self.tokens.take(actual - estimated)
+
+    def stats(self) -> Dict:
+        return {
+            "rpm": self.requests.per_minute or None,
+            "tpm": self.tokens.per_minute or None,
+            "queued": self._queued(),
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "blocked_s": round(max(self.requests.blocked_until - time.monotonic(), 0.0), 1),
+        }
+
+
+_LIMITERS: Dict[str, ProviderLimiter] = {}
+_LOCK = threading.Lock()
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    with _LOCK:
+        limiter = _LIMITERS.get(provider)
+        if limiter is None:
+            limiter = _LIMITERS[provider] = ProviderLimiter.from_env(provider)
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict]:
+    with _LOCK:
+        limiters = dict(_LIMITERS)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
@@ -0,0 +1,174 @@
+"""Retrieval result cache.
+
+Entries are keyed by the normalized query, retrieval parameters and the store
+generation (see ``FaissStore.generation``), so a re-ingest naturally stops old
+entries from matching. The in-process tier is an LRU with TTL and a byte bound;
+an optional Redis tier (``RETRIEVAL_CACHE_REDIS_URL``) lets every API worker
+share hits. Hits skip query embedding and search entirely.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from ..logging_utils import emit_metric, get_logger
+
+logger = get_logger("retrieval_cache")
+
+# Bulky per-chunk fields that are never needed downstream of retrieval
+_DROP_FIELDS = ("vector", "minhash")
+
+
+def _as_dict(doc) -> Dict[str, Any]:
+    if hasattr(doc, "to_dict"):
+        return doc.to_dict()
+    return {k: v for k, v in doc.items() if k not in _DROP_FIELDS}
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split())
+
+
+def make_key(
+    query: str,
+    k: int,
+    bm25_weight: float,
+    filters: Optional[Dict[str, Any]] = None,
+    generation: str = "",
+    fusion: Optional[str] = None,
+) -> str:
+    raw = json.dumps(
+        {
+            "q": normalize_query(query),
+            "k": int(k),
+            "w": round(float(bm25_weight), 4),
+            "f": filters or {},
+            "g": generation,
+            "m": fusion or "",
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class RetrievalCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 600.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        redis_url: Optional[str] = None,
+        namespace: str = "rag:retrieve:",
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        # payloads are kept as UTF-8 JSON, so the byte bound counts what is stored
+        self._entries: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._redis = None
+        if redis_url:
+            try:
+                import redis.asyncio as aioredis
+
+                self._redis = aioredis.from_url(redis_url, socket_timeout=0.2)
+            except Exception as e:  # redis is optional
+                logger.warning("retrieval cache redis tier disabled: %s", e)
+
+    @classmethod
+    def from_env(cls) -> "RetrievalCache":
+        return cls(
+            max_entries=int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "600")),
+            max_bytes=int(float(os.getenv("RETRIEVAL_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            redis_url=os.getenv("RETRIEVAL_CACHE_REDIS_URL") or None,
+        )
+
+    @staticmethod
+    def _dumps(docs: List[Dict]) -> bytes:
+        return json.dumps([_as_dict(d) for d in docs], ensure_ascii=False).encode("utf-8")
+
+    def _local_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, payload = item
+            if expires_at < time.time():
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def _local_set(self, key: str, payload: bytes) -> None:
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (time.time() + self.ttl, payload)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str) -> None:
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def _record(self, hit: bool, tier: str) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        emit_metric("retrieval_cache", result="hit" if hit else "miss", tier=tier)
+
+    async def aget(self, key: str) -> Optional[List[Dict]]:
+        payload = self._local_get(key)
+        if payload is not None:
+            self._record(True, "local")
+            return json.loads(payload)
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(self.namespace + key)
+            except Exception as e:
+                logger.debug("retrieval cache redis get failed: %s", e)
+                raw = None
+            if raw is not None:
+                payload = raw if isinstance(raw, bytes) else raw.encode("utf-8")
+                self._local_set(key, payload)
+                self._record(True, "redis")
+                return json.loads(payload)
+        self._record(False, "redis" if self._redis is not None else "local")
+        return None
+
+    async def aset(self, key: str, docs: List[Dict]) -> None:
+        payload = self._dumps(docs)
+        self._local_set(key, payload)
+        if self._redis is not None:
+            try:
+                await self._redis.set(self.namespace + key, payload, ex=int(self.ttl))
+            except Exception as e:
+                logger.debug("retrieval cache redis set failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = len(self._entries), self._bytes
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+            "redis": self._redis is not None,
+        }
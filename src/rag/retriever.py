@@ -1,47 +1,143 @@
+import asyncio
+import json
+import os
 import re
-from typing import Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import jieba
+import numpy as np
 from rank_bm25 import BM25Okapi
 
 from ..logging_utils import emit_metric, get_logger
+from .dedup import near_duplicate_mask, signature_for
 from .embeddings import OllamaEmbeddings
+from .expansion import ExpansionDictionary, get_expansion_dictionary
+from .fusion import Ranked, fuse
+from .hit import Hit
+from .mmr import mmr_select
+from .query_plan import QueryPlan
 from .vector_store import FaissStore
 
 logger = get_logger("retriever")
 
+# Shared pool for running retrieval stages concurrently (vector search vs BM25)
+_SEARCH_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RETRIEVE_WORKERS", "8")), thread_name_prefix="retrieve"
+)
+# Query embeddings are network calls that may outlive their budget (a running future
+# cannot be cancelled): they get their own pool so CPU stages never queue behind them.
+_EMBED_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RETRIEVE_EMBED_WORKERS", "8")), thread_name_prefix="embed"
+)
+
+QueryLike = Union[str, QueryPlan]
+
+
+def _top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first (argpartition, not a full sort)."""
+    if k >= scores.size:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+async def _run_cpu(fn, *args):
+    """Run blocking faiss/BM25 work on the bounded retrieval pool."""
+    return await asyncio.get_running_loop().run_in_executor(_SEARCH_POOL, fn, *args)
+
+
+class _LRU:
+    """Small thread-safe LRU mapping shared across request threads."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+
+class Contexts(list):
+    """Retrieved hits, best first. ``degraded`` names the fallback used, if any
+    (``"embed_timeout"``/``"embed_error"``: BM25-only because the query embedding missed
+    its budget slice or failed)."""
+
+    def __init__(self, hits=(), degraded: Optional[str] = None):
+        super().__init__(hits)
+        self.degraded = degraded
+
 
 class Retriever:
     def __init__(
-        self, store: FaissStore, embed: OllamaEmbeddings, k: int = 6, bm25_weight: float = 0.35
+        self,
+        store: FaissStore,
+        embed: OllamaEmbeddings,
+        k: int = 6,
+        bm25_weight: float = 0.35,
+        expansions: Optional[ExpansionDictionary] = None,
+        diversify: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+        fusion: Optional[str] = None,
+        two_stage: Optional[str] = None,
+        candidates: Optional[int] = None,
     ):
         self.store = store
         self.embed = embed
         self.k = k
         self.bm25_weight = bm25_weight
+        # "dedup" (MinHash near-duplicate filter) or "mmr" (embedding-based diversity)
+        self.diversify = (diversify or os.getenv("RETRIEVE_DIVERSIFY", "dedup")).lower()
+        self.mmr_lambda = (
+            mmr_lambda if mmr_lambda is not None else float(os.getenv("MMR_LAMBDA", "0.7"))
+        )
+        # Hybrid score fusion method, overridable per call (see fusion.METHODS)
+        self.fusion = (fusion or os.getenv("RETRIEVE_FUSION", "weighted")).lower()
+        # Two-stage retrieval: stage one yields candidate rows ("bm25": lexical matches,
+        # "binary": Hamming neighbours of the query's sign bits), stage two scores only
+        # those rows exactly against the memory-mapped vector matrix.
+        two_stage = os.getenv("RETRIEVE_TWO_STAGE", "") if two_stage is None else two_stage
+        two_stage = two_stage.lower()
+        self.two_stage = "bm25" if two_stage in ("1", "true", "on") else two_stage
+        if self.two_stage in ("0", "false", "off"):
+            self.two_stage = ""
+        self.candidates = candidates or int(os.getenv("RETRIEVE_CANDIDATES", "2000"))
+        # Share of a per-call latency budget the query embedding may use before falling
+        # back to BM25-only results
+        self.embed_slice = float(os.getenv("RETRIEVE_EMBED_SLICE", "0.8"))
         self._bm25: Optional[BM25Okapi] = None
         self._bm25_docs: List[Dict] = []
         self._build_bm25()
+        self._qvec_cache = _LRU(256)
+        self._plan_cache = _LRU(int(os.getenv("QUERY_PLAN_CACHE_SIZE", "1024")))
+        self._filter_cache = _LRU(64)
 
-        # Math modeling domain keywords for query expansion
-        self.domain_keywords = {
-            "优化": ["线性规划", "整数规划", "非线性规划", "多目标优化", "约束优化"],
-            "模型": ["数学模型", "建模", "模型建立", "模型求解", "模型验证"],
-            "算法": ["遗传算法", "模拟退火", "粒子群优化", "动态规划", "贪心算法"],
-            "统计": ["回归分析", "时间序列", "概率模型", "假设检验", "方差分析"],
-            "预测": ["预测模型", "趋势分析", "时间序列预测", "机器学习预测"],
-            "评价": ["评价体系", "层次分析法", "模糊评价", "综合评价"],
-        }
+        # Math modeling domain dictionary for query expansion (configs/query_expansion.json)
+        self.expansions = expansions or get_expansion_dictionary()
+
+    def _expansion_terms(self, query: str) -> List[str]:
+        return self.expansions.terms_for(query)
 
     def _expand_query(self, query: str) -> str:
         """Expand query with domain-specific keywords for better retrieval"""
-        expanded_terms = []
-        query_lower = query.lower()
-
-        for key, expansions in self.domain_keywords.items():
-            if key in query_lower:
-                expanded_terms.extend(expansions[:2])  # Add top 2 related terms
-
+        expanded_terms = self._expansion_terms(query)
         if expanded_terms:
             expanded_query = query + " " + " ".join(expanded_terms)
             logger.debug(f"Query expanded: '{query}' -> '{expanded_query}'")
@@ -57,6 +153,47 @@ class Retriever:
         query = " ".join(query.split())
         return query.strip()
 
+    def plan(
+        self, query: str, k: Optional[int] = None, filters: Optional[Dict[str, Any]] = None
+    ) -> QueryPlan:
+        """Analyze ``query`` once (tokens, normalization, expansion, adaptive k).
+
+        Plans for recent (query, k, filters) combinations are served from an LRU.
+        """
+        k = k or self.k
+        key = (
+            query,
+            k,
+            json.dumps(filters, sort_keys=True, ensure_ascii=False) if filters else "",
+            self.expansions.version,
+        )
+        cached = self._plan_cache.get(key)
+        if cached is not None:
+            return cached
+        t0 = time.perf_counter()
+        normalized = self._preprocess_query(query)
+        tokens = tuple(jieba.cut(query))
+        # Use adaptive k based on query complexity
+        query_complexity = len(query.split()) + len(tokens)
+        expansion_terms = tuple(self._expansion_terms(normalized))
+        if expansion_terms:
+            logger.debug(f"Query expanded: '{normalized}' -> +{' '.join(expansion_terms)}")
+        plan = QueryPlan(
+            raw=query,
+            normalized=normalized,
+            tokens=tokens,
+            search_tokens=tuple(jieba.cut_for_search(normalized)),
+            expansion_terms=expansion_terms,
+            k=k,
+            adaptive_k=min(k + (query_complexity // 5), k * 2),
+            filters=filters or None,
+            analysis_ms=(time.perf_counter() - t0) * 1000,
+        )
+        return self._plan_cache.put(key, plan)
+
+    def _as_plan(self, query: QueryLike) -> QueryPlan:
+        return query if isinstance(query, QueryPlan) else self.plan(query)
+
     def _build_bm25(self):
         # Build BM25 corpus from metas contents
         tokens_corpus = []
@@ -68,97 +205,469 @@ class Retriever:
         if tokens_corpus:
             self._bm25 = BM25Okapi(tokens_corpus)
 
-    def vector_search(self, query: str, k: int) -> List[Dict]:
-        processed_query = self._preprocess_query(query)
-        expanded_query = self._expand_query(processed_query)
-        qv = self.embed.embed_query(expanded_query)
-        return self.store.search(qv, k)
+    def query_vector(self, query: QueryLike) -> List[float]:
+        """Embedding used for vector search; recent queries are served from an LRU."""
+        text = self._as_plan(query).vector_text
+        qv = self._qvec_cache.get(text)
+        if qv is None:
+            qv = self._qvec_cache.put(text, self.embed.embed_query(text))
+        return qv
+
+    def cached_query_vector(self, query: QueryLike) -> Optional[List[float]]:
+        """Query vector if one was already embedded for ``query``; never calls the embedder."""
+        return self._qvec_cache.get(self._as_plan(query).vector_text)
+
+    async def aquery_vector(self, query: QueryLike) -> List[float]:
+        text = self._as_plan(query).vector_text
+        qv = self._qvec_cache.get(text)
+        if qv is not None:
+            return qv
+        aembed = getattr(self.embed, "aembed_query", None)
+        if aembed is not None:
+            qv = await aembed(text)
+        else:
+            loop = asyncio.get_running_loop()
+            qv = await loop.run_in_executor(_EMBED_POOL, self.embed.embed_query, text)
+        return self._qvec_cache.put(text, qv)
+
+    def vector_search(self, query: QueryLike, k: int) -> List[Hit]:
+        return self.store.search(self.query_vector(query), k)
 
-    def bm25_search(self, query: str, k: int) -> List[Dict]:
+    async def avector_search(self, query: QueryLike, k: int) -> List[Hit]:
+        qv = await self.aquery_vector(query)
+        return await _run_cpu(self.store.search, qv, k)
+
+    def _score_vector(self, qv: List[float], k: int) -> Ranked:
+        rows, scores = self.store.search_rows(qv, k)
+        return Ranked(rows, scores, scores)
+
+    def vector_rows(self, query: QueryLike, k: int) -> Ranked:
+        return self._score_vector(self.query_vector(query), k)
+
+    async def avector_rows(self, query: QueryLike, k: int) -> Ranked:
+        qv = await self.aquery_vector(query)
+        return await _run_cpu(self._score_vector, qv, k)
+
+    def _bm25_scores(self, query: QueryLike, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """BM25 score of every chunk, or of just ``rows`` (in that order) when given."""
         if not self._bm25:
-            return []
-        processed_query = self._preprocess_query(query)
-        toks = list(jieba.cut_for_search(processed_query))
-        scores_arr = self._bm25.get_scores(toks)
-        scores = [float(s) for s in scores_arr]
-        if not scores:
-            return []
-        max_score = max(scores) if scores else 1.0
-        idx_sorted = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-        out: List[Dict] = []
-        for i in idx_sorted:
-            meta = self._bm25_docs[i]
-            norm = scores[i] / max_score if max_score else 0.0
-            out.append({"score": norm, **meta, "bm25_raw": scores[i]})
-        return out
-
-    def get_relevant(self, query: str) -> List[Dict]:
-        """Enhanced retrieval with query preprocessing and adaptive ranking"""
-        if not query.strip():
-            return []
+            return np.zeros(0, dtype=np.float32)
+        toks = list(self._as_plan(query).search_tokens)
+        scores = np.asarray(self._bm25.get_scores(toks), dtype=np.float32)
+        return scores if rows is None else scores[rows]
 
-        # Use adaptive k based on query complexity
-        query_complexity = len(query.split()) + len(list(jieba.cut(query)))
-        adaptive_k = min(self.k + (query_complexity // 5), self.k * 2)
-
-        if self.bm25_weight <= 0:
-            results = self.vector_search(query, adaptive_k)
-            # Apply relevance filtering
-            results = self._filter_relevant(results, query)
-            results = results[: self.k]  # Return to original k
-
-            for i, r in enumerate(results):
-                logger.debug(
-                    f"hit[{i}] vec_only score={r['score']:.4f} src={r.get('source','')} hash={r['hash']}"
-                )
-            emit_metric("retrieve", mode="vector", hits=len(results), bm25_weight=0)
-            return results
+    @staticmethod
+    def _bm25_top(scores: np.ndarray, k: int) -> Ranked:
+        if scores.size == 0:
+            return Ranked.empty()
+        rows = _top_rows(scores, k)
+        raw = scores[rows]
+        max_score = float(scores.max())
+        norm = raw / max_score if max_score else np.zeros_like(raw)
+        return Ranked(rows, norm, raw)
+
+    def bm25_rows(self, query: QueryLike, k: int, rows: Optional[np.ndarray] = None) -> Ranked:
+        top = self._bm25_top(self._bm25_scores(query, rows), k)
+        return top if rows is None else top._replace(rows=rows[top.rows])
+
+    def bm25_search(self, query: QueryLike, k: int) -> List[Hit]:
+        top = self.bm25_rows(query, k)
+        return [
+            Hit(self._bm25_docs, row, score, bm25_raw=raw)
+            for row, score, raw in zip(top.rows.tolist(), top.scores.tolist(), top.raw.tolist())
+        ]
+
+    def stage_one(
+        self, query: QueryLike, k: int, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[Ranked, np.ndarray]:
+        """BM25 hits plus the candidate rows for exact scoring (rows with a lexical match).
+
+        ``allowed`` restricts both to those rows (the rows passing the metadata filters).
+        """
+        scores = self._bm25_scores(query, allowed)
+        if scores.size == 0:
+            return Ranked.empty(), np.zeros(0, dtype=np.int64)
+        top = self._bm25_top(scores, k)
+        rows = _top_rows(scores, self.candidates)
+        rows = rows[scores[rows] > 0]
+        if allowed is None:
+            return top, rows
+        return top._replace(rows=allowed[top.rows]), allowed[rows]
+
+    def stage_two(self, qv: List[float], rows: np.ndarray, k: int) -> Ranked:
+        """Exact cosine scores on just ``rows``; falls back to the full index if too few."""
+        if len(rows) < k:
+            return self._score_vector(qv, k)
+        return self._score_exact(qv, rows, k)
+
+    def _score_exact(self, qv: List[float], rows: np.ndarray, k: int) -> Ranked:
+        scores = self.store.score_rows(qv, rows)
+        top = _top_rows(scores, k)
+        return Ranked(rows[top], scores[top], scores[top])
+
+    def _score_filtered(self, qv: List[float], allowed: np.ndarray, k: int) -> Ranked:
+        """Top-``k`` vector hits among the ``allowed`` rows.
+
+        Few allowed rows are scored exactly; otherwise the index search is widened until
+        ``k`` of its hits pass the filter (or the whole index has been searched).
+        """
+        total = len(self.store._metas)
+        if len(allowed) <= self.candidates or len(allowed) <= k:
+            return self._score_exact(qv, allowed, k)
+        want = k * 4
+        while True:
+            vres = self._score_vector(qv, want)
+            vres = vres.select(np.isin(vres.rows, allowed))
+            if len(vres.rows) >= k or want >= total:
+                return vres.select(np.arange(min(k, len(vres.rows))))
+            want *= 4
 
-        vec_k = min(max(adaptive_k * 2, adaptive_k + 2), adaptive_k * 4)
-        bm_k = vec_k
-        vres = self.vector_search(query, vec_k)
-        bres = self.bm25_search(query, bm_k)
-
-        # Enhanced merging with adaptive weights
-        merged: Dict[str, Dict] = {}
-        for r in vres:
-            merged[r["hash"]] = {
-                "combined": r["score"] * (1 - self.bm25_weight),
-                "vec_score": r["score"],
-                "bm25_score": 0.0,
-                **r,
-            }
-        for r in bres:
-            if r["hash"] in merged:
-                merged[r["hash"]]["combined"] += r["score"] * self.bm25_weight
-                merged[r["hash"]]["bm25_score"] = r["score"]
-            else:
-                merged[r["hash"]] = {
-                    "combined": r["score"] * self.bm25_weight,
-                    "vec_score": 0.0,
-                    "bm25_score": r["score"],
-                    **r,
-                }
-
-        ranked = sorted(merged.values(), key=lambda x: x["combined"], reverse=True)
+    def _allowed_rows(self, plan: QueryPlan) -> Optional[np.ndarray]:
+        """Rows whose metadata passes ``plan.filters`` (None when unfiltered).
+
+        Candidate generation is restricted to these, so a selective filter still finds
+        ``k`` matches instead of filtering an unrelated top-k down to nothing.
+        """
+        if not plan.filters:
+            return None
+        key = (
+            getattr(self.store, "generation", None),
+            json.dumps(plan.filters, sort_keys=True, ensure_ascii=False, default=sorted),
+        )
+        allowed = self._filter_cache.get(key)
+        if allowed is None:
+            metas = self.store._metas
+            allowed = self._filter_cache.put(
+                key, np.fromiter((i for i, m in enumerate(metas) if plan.matches(m)), np.int64)
+            )
+        return allowed
+
+    @staticmethod
+    def _stage_timings(
+        embed_ms: float, bm25_ms: float, score_ms: float, parallel_ms: float
+    ) -> Dict[str, float]:
+        """Per-stage times for the retrieve metric. The embedding and BM25 run side by
+        side: ``parallel_ms`` is the wall time of that section, ``overlap_ms`` how much
+        of their sum it saved over running them one after the other."""
+        return {
+            "embed_ms": embed_ms,
+            "bm25_ms": bm25_ms,
+            "score_ms": score_ms,
+            "vec_ms": embed_ms + score_ms,
+            "parallel_ms": parallel_ms,
+            "overlap_ms": max(embed_ms + bm25_ms - parallel_ms, 0.0),
+        }
+
+    @staticmethod
+    def _timed(fn, *args):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        return out, (time.perf_counter() - t0) * 1000
+
+    def _rank_vector_only(self, plan: QueryPlan, results: List[Hit]) -> List[Hit]:
+        if plan.filters:
+            results = [r for r in results if plan.matches(r)]
+        # Apply relevance filtering
+        results = self._diversify(results, plan, "score")
+        results = results[: plan.k]  # Return to original k
+
+        for i, r in enumerate(results):
+            logger.debug(
+                f"hit[{i}] vec_only score={r['score']:.4f} src={r.get('source','')} hash={r['hash']}"
+            )
+        return results
+
+    def _matching(self, plan: QueryPlan, ranked: Ranked) -> Ranked:
+        metas = self.store._metas
+        mask = np.fromiter((plan.matches(metas[r]) for r in ranked.rows), bool, len(ranked.rows))
+        return ranked.select(mask)
+
+    def _rank_hybrid(
+        self, plan: QueryPlan, vres: Ranked, bres: Ranked, bm25_weight: float, fusion: str
+    ) -> List[Hit]:
+        if plan.filters:
+            vres = self._matching(plan, vres)
+            bres = self._matching(plan, bres)
+        # Fuse on arrays; hits are only built for the window handed to diversification
+        fused = fuse(vres, bres, bm25_weight, fusion, limit=plan.candidate_k)
+        metas = self.store._metas
+        ranked = [
+            Hit(
+                metas,
+                row,
+                vec if in_vec else bm25,
+                combined=combined,
+                vec_score=vec,
+                bm25_score=bm25,
+                bm25_raw=raw if in_bm25 else None,
+            )
+            for row, combined, vec, bm25, raw, in_vec, in_bm25 in zip(
+                fused.rows.tolist(),
+                fused.combined.tolist(),
+                fused.vec.tolist(),
+                fused.bm25.tolist(),
+                fused.bm25_raw.tolist(),
+                fused.in_vec.tolist(),
+                fused.in_bm25.tolist(),
+            )
+        ]
         # Apply relevance filtering and return top k
-        ranked = self._filter_relevant(ranked, query)[: self.k]
+        ranked = self._diversify(ranked, plan, "combined")[: plan.k]
 
         for i, r in enumerate(ranked[:15]):
             logger.debug(
                 f"hit[{i}] combined={r['combined']:.4f} vec={r.get('vec_score',0):.4f} bm25={r.get('bm25_score',0):.4f} src={r.get('source','')} hash={r['hash']}"
             )
+        return ranked
+
+    def _lexical_stage(
+        self, plan: QueryPlan, k: int, two_stage: bool, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[Ranked, Optional[np.ndarray]]:
+        """BM25 hits, plus stage-one candidate rows when scoring two-stage."""
+        if two_stage:
+            return self.stage_one(plan, k, allowed)
+        return self.bm25_rows(plan, k, allowed), None
+
+    def _score_stage(
+        self,
+        qv: List[float],
+        rows: Optional[np.ndarray],
+        k: int,
+        binary: bool,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Tuple[Ranked, Optional[np.ndarray]]:
+        """Vector scores for the query, restricted to stage-one candidates if any."""
+        if binary:
+            rows = self.store.binary_search(qv, max(self.candidates, k))
+            if rows is not None and allowed is not None:
+                rows = rows[np.isin(rows, allowed)]
+        if allowed is not None and (rows is None or len(rows) < k):
+            return self._score_filtered(qv, allowed, k), rows
+        if rows is None:
+            return self._score_vector(qv, k), None
+        return self.stage_two(qv, rows, k), rows
+
+    def _finish(
+        self,
+        plan: QueryPlan,
+        bm25_weight: float,
+        fusion: str,
+        vres: Optional[Ranked],
+        bres: Ranked,
+        rows: Optional[np.ndarray],
+        timings: Dict[str, float],
+        degraded: Optional[str],
+        t0: float,
+        **fields,
+    ) -> "Contexts":
+        """Rank the stage outputs and emit the retrieve (and degradation) metrics."""
+        if vres is not None and bm25_weight <= 0:
+            metas = self.store._metas
+            results = [
+                Hit(metas, row, score)
+                for row, score in zip(vres.rows.tolist(), vres.scores.tolist())
+            ]
+            ranked, fuse_ms = self._timed(self._rank_vector_only, plan, results)
+            mode = "vector"
+        else:
+            mode = "hybrid" if rows is None else "two_stage"
+            if vres is None:
+                # no query embedding: the BM25 ranking alone decides
+                mode, vres, bm25_weight = "bm25_only", Ranked.empty(), 1.0
+            ranked, fuse_ms = self._timed(self._rank_hybrid, plan, vres, bres, bm25_weight, fusion)
+        if rows is not None:
+            fields["stage_one"] = self.two_stage
+            fields["candidates"] = len(rows)
+        if degraded:
+            emit_metric(
+                "retrieve_degraded",
+                reason=degraded,
+                embed_ms=round(timings["embed_ms"], 2),
+                **fields,
+            )
         emit_metric(
             "retrieve",
-            mode="hybrid",
+            mode=mode,
+            fusion=fusion,
             hits=len(ranked),
-            bm25_weight=self.bm25_weight,
-            vec_hits=len(vres),
-            bm25_hits=len(bres),
+            bm25_weight=bm25_weight,
+            vec_hits=len(vres.rows),
+            bm25_hits=len(bres.rows),
+            plan_ms=round(plan.analysis_ms, 2),
+            **{key: round(ms, 2) for key, ms in timings.items()},
+            fuse_ms=round(fuse_ms, 2),
+            total_ms=round((time.perf_counter() - t0) * 1000, 2),
+            **fields,
         )
-        return ranked
+        return Contexts(ranked, degraded=degraded)
+
+    def get_relevant(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        bm25_weight: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        fusion: Optional[str] = None,
+        budget: Optional[float] = None,
+    ) -> "Contexts":
+        """Enhanced retrieval with query preprocessing and adaptive ranking.
+
+        ``k``, ``bm25_weight`` and ``fusion`` (see ``fusion.METHODS``) override the instance
+        defaults for this call, so one Retriever (and its BM25 index) can be shared across
+        requests. ``filters`` restricts hits to chunks whose metadata matches (see
+        ``QueryPlan.matches``).
+
+        ``budget`` is a latency budget in seconds. The query embedding may use
+        ``embed_slice`` of it; when it is late (or fails) the BM25 ranking is returned
+        and ``Contexts.degraded`` names the reason. Cached query vectors never wait.
+        """
+        if not query.strip():
+            return Contexts()
+        t0 = time.perf_counter()
+        plan = self.plan(query, k, filters)
+        bm25_weight = self.bm25_weight if bm25_weight is None else bm25_weight
+        fusion = (fusion or self.fusion).lower()
+        vec_k = plan.candidate_k if bm25_weight > 0 else plan.adaptive_k
+        two_stage = self.two_stage if bm25_weight > 0 or self.two_stage == "binary" else ""
+
+        # The query embedding (Ollama round trip) runs on the embed pool while BM25 /
+        # stage one scores on this thread; vector scoring follows once the embedding is
+        # back. Vector-only ranking needs BM25 only as the fallback for a missed embedding.
+        lexical = bm25_weight > 0
+        ts = time.perf_counter()
+        qv_future = _EMBED_POOL.submit(self._timed, self.query_vector, plan)
+        allowed = self._allowed_rows(plan)
+        (bres, rows), bm25_ms = (Ranked.empty(), None), 0.0
+        if lexical:
+            (bres, rows), bm25_ms = self._timed(
+                self._lexical_stage, plan, vec_k, two_stage == "bm25", allowed
+            )
+        qv, degraded, embed_ms = None, None, None
+        try:
+            timeout = None
+            if budget is not None:
+                timeout = max(budget * self.embed_slice - (time.perf_counter() - t0), 0.0)
+            qv, embed_ms = qv_future.result(timeout=timeout)
+        except FutureTimeoutError:
+            qv_future.cancel()
+            degraded = "embed_timeout"
+        except Exception as e:
+            if budget is None:
+                raise
+            logger.warning("query embedding failed, falling back to BM25: %s", e)
+            degraded = "embed_error"
+        parallel_ms = (time.perf_counter() - ts) * 1000
+        if embed_ms is None:  # abandoned: it took at least as long as we waited
+            embed_ms = parallel_ms
+        if qv is None and not lexical:
+            (bres, rows), bm25_ms = self._timed(self._lexical_stage, plan, vec_k, False, allowed)
+
+        vres, score_ms = None, 0.0
+        if qv is not None:
+            (vres, rows), score_ms = self._timed(
+                self._score_stage, qv, rows, vec_k, two_stage == "binary", allowed
+            )
+        timings = self._stage_timings(embed_ms, bm25_ms, score_ms, parallel_ms)
+        fields = {} if budget is None else {"budget_ms": round(budget * 1000, 2)}
+        return self._finish(
+            plan, bm25_weight, fusion, vres, bres, rows, timings, degraded, t0, **fields
+        )
+
+    async def _aembed_within(
+        self, plan: QueryPlan, timeout: Optional[float]
+    ) -> Tuple[Optional[List[float]], Optional[str]]:
+        """Query embedding bounded by ``timeout`` seconds: (vector, degradation reason)."""
+        if timeout is None:
+            return await self.aquery_vector(plan), None
+        try:
+            return await asyncio.wait_for(self.aquery_vector(plan), timeout=timeout), None
+        except asyncio.TimeoutError:
+            return None, "embed_timeout"
+        except Exception as e:
+            logger.warning("query embedding failed, falling back to BM25: %s", e)
+            return None, "embed_error"
+
+    async def aget_relevant(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        bm25_weight: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        fusion: Optional[str] = None,
+        budget: Optional[float] = None,
+    ) -> "Contexts":
+        """Async variant of :meth:`get_relevant`.
+
+        The query embedding is awaited on the event loop; faiss and BM25 scoring run on
+        the bounded retrieval pool. An embedding that overruns its budget slice is
+        cancelled, as is the pending request when the task itself is cancelled.
+        """
+        if not query.strip():
+            return Contexts()
+        t0 = time.perf_counter()
+        plan = self.plan(query, k, filters)
+        bm25_weight = self.bm25_weight if bm25_weight is None else bm25_weight
+        fusion = (fusion or self.fusion).lower()
+        vec_k = plan.candidate_k if bm25_weight > 0 else plan.adaptive_k
+        two_stage = self.two_stage if bm25_weight > 0 or self.two_stage == "binary" else ""
+
+        async def _timed_async(coro):
+            ts = time.perf_counter()
+            out = await coro
+            return out, (time.perf_counter() - ts) * 1000
+
+        allowed = self._allowed_rows(plan)
+        # the slice is of the whole budget, so time spent planning comes out of it
+        timeout = (
+            None
+            if budget is None
+            else max(budget * self.embed_slice - (time.perf_counter() - t0), 0.0)
+        )
+        lexical = bm25_weight > 0
+        stages = [_timed_async(self._aembed_within(plan, timeout))]
+        if lexical:
+            stages.append(
+                _timed_async(
+                    _run_cpu(self._lexical_stage, plan, vec_k, two_stage == "bm25", allowed)
+                )
+            )
+        done, parallel_ms = await _timed_async(asyncio.gather(*stages))
+        (qv, degraded), embed_ms = done[0]
+        (bres, rows), bm25_ms = done[1] if lexical else ((Ranked.empty(), None), 0.0)
+        if qv is None and not lexical:
+            (bres, rows), bm25_ms = await _timed_async(
+                _run_cpu(self._lexical_stage, plan, vec_k, False, allowed)
+            )
+        vres, score_ms = None, 0.0
+        if qv is not None:
+            (vres, rows), score_ms = await _timed_async(
+                _run_cpu(self._score_stage, qv, rows, vec_k, two_stage == "binary", allowed)
+            )
+        timings = self._stage_timings(embed_ms, bm25_ms, score_ms, parallel_ms)
+        fields: Dict[str, Any] = {"is_async": True}
+        if budget is not None:
+            fields["budget_ms"] = round(budget * 1000, 2)
+        return self._finish(
+            plan, bm25_weight, fusion, vres, bres, rows, timings, degraded, t0, **fields
+        )
+
+    def _diversify(self, results: List[Hit], plan: QueryPlan, score_key: str) -> List[Hit]:
+        if self.diversify == "mmr":
+            return self._mmr(results, plan.k, score_key)
+        return self._filter_relevant(results, plan.raw)
+
+    def _mmr(self, results: List[Hit], k: int, score_key: str) -> List[Hit]:
+        """Relevance threshold, then MMR over the candidates' stored embeddings."""
+        results = [r for r in results if r.get("score", 0) >= 0.1]
+        rows = [r.get("row") for r in results]
+        if len(results) < 2 or any(row is None for row in rows):
+            return self._filter_relevant(results, "")
+        vectors = self.store.vectors(rows)
+        relevance = np.array([r[score_key] for r in results], dtype=np.float32)
+        picked = mmr_select(relevance, vectors, k, self.mmr_lambda)
+        return [results[i] for i in picked]
 
-    def _filter_relevant(self, results: List[Dict], query: str) -> List[Dict]:
+    def _filter_relevant(self, results: List[Hit], query: str) -> List[Hit]:
         """Filter results based on relevance threshold and content quality"""
         if not results:
             return results
@@ -167,32 +676,11 @@ class Retriever:
         score_threshold = 0.1
         filtered = [r for r in results if r.get("score", 0) >= score_threshold]
 
-        # Remove duplicate or very similar content based on content hash overlap
-        unique_results = []
-        # store immutable signatures to allow hashing and fast membership checks
-        seen_content = set()
-
-        for result in filtered:
-            content = result.get("content", "")
-            if content:
-                # Create a simple content signature for deduplication
-                # use frozenset so it can be stored in a set for seen-content tracking
-                content_words = frozenset(jieba.cut(content))
-                is_duplicate = False
-
-                for seen_words in seen_content:
-                    # seen_words is a frozenset as well; set operations work with frozenset
-                    overlap = len(content_words & seen_words) / max(
-                        len(content_words | seen_words), 1
-                    )
-                    if overlap > 0.8:  # 80% similarity threshold
-                        is_duplicate = True
-                        break
-
-                if not is_duplicate:
-                    seen_content.add(content_words)
-                    unique_results.append(result)
-            else:
-                unique_results.append(result)
-
-        return unique_results
+        # Remove near-duplicate content by comparing precomputed MinHash signatures
+        # (estimated Jaccard over jieba tokens, 80% similarity threshold)
+        with_content = [r for r in filtered if r.get("content")]
+        if len(with_content) < 2:
+            return filtered
+        sigs = np.stack([signature_for(r.meta) for r in with_content])
+        dup = {id(r) for r, d in zip(with_content, near_duplicate_mask(sigs, 0.8)) if d}
+        return [r for r in filtered if id(r) not in dup]
@@ -0,0 +1,122 @@
+"""Semantic near-duplicate answer cache.
+
+Stores (query embedding, context hashes, answer) triples in a small in-memory
+faiss index. A new question reuses a cached answer when its embedding is within
+``threshold`` cosine similarity of a cached query, retrieval returned the same
+set of contexts *and* the same provider/model (``scope``) answers it, so
+paraphrases of popular questions skip the LLM call.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from ..logging_utils import emit_metric, get_logger
+
+logger = get_logger("semantic_cache")
+
+
+def context_key(hashes: Iterable[Optional[str]], scope: str = "") -> Tuple[str, ...]:
+    return (scope,) + tuple(sorted(h for h in hashes if h))
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 512,
+        ttl: float = 3600.0,
+        probe: int = 4,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.probe = probe
+        self._index = None
+        self._dim: Optional[int] = None
+        # id -> (expires_at, scope + context key, answer); insertion/access order is LRU order
+        self._entries: "OrderedDict[int, Tuple[float, Tuple[str, ...], str]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SemanticCache":
+        return cls(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def _as_query(vector: List[float]) -> np.ndarray:
+        q = np.array([vector], dtype="float32")
+        faiss.normalize_L2(q)
+        return q
+
+    def _remove(self, ids: List[int]) -> None:
+        for i in ids:
+            self._entries.pop(i, None)
+        self._index.remove_ids(np.array(ids, dtype="int64"))
+
+    def lookup(
+        self, vector: List[float], hashes: Iterable[Optional[str]], scope: str = ""
+    ) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = context_key(hashes, scope)
+        with self._lock:
+            if self._index is None or not self._entries or len(vector) != self._dim:
+                emit_metric("semantic_cache", result="miss")
+                return None
+            sims, ids = self._index.search(self._as_query(vector), self.probe)
+            now = time.time()
+            expired = []
+            answer = None
+            for sim, i in zip(sims[0], ids[0]):
+                if i < 0 or sim < self.threshold:
+                    break
+                expires_at, ckey, cached = self._entries[int(i)]
+                if expires_at < now:
+                    expired.append(int(i))
+                    continue
+                if ckey == key:
+                    self._entries.move_to_end(int(i))
+                    answer = cached
+                    emit_metric("semantic_cache", result="hit", similarity=round(float(sim), 4))
+                    break
+            if expired:
+                self._remove(expired)
+        if answer is None:
+            emit_metric("semantic_cache", result="miss")
+        return answer
+
+    def add(
+        self, vector: List[float], hashes: Iterable[Optional[str]], answer: str, scope: str = ""
+    ) -> None:
+        if not self.enabled or not answer:
+            return
+        with self._lock:
+            if self._index is None:
+                self._dim = len(vector)
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self._dim))
+            elif len(vector) != self._dim:
+                return
+            if len(self._entries) >= self.max_entries:
+                oldest = list(self._entries)[: len(self._entries) - self.max_entries + 1]
+                self._remove(oldest)
+            eid = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(self._as_query(vector), np.array([eid], dtype="int64"))
+            self._entries[eid] = (time.time() + self.ttl, context_key(hashes, scope), answer)
+
+    def __len__(self) -> int:
+        return len(self._entries)
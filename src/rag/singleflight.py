@@ -0,0 +1,163 @@
+"""In-flight request coalescing ("singleflight").
+
+When many identical requests arrive together (a class submitting the same question),
+only the first one (the leader) does the work; the others (followers) attach to it.
+
+- ``SingleFlight.do(key, fn)`` runs ``fn()`` once per key among concurrent callers and
+  hands every caller the same result or exception. The shared call runs as its own
+  task, so a leader whose client disconnects does not fail its followers.
+- ``StreamFlight.subscribe(key, factory)`` does the same for async generators: one
+  upstream stream per key, fanned out to every subscriber. Late subscribers replay
+  what was already produced, then follow live. The upstream is read at most
+  ``buffer`` items ahead of its slowest subscriber, so a slow reader slows the shared
+  stream rather than letting it run ahead, and is cancelled once its last subscriber
+  leaves. Produced items are kept for replay until the stream ends (one answer, which
+  the caller collects anyway to cache it).
+
+Keys are only shared within one event loop; entries disappear as soon as the call
+finishes, so this never serves stale results (the caches do that).
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+from ..logging_utils import emit_metric
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # every caller may have been cancelled; don't log "exception never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+            self.leaders += 1
+            role = "leader"
+        else:
+            self.followers += 1
+            role = "follower"
+        emit_metric("singleflight", flight=self.name, role=role)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {"leaders": self.leaders, "followers": self.followers, "inflight": len(self._calls)}
+
+
+class _Broadcast:
+    def __init__(self, source: AsyncIterator, loop: asyncio.AbstractEventLoop, buffer: int):
+        self.loop = loop
+        self.buffer = max(buffer, 1)
+        self._items: List = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        # subscriber id -> index of the next item it reads
+        self._positions: Dict[int, int] = {}
+        self._next_id = 0
+        self._changed = asyncio.Event()
+        self._advanced = asyncio.Event()
+        self.task = loop.create_task(self._pump(source))
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _advance(self) -> None:
+        self._advanced.set()
+        self._advanced = asyncio.Event()
+
+    def lag(self) -> int:
+        """Items produced but not yet read by the slowest subscriber."""
+        return len(self._items) - min(self._positions.values(), default=len(self._items))
+
+    async def _pump(self, source: AsyncIterator) -> None:
+        try:
+            async for item in source:
+                self._items.append(item)
+                self._notify()
+                # backpressure: stop reading upstream until the slowest subscriber catches up
+                while self.lag() >= self.buffer:
+                    await self._advanced.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._notify()
+
+    def subscribe(self) -> AsyncIterator:
+        # registered here rather than on first iteration so the upstream can't be
+        # cancelled between a subscriber joining and starting to read
+        sid = self._next_id
+        self._next_id += 1
+        self._positions[sid] = 0
+        return self._iterate(sid)
+
+    async def _iterate(self, sid: int):
+        try:
+            while True:
+                i = self._positions[sid]
+                if i < len(self._items):
+                    self._positions[sid] = i + 1
+                    self._advance()
+                    yield self._items[i]
+                    continue
+                if self._done:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                await self._changed.wait()
+        finally:
+            del self._positions[sid]
+            self._advance()
+            if not self._positions and not self._done:
+                self.task.cancel()
+
+
+class StreamFlight:
+    def __init__(self, name: str, buffer: int = 32):
+        self.name = name
+        self.buffer = buffer
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _forget(self, key: Hashable, broadcast: _Broadcast) -> None:
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    def subscribe(self, key: Hashable, factory: Callable[[], AsyncIterator]) -> AsyncIterator:
+        loop = asyncio.get_running_loop()
+        broadcast = self._streams.get(key)
+        if broadcast is None or broadcast.loop is not loop or broadcast.task.done():
+            broadcast = _Broadcast(factory(), loop, self.buffer)
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _, key=key, b=broadcast: self._forget(key, b))
+            self.leaders += 1
+            role = "leader"
+        else:
+            self.followers += 1
+            role = "follower"
+        emit_metric("singleflight", flight=self.name, role=role)
+        return broadcast.subscribe()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "inflight": len(self._streams),
+        }
@@ -1,23 +1,89 @@
 import json
+import os
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 import faiss
 import numpy as np
 
 from ..logging_utils import emit_metric, get_logger, span
+from .dedup import encode_signature, minhash_text, signature_for
 from .embeddings import OllamaEmbeddings
+from .hit import Hit
 
 logger = get_logger("vector_store")
 
 
+def index_sidecars(index_path: str | Path) -> List[Path]:
+    """Files persisted next to the faiss index (removed together on rebuild)."""
+    index_path = Path(index_path)
+    return [
+        index_path.with_suffix(".vectors.npy"),
+        index_path.with_suffix(".binary.faiss"),
+        index_path.with_suffix(".reduced.faiss"),
+        index_path.with_suffix(".knn_ids.npy"),
+        index_path.with_suffix(".knn_scores.npy"),
+    ]
+
+
+def parse_reduce(spec: str | None) -> Tuple[str, int] | None:
+    """``"pca:256"`` (learned PCA) or ``"prefix:256"`` (Matryoshka truncation) -> (method, dim)."""
+    if not spec:
+        return None
+    method, _, dim = spec.lower().partition(":")
+    if method == "matryoshka":
+        method = "prefix"
+    if method not in ("pca", "prefix") or not dim.isdigit():
+        raise ValueError(f"invalid VECTOR_REDUCE {spec!r}, expected pca:<dim> or prefix:<dim>")
+    return method, int(dim)
+
+
+def sign_codes(vectors: np.ndarray) -> np.ndarray:
+    """Binary quantization: one sign bit per dimension, packed (768 dims -> 96 bytes)."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
 class FaissStore:
-    def __init__(self, index_path: str, meta_path: str, dim: int | None = None):
+    def __init__(
+        self,
+        index_path: str,
+        meta_path: str,
+        dim: int | None = None,
+        binary: bool | None = None,
+        reduce: str | None = None,
+    ):
         self.index_path = Path(index_path)
         self.meta_path = Path(meta_path)
         self.dim = dim
         self._index = None
         self._metas: List[Dict[str, Any]] = []
+        # Full-precision normalized vectors (N x dim), memory-mapped from vectors_path
+        (
+            self.vectors_path,
+            self.binary_path,
+            self.reduced_path,
+            self.knn_ids_path,
+            self.knn_scores_path,
+        ) = index_sidecars(self.index_path)
+        self._matrix: np.ndarray | None = None
+        # Optional sign-bit codes (faiss IndexBinaryFlat) for a cheap Hamming prefilter;
+        # maintained on add/persist when enabled, otherwise built on first use
+        if binary is None:
+            binary = os.getenv("VECTOR_BINARY_INDEX", "0").lower() in ("1", "true", "on")
+        self.binary = binary
+        self._binary = None
+        # Optional first-pass index over reduced vectors (PCA or prefix truncation, see
+        # parse_reduce); candidates are re-ranked against the full-width matrix
+        self.reduce = parse_reduce(os.getenv("VECTOR_REDUCE", "") if reduce is None else reduce)
+        self.oversample = int(os.getenv("VECTOR_REDUCE_OVERSAMPLE", "4"))
+        self._reduced = None
+        # Precomputed chunk kNN graph (int32 ids, float16 scores), see build_neighbors
+        self._knn: Tuple[np.ndarray, np.ndarray] | None = None
+        self._knn_stamp: Tuple | None = None
+        self._row_by_hash: Dict[str, int] | None = None
+        self.generation = "0-"
+        self._edits = 0
         if self.index_path.exists() and self.meta_path.exists():
             self._load()
 
@@ -33,22 +99,247 @@ class FaissStore:
             raise ValueError("Dimension mismatch")
         # Normalize for cosine similarity approximate
         faiss.normalize_L2(arr)
+        base = self.matrix()
+        if self.binary or self._binary is not None:
+            self.binary_index()  # bring codes for the existing rows up to date first
         self._index.add(arr)
+        self._matrix = arr if base is None or base.shape[0] == 0 else np.vstack([base, arr])
+        if self._binary is not None and self.dim % 8 == 0:
+            self._binary.add(sign_codes(arr))
+        if self._reduced is not None:
+            self._reduced.add(arr)
         self._metas.extend(metas)
+        self._bump_generation()
 
-    def search(self, query: List[float], k: int = 5):
+    def _bump_generation(self):
+        """New generation for an in-memory change that has not been persisted yet."""
+        self._row_by_hash = None
+        self._edits += 1
+        self.generation = f"{self.generation.split('+')[0]}+{self._edits}"
+
+    def _stamp_generation(self):
+        """Generation of the persisted corpus.
+
+        Derived from the metadata file's mtime and size, which every persist rewrites, so
+        a rebuild with the same chunk count never reuses an old generation, while
+        processes that loaded the same files agree on it.
+        """
+        self._row_by_hash = None
+        self._edits = 0
+        try:
+            st = self.meta_path.stat()
+        except OSError:
+            self.generation = f"{len(self._metas)}-"
+            return
+        self.generation = f"{len(self._metas)}-{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    def search_rows(self, query: List[float], k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-``k`` (row ids, cosine scores) as arrays, best first."""
         if self._index is None:
-            return []
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
         q = np.array([query], dtype="float32")
         faiss.normalize_L2(q)
+        if self._reduced is not None:
+            return self._search_reduced(q, k)
         scores, idxs = self._index.search(q, k)
-        results = []
-        for score, idx in zip(scores[0], idxs[0]):
-            if idx < 0:
-                continue
-            meta = self._metas[idx]
-            results.append({"score": float(score), **meta})
-        return results
+        keep = idxs[0] >= 0
+        return idxs[0][keep].astype("int64"), scores[0][keep]
+
+    def _search_reduced(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        _, idxs = self._reduced.search(q, k * self.oversample)
+        rows = idxs[0][idxs[0] >= 0].astype("int64")
+        scores = self.vectors(rows) @ q[0]
+        order = np.argsort(-scores, kind="stable")[:k]
+        return rows[order], scores[order]
+
+    def train_reduction(self, recall_queries: int = 200, recall_k: int = 10) -> float | None:
+        """Train the configured reduction on the stored vectors and index them.
+
+        Returns recall@``recall_k`` of reduced search + re-rank against exact search,
+        measured on up to ``recall_queries`` stored vectors used as queries.
+        """
+        if self.reduce is None or self._index is None:
+            return None
+        method, out_dim = self.reduce
+        matrix = self.matrix()
+        n = matrix.shape[0]
+        if out_dim >= self.dim or (method == "pca" and n < out_dim):
+            logger.warning(
+                "vector reduction %s:%d skipped (dim=%d, vectors=%d)", method, out_dim, self.dim, n
+            )
+            return None
+        t0 = time.perf_counter()
+        if method == "pca":
+            transform = faiss.PCAMatrix(self.dim, out_dim)
+            sample = np.random.default_rng(0).permutation(n)[: max(out_dim * 40, 10000)]
+            transform.train(np.ascontiguousarray(matrix[np.sort(sample)], dtype="float32"))
+        else:
+            # Matryoshka-trained embeddings keep most of their signal in the leading dims
+            transform = faiss.RemapDimensionsTransform(self.dim, out_dim, False)
+        reduced = faiss.IndexPreTransform(faiss.IndexFlatIP(out_dim))
+        reduced.prepend_transform(faiss.NormalizationTransform(out_dim))
+        reduced.prepend_transform(transform)
+        for start in range(0, n, 65536):
+            reduced.add(np.ascontiguousarray(matrix[start : start + 65536], dtype="float32"))
+        self._reduced = reduced
+        train_ms = (time.perf_counter() - t0) * 1000
+        recall = self.reduction_recall(recall_queries, recall_k)
+        logger.info(f"vector reduction {method}:{out_dim} trained recall@{recall_k}={recall:.3f}")
+        emit_metric(
+            "vector_reduce",
+            method=method,
+            dim=out_dim,
+            full_dim=self.dim,
+            vectors=n,
+            oversample=self.oversample,
+            recall=round(recall, 4),
+            recall_k=recall_k,
+            train_ms=round(train_ms, 2),
+        )
+        return recall
+
+    def reduction_recall(self, queries: int = 200, k: int = 10) -> float:
+        """Overlap of reduced (+ re-rank) top-k with exact top-k over sampled stored vectors."""
+        matrix = self.matrix()
+        n = matrix.shape[0]
+        if self._reduced is None or n == 0:
+            return 1.0
+        k = min(k, n)
+        picks = np.sort(np.random.default_rng(1).permutation(n)[:queries])
+        qs = np.ascontiguousarray(matrix[picks], dtype="float32")
+        _, exact = self._index.search(qs, k)
+        found = 0
+        for q, truth in zip(qs, exact):
+            rows, _ = self._search_reduced(q[None, :], k)
+            found += len(np.intersect1d(rows, truth))
+        return found / (len(qs) * k)
+
+    def search(self, query: List[float], k: int = 5) -> List[Hit]:
+        rows, scores = self.search_rows(query, k)
+        return [Hit(self._metas, row, score) for row, score in zip(rows.tolist(), scores.tolist())]
+
+    def matrix(self) -> np.ndarray | None:
+        """All stored vectors, memory-mapped so only touched rows are paged in."""
+        if self._matrix is None and self._index is not None:
+            if self.vectors_path.exists():
+                self._matrix = np.load(self.vectors_path, mmap_mode="r")
+            else:
+                # indexes built before the sidecar existed: recover vectors from faiss
+                self._matrix = self._index.reconstruct_n(0, self._index.ntotal)
+        return self._matrix
+
+    def vectors(self, rows: List[int]) -> np.ndarray:
+        """L2-normalized stored embeddings for ``rows``."""
+        matrix = self.matrix()
+        if matrix is None or len(rows) == 0:
+            return np.zeros((0, self.dim or 0), dtype="float32")
+        return np.asarray(matrix[np.asarray(rows, dtype="int64")], dtype="float32")
+
+    def binary_index(self):
+        """Sign-bit codes of every stored vector, loaded from disk or built on first use."""
+        if self._binary is not None or self._index is None or self.dim % 8:
+            return self._binary
+        if self.binary_path.exists():
+            index = faiss.read_index_binary(str(self.binary_path))
+            if index.ntotal == self._index.ntotal and index.d == self.dim:
+                self._binary = index
+                return index
+            logger.warning("binary index out of date (%s rows), rebuilding", index.ntotal)
+        matrix = self.matrix()
+        index = faiss.IndexBinaryFlat(self.dim)
+        for start in range(0, matrix.shape[0], 65536):
+            index.add(sign_codes(matrix[start : start + 65536]))
+        self._binary = index
+        return index
+
+    def binary_search(self, query: List[float], k: int) -> np.ndarray | None:
+        """Row ids of the ``k`` nearest codes by Hamming distance (None if unavailable)."""
+        index = self.binary_index()
+        if index is None:
+            return None
+        _, ids = index.search(sign_codes(np.array([query], dtype="float32")), k)
+        return ids[0][ids[0] >= 0].astype("int64")
+
+    def row_of(self, chunk_hash: str) -> int | None:
+        if self._row_by_hash is None:
+            self._row_by_hash = {m.get("hash"): i for i, m in enumerate(self._metas)}
+        return self._row_by_hash.get(chunk_hash)
+
+    def build_neighbors(self, n: int = 10, batch: int = 1024) -> int:
+        """Offline job: each chunk's top-``n`` nearest chunks, searched in batches.
+
+        Stored beside the index as int32 ids and float16 scores (-1 / 0 padded) and
+        memory-mapped by :meth:`neighbors`. Returns the number of rows processed.
+        """
+        matrix = self.matrix()
+        if matrix is None or self._index is None:
+            return 0
+        total = matrix.shape[0]
+        ids = np.full((total, n), -1, dtype=np.int32)
+        scores = np.zeros((total, n), dtype=np.float16)
+        t0 = time.perf_counter()
+        for start in range(0, total, batch):
+            q = np.ascontiguousarray(matrix[start : start + batch], dtype="float32")
+            sims, idxs = self._index.search(q, n + 1)
+            for j in range(q.shape[0]):
+                keep = (idxs[j] >= 0) & (idxs[j] != start + j)
+                row_ids, row_sims = idxs[j][keep][:n], sims[j][keep][:n]
+                ids[start + j, : len(row_ids)] = row_ids
+                scores[start + j, : len(row_ids)] = row_sims
+        for path, arr in ((self.knn_ids_path, ids), (self.knn_scores_path, scores)):
+            tmp = path.with_suffix(".tmp.npy")
+            np.save(tmp, arr)
+            tmp.replace(path)
+        self._knn = None
+        emit_metric("knn_build", rows=total, n=n, ms=round((time.perf_counter() - t0) * 1000, 2))
+        return total
+
+    def _knn_arrays(self) -> Tuple[np.ndarray, np.ndarray] | None:
+        """Memory-mapped neighbour arrays, remapped when the corpus generation or the
+        sidecar files change (incremental ingest, or ``cli knn`` in another process)."""
+        try:
+            stamp = (
+                self.generation,
+                self.knn_ids_path.stat().st_mtime_ns,
+                self.knn_scores_path.stat().st_mtime_ns,
+            )
+        except OSError:
+            self._knn = None
+            return None
+        if self._knn is None or self._knn_stamp != stamp:
+            self._knn = (
+                np.load(self.knn_ids_path, mmap_mode="r"),
+                np.load(self.knn_scores_path, mmap_mode="r"),
+            )
+            self._knn_stamp = stamp
+        return self._knn
+
+    def neighbors(self, chunk_hash: str, n: int | None = None) -> List[Hit] | None:
+        """Precomputed related chunks for ``chunk_hash`` (no embedding or search).
+
+        Returns None when the hash is unknown or the graph has not been built for it.
+        """
+        row = self.row_of(chunk_hash)
+        if row is None:
+            return None
+        knn = self._knn_arrays()
+        if knn is None:
+            return None
+        ids, scores = knn
+        if row >= ids.shape[0]:
+            return None  # chunk added after the graph was built
+        out = []
+        for nid, score in zip(ids[row][:n].tolist(), scores[row][:n].tolist()):
+            if nid < 0:
+                break
+            out.append(Hit(self._metas, nid, score))
+        return out
+
+    def score_rows(self, query: List[float], rows: np.ndarray) -> np.ndarray:
+        """Exact cosine scores of ``query`` against just the given rows."""
+        q = np.array([query], dtype="float32")
+        faiss.normalize_L2(q)
+        return self.vectors(rows) @ q[0]
 
     def persist(self):
         # Ensure target directories exist before attempting to write files
@@ -67,22 +358,88 @@ class FaissStore:
             except Exception as e:
                 logger.exception("faiss.write_index failed: %s", e)
                 raise
+            self._persist_vectors()
+            if self._binary is not None:
+                try:
+                    faiss.write_index_binary(self._binary, str(self.binary_path))
+                except Exception as e:
+                    logger.exception("faiss.write_index_binary failed: %s", e)
+                    raise
+            if self._reduced is not None:
+                try:
+                    faiss.write_index(self._reduced, str(self.reduced_path))
+                except Exception as e:
+                    logger.exception("faiss.write_index (reduced) failed: %s", e)
+                    raise
+        self._persist_metas()
+
+    def _persist_metas(self):
+        # written aside and swapped in so a concurrently loading process never reads
+        # a half-written file
+        tmp = self.meta_path.with_suffix(self.meta_path.suffix + ".tmp")
         try:
-            with self.meta_path.open("w", encoding="utf-8") as f:
+            with tmp.open("w", encoding="utf-8") as f:
                 for m in self._metas:
                     f.write(json.dumps(m, ensure_ascii=False) + "\n")
+            tmp.replace(self.meta_path)
         except Exception as e:
             logger.exception("failed to write meta file %s: %s", self.meta_path, e)
             raise
+        self._stamp_generation()
+
+    def backfill_signatures(self) -> int:
+        """Compute dedup signatures for chunks ingested before they were stored and write
+        them back, so the jieba pass over legacy chunks runs once rather than per query.
+
+        Run from ingest (``build_or_update``) rather than on load, so serving processes
+        never rewrite the metadata file underneath each other."""
+        missing = [m for m in self._metas if "minhash" not in m]
+        if not missing:
+            return 0
+        for m in missing:
+            m["minhash"] = encode_signature(signature_for(m))
+        try:
+            self._persist_metas()
+        except Exception as e:
+            # read-only deployments still work, they just recompute per query
+            logger.warning("could not persist backfilled minhash signatures: %s", e)
+        logger.info("backfilled minhash signatures for %d legacy chunks", len(missing))
+        return len(missing)
+
+    def _persist_vectors(self):
+        matrix = self.matrix()
+        if matrix is None or isinstance(matrix, np.memmap):
+            return
+        tmp = self.vectors_path.with_suffix(".tmp.npy")
+        try:
+            np.save(tmp, np.ascontiguousarray(matrix, dtype="float32"))
+            tmp.replace(self.vectors_path)
+        except Exception as e:
+            logger.exception("failed to write vector matrix %s: %s", self.vectors_path, e)
+            raise
+        # reopen as a memmap so the in-memory copy can be released
+        self._matrix = np.load(self.vectors_path, mmap_mode="r")
 
     def _load(self):
-        self._index = faiss.read_index(str(self.index_path))
         with self.meta_path.open("r", encoding="utf-8") as f:
             self._metas = [json.loads(line) for line in f]
-        if self._metas:
-            sample_vec = self._metas[0].get("vector")
-            if sample_vec:
-                self.dim = len(sample_vec)
+        for m in self._metas:
+            # older metadata files carried the full embedding; it lives in the index
+            m.pop("vector", None)
+        self._stamp_generation()
+        if self.reduce is not None and self.reduced_path.exists():
+            reduced = faiss.read_index(str(self.reduced_path))
+            if reduced.ntotal == len(self._metas) and reduced.chain.at(0).d_out == self.reduce[1]:
+                self._reduced = reduced
+            else:
+                logger.warning(
+                    "reduced index does not match %s, searching full vectors", self.reduce
+                )
+        # With a reduced first-pass index the full-width index is only needed for appends
+        # and exact recall checks, so leave it memory-mapped instead of resident
+        flags = faiss.IO_FLAG_MMAP if self._reduced is not None else 0
+        self._index = faiss.read_index(str(self.index_path), flags)
+        self.dim = self._index.d
 
 
 def build_or_update(chunks: List[Dict], store: FaissStore, embed_model: OllamaEmbeddings):
@@ -93,6 +450,7 @@ def build_or_update(chunks: List[Dict], store: FaissStore, embed_model: OllamaEm
     - For each new chunk, attempt embedding with progressive truncation lengths.
     - On total failure, skip that chunk (log in returned stats via negative count placeholder if needed).
     """
+    store.backfill_signatures()
     existing_hashes = {m["hash"] for m in store._metas if "hash" in m}
     new_chunks = [c for c in chunks if c["hash"] not in existing_hashes]
     if not new_chunks:
@@ -129,11 +487,13 @@ def build_or_update(chunks: List[Dict], store: FaissStore, embed_model: OllamaEm
         m = {k: c[k] for k in ("hash", "source", "content") if k in c}
         if "truncated_to" in c:
             m["truncated_to"] = c["truncated_to"]
-        m["vector"] = vec
+        m["minhash"] = encode_signature(minhash_text(content))
         metas.append(m)
         vectors.append(vec)
     if vectors:
         store.add(vectors, metas)
+        if store.reduce is not None and store._reduced is None:
+            store.train_reduction()
         store.persist()
     logger.info(
         f"build_or_update added={len(vectors)} skipped={skipped} new_total={len(store._metas)}"
@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+
+def pytest_configure(config):
+    # keep the auth DB (created when views is imported) and metrics out of the repo
+    scratch = tempfile.mkdtemp(prefix="rag-tests-")
+    os.environ.setdefault("AUTH_DB_PATH", os.path.join(scratch, "users.db"))
+    os.environ.setdefault("LOG_DIR", os.path.join(scratch, "logs"))
+    # backend views import Django/DRF settings at module level
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.test_settings")
+    import django
+
+    django.setup()
@@ -0,0 +1,37 @@
+"""Persistent exact-match answer cache."""
+
+from src.rag.answer_cache import AnswerCache, answer_key, make_key
+
+
+def test_answer_cache_key_eviction_and_ttl(tmp_path):
+    """Context order changes the key; the SQLite tier evicts LRU rows and expired rows."""
+    key = make_key("openrouter", "m", "v1", "问题", ["a", "b"], 0.2)
+    assert key == make_key("openrouter", "m", "v1", " 问题 ", ["a", "b"], 0.2)
+    assert key != make_key("openrouter", "m", "v1", "问题", ["b", "a"], 0.2)
+    assert key != make_key("openrouter", "m", "v2", "问题", ["a", "b"], 0.2)
+
+    cache = AnswerCache(str(tmp_path / "answers.db"), max_entries=2)
+    cache.set("k1", "one")
+    cache.set("k2", "two")
+    assert cache.get("k1") == "one"  # k1 is now more recent than k2
+    cache.set("k3", "three")
+    assert cache.get("k2") is None and cache.get("k1") == "one"
+    assert AnswerCache(str(tmp_path / "answers.db")).get("k3") == "three", "persisted"
+
+    expired = AnswerCache(str(tmp_path / "ttl.db"), ttl=-1)
+    expired.set("k", "v")
+    assert expired.get("k") is None
+
+
+def test_answer_key_follows_the_context_packing_budget(monkeypatch):
+    """Changing the context budget or per-context cap invalidates cached answers."""
+
+    class LLM:
+        provider, model, temperature = "openrouter", "m", 0.2
+
+    keys = set()
+    for total, per in (("3000", "800"), ("1500", "800"), ("3000", "400")):
+        monkeypatch.setenv("PROMPT_CONTEXT_TOKENS", total)
+        monkeypatch.setenv("PROMPT_CONTEXT_MAX_TOKENS", per)
+        keys.add(answer_key(LLM(), "问题", ["a"]))
+    assert len(keys) == 3
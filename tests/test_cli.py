@@ -0,0 +1,82 @@
+"""Command line batch answering."""
+
+import asyncio
+import json
+
+from src import cli
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_cli_batch_resume_keeps_answered_records_and_drops_torn_lines(tmp_path):
+    """A partial JSONL output is trimmed to its answered records before resuming."""
+    out = tmp_path / "answers.jsonl"
+    records = [
+        {"index": 1, "question": "q1", "answer": "a1"},
+        {"index": 2, "question": "q2", "error": "timeout"},
+        {"index": 3, "question": "old q3", "answer": "a3"},
+    ]
+    out.write_text(
+        "".join(json.dumps(r) + "\n" for r in records) + '{"index": 4, "quest', encoding="utf-8"
+    )
+    done = cli._load_done(str(out), ["q1", "q2", "q3", "q4"])
+    assert list(done) == [1], "failed and since-edited questions are asked again"
+    assert out.read_text(encoding="utf-8") == json.dumps(records[0], ensure_ascii=False) + "\n"
+
+
+def test_async_answer_batch_resumes_in_input_order(tmp_path, monkeypatch):
+    """Resumed answers are merged by index: one record per question, in input order."""
+    out = tmp_path / "answers.jsonl"
+    out.write_text(
+        json.dumps({"index": 2, "question": "q2", "answer": "old a2"})
+        + "\n"
+        + json.dumps({"index": 4, "question": "stale q4", "answer": "stale"})
+        + "\n",
+        encoding="utf-8",
+    )
+    delays = {"q1": 0.05, "q3": 0.0, "q4": 0.02, "q5": 0.0}
+    asked, in_flight, peak = [], [0], [0]
+
+    class Retriever:
+        async def aget_relevant(self, question):
+            return [{"score": 1.0, "source": "s.docx", "hash": "h", "content": question}]
+
+    class LLM:
+        async def acomplete(self, question, contexts):
+            asked.append(question)
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(delays[question])
+            in_flight[0] -= 1
+            return "a" + question[1:]
+
+    monkeypatch.setattr(cli, "_load_retriever", lambda top_k, bm25_weight: Retriever())
+    monkeypatch.setattr(cli, "get_default_llm", LLM)
+    questions = ["q1", "q2", "q3", "q4", "q5"]
+    rc = asyncio.run(
+        cli.async_answer_batch(questions, 4, 0.3, concurrency=2, out_path=str(out), resume=True)
+    )
+
+    assert rc == 0
+    assert sorted(asked) == ["q1", "q3", "q4", "q5"] and peak[0] <= 2
+    records = _lines(out)
+    assert [r["index"] for r in records] == [1, 2, 3, 4, 5]
+    assert [r["answer"] for r in records] == ["a1", "old a2", "a3", "a4", "a5"]
+
+
+def test_each_repl_question_closes_its_pooled_clients(monkeypatch):
+    """Every ``asyncio.run`` the REPL starts closes the clients bound to its loop."""
+    closed = []
+
+    async def call_llm(llm, question, docs):
+        return "a " + question
+
+    async def aclose():
+        closed.append(True)
+
+    monkeypatch.setattr(cli, "_call_llm", call_llm)
+    monkeypatch.setattr(cli, "aclose_clients", aclose)
+    answers = [asyncio.run(cli._answer_and_close(None, q, [])) for q in ("q1", "q2")]
+    assert answers == ["a q1", "a q2"] and len(closed) == 2
@@ -0,0 +1,37 @@
+"""MinHash near-duplicate signatures."""
+
+import numpy as np
+
+from src.rag.dedup import (
+    NUM_PERM,
+    decode_signature,
+    encode_signature,
+    minhash_text,
+    near_duplicate_mask,
+    signature_for,
+)
+
+
+def test_minhash_signature_roundtrip():
+    """Signatures are fixed-size and survive hex encoding."""
+    sig = minhash_text("线性规划是一种优化方法")
+    assert sig.shape == (NUM_PERM,), "signature should have NUM_PERM entries"
+    assert np.array_equal(decode_signature(encode_signature(sig)), sig)
+    assert decode_signature("not-hex") is None, "invalid signatures should decode to None"
+
+
+def test_near_duplicate_mask():
+    """Near-identical chunks are dropped, distinct chunks are kept in rank order."""
+    a = "线性规划是一种优化方法，约束条件包含不等式，目标函数为线性函数。"
+    b = "线性规划是一种优化方法，约束条件包含不等式，目标函数为线性函数"
+    c = "时间序列预测常用ARIMA模型和指数平滑方法。"
+    sigs = np.stack([minhash_text(t) for t in (a, b, c)])
+    assert near_duplicate_mask(sigs, 0.8) == [False, True, False]
+
+
+def test_signature_for_leaves_legacy_meta_untouched():
+    """Chunks without a stored signature get one computed without mutating the meta."""
+    meta = {"content": "层次分析法用于综合评价"}
+    sig = signature_for(meta)
+    assert meta == {"content": "层次分析法用于综合评价"}, "metas are shared across readers"
+    assert np.array_equal(sig, minhash_text(meta["content"]))
@@ -0,0 +1,53 @@
+"""Ollama embedding client retries against mocked HTTP transports."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from src.rag import embeddings
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    """An embedder whose sync and async clients answer from ``replies`` in order."""
+    monkeypatch.setenv("OLLAMA_PROBE", "0")
+    monkeypatch.setattr(embeddings.time, "sleep", lambda s: None)
+
+    async def no_sleep(s):
+        return None
+
+    monkeypatch.setattr(embeddings.asyncio, "sleep", no_sleep)
+    replies, seen = [], []
+
+    def handler(request):
+        seen.append(request)
+        status, body = replies.pop(0)
+        return httpx.Response(status, json=body)
+
+    transport = httpx.MockTransport(handler)
+    sync, aclient = httpx.Client(transport=transport), httpx.AsyncClient(transport=transport)
+    monkeypatch.setattr(embeddings, "sync_client", lambda name: sync)
+    monkeypatch.setattr(embeddings, "async_client", lambda name: aclient)
+    return embeddings.LocalOllamaEmbedding("nomic-embed-text"), replies, seen
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_client_errors_fail_fast_and_server_errors_retry(ollama, mode):
+    """A 4xx on every payload shape is not retried; 5xx and missing fields are."""
+    embedder, replies, seen = ollama
+
+    def embed(text):
+        if mode == "sync":
+            return embedder.embed_query(text)
+        return asyncio.run(embedder.aembed_query(text))
+
+    replies[:] = [(404, {"error": "model not found"})] * 2
+    with pytest.raises(RuntimeError, match="after 1 attempts"):
+        embed("线性规划")
+    assert len(seen) == 2, "one request per payload variant, no retries"
+
+    seen.clear()
+    replies[:] = [(500, {}), (502, {}), (200, {}), (200, {"embedding": [0.1, 0.2]})]
+    assert embed("线性规划") == [0.1, 0.2]
+    assert [r.read().count(b'"prompt"') for r in seen] == [1, 0, 1, 0]
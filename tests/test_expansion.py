@@ -0,0 +1,24 @@
+"""Query expansion dictionary."""
+
+import json
+import os
+
+from src.rag.expansion import AhoCorasick, ExpansionDictionary
+
+
+def test_expansion_dictionary_aho_corasick_and_reload(tmp_path):
+    """All dictionary terms are found in one pass; edits to the file are hot-reloaded."""
+    automaton = AhoCorasick.build(["he", "she", "his", "hers"])
+    keys = ["he", "she", "his", "hers"]
+    assert sorted(keys[i] for i in automaton.find("ushers")) == ["he", "hers", "she"]
+
+    path = tmp_path / "expansion.json"
+    path.write_text(json.dumps({"terms": {"优化": ["线性规划", "整数规划", "非线性规划"]}}))
+    d = ExpansionDictionary(path, reload_interval=0)
+    assert d.terms_for("如何优化模型") == ["线性规划", "整数规划"]
+    assert (tmp_path / "expansion.cache.json").exists(), "compiled automaton should be cached"
+
+    path.write_text(json.dumps({"terms": {"评价": ["层次分析法"]}}))
+    os.utime(path, (1, 1))
+    assert d.terms_for("如何优化模型") == []
+    assert d.terms_for("综合评价") == ["层次分析法"]
@@ -0,0 +1,108 @@
+"""Hedged failover LLM and circuit breakers."""
+
+import asyncio
+import time
+
+from src.rag.failover import CircuitBreaker, FailoverLLM
+
+
+def test_failover_llm_hedges_slow_primary_and_opens_breaker():
+    """A slow primary is hedged after the delay; failing providers trip their breaker."""
+
+    class Fake:
+        def __init__(self, name, delay, fail=False):
+            self.name, self.delay, self.fail = name, delay, fail
+
+        async def acomplete(self, question, contexts, stream=False):
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError(f"{self.name} down")
+            return self.name
+
+    hedged = FailoverLLM([("slow", Fake("slow", 1.0)), ("fast", Fake("fast", 0))], hedge_delay=0.05)
+    assert asyncio.run(hedged.acomplete("q", [])) == "fast"
+
+    failing = FailoverLLM(
+        [("bad", Fake("bad", 0, fail=True)), ("ok", Fake("ok", 0))], breaker_failures=2
+    )
+    assert [asyncio.run(failing.acomplete("q", [])) for _ in range(3)] == ["ok"] * 3
+    assert failing.providers[0].breaker.state == "open"
+    assert failing.providers[0].calls == 2, "open breaker skips the provider"
+
+
+def test_half_open_breaker_admits_a_single_trial():
+    """After the cooldown one call is let through; the rest wait for its verdict."""
+    breaker = CircuitBreaker(failures=1, cooldown=0.05)
+    breaker.record_failure()
+    assert not breaker.begin()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.begin() and not breaker.begin() and not breaker.allow()
+    breaker.release()  # cancelled trial: the next caller may try
+    assert breaker.begin()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.begin()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.begin() and breaker.begin()
+
+
+def test_concurrent_burst_sends_one_trial_to_a_half_open_provider():
+    """A burst after the cooldown probes a recovering provider with one request only."""
+
+    class Flaky:
+        calls = 0
+
+        async def acomplete(self, question, contexts, stream=False):
+            Flaky.calls += 1
+            await asyncio.sleep(0.05)
+            raise RuntimeError("still down")
+
+    class Ok:
+        async def acomplete(self, question, contexts, stream=False):
+            return "ok"
+
+    llm = FailoverLLM(
+        [("flaky", Flaky()), ("ok", Ok())],
+        hedge=False,
+        breaker_failures=1,
+        breaker_cooldown=0.05,
+    )
+    assert asyncio.run(llm.acomplete("q", [])) == "ok"
+    time.sleep(0.06)
+
+    async def burst():
+        return await asyncio.gather(*(llm.acomplete("q", []) for _ in range(5)))
+
+    assert asyncio.run(burst()) == ["ok"] * 5
+    assert Flaky.calls == 2, "one call tripped the breaker, one half-open trial"
+
+
+def test_cancelled_forced_attempt_keeps_another_requests_trial():
+    """Only the attempt that claimed a half-open trial frees it when cancelled."""
+
+    class Slow:
+        async def acomplete(self, question, contexts, stream=False):
+            await asyncio.sleep(0.2)
+            return "ok"
+
+    llm = FailoverLLM([("slow", Slow())], hedge=False, breaker_failures=1, breaker_cooldown=0.01)
+    breaker = llm.providers[0].breaker
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    async def scenario():
+        trial = asyncio.create_task(llm.acomplete("q", []))
+        await asyncio.sleep(0)
+        assert breaker.trial
+        # no breaker allows a call, so this request bypasses them and is then cancelled
+        forced = asyncio.create_task(llm.acomplete("q", []))
+        await asyncio.sleep(0.01)
+        forced.cancel()
+        await asyncio.gather(forced, return_exceptions=True)
+        assert breaker.trial and not breaker.allow(), "trial slot still held by the first call"
+        return await trial
+
+    assert asyncio.run(scenario()) == "ok"
+    assert breaker.state == "closed"
@@ -0,0 +1,23 @@
+"""Hybrid score fusion."""
+
+import numpy as np
+import pytest
+
+from src.rag.fusion import Ranked, fuse
+
+
+def test_fusion_methods_on_row_arrays():
+    """Fusion aligns rows across stages; RRF ignores score scales, unknown methods fail."""
+    vec = Ranked(np.array([5, 2, 9]), np.array([0.9, 0.8, 0.1], np.float32), np.zeros(3))
+    bm25 = Ranked(np.array([2, 7]), np.array([1.0, 0.5], np.float32), np.array([12.0, 6.0]))
+
+    weighted = fuse(vec, bm25, 0.5)
+    assert weighted.rows.tolist()[0] == 2, "a row found by both stages should rank first"
+    assert weighted.in_vec.tolist() == [True, True, False, True]
+    assert weighted.bm25_raw[0] == 12.0
+
+    rrf = fuse(vec, bm25, 0.5, "rrf", limit=2)
+    assert rrf.rows.tolist() == [2, 5]
+    assert np.isclose(rrf.combined[0], 0.5 / 62 + 0.5 / 61)
+    with pytest.raises(ValueError):
+        fuse(vec, bm25, 0.5, "bogus")
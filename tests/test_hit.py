@@ -0,0 +1,25 @@
+"""Lazy retrieval hits."""
+
+import pytest
+
+from src.rag.hit import Hit
+
+
+def test_hit_reads_metadata_lazily():
+    """Hits reference the store metadata and only become dicts at the API boundary."""
+    metas = [{"hash": "h0", "content": "线性规划", "source": "a.pdf", "minhash": "00"}]
+    hit = Hit(metas, 0, 0.8, bm25_raw=3.5)
+    assert hit["content"] == "线性规划" and hit.get("source") == "a.pdf"
+    assert "bm25_raw" in hit and "combined" not in hit
+    with pytest.raises(KeyError):
+        hit["combined"]
+    metas[0]["content"] = "整数规划"
+    assert hit.content == "整数规划", "content is read from the shared metadata, not copied"
+    assert hit.to_dict() == {
+        "score": 0.8,
+        "hash": "h0",
+        "content": "整数规划",
+        "source": "a.pdf",
+        "row": 0,
+        "bm25_raw": 3.5,
+    }
@@ -0,0 +1,18 @@
+"""Pooled HTTP clients."""
+
+import asyncio
+
+from src.rag.http_pool import aclose_clients, async_client
+
+
+def test_http_pool_reuses_clients_per_loop():
+    """Providers share one keep-alive client per (event loop, name)."""
+
+    async def run():
+        first, again, other = async_client("x"), async_client("x"), async_client("y")
+        await aclose_clients()
+        return first, again, other
+
+    first, again, other = asyncio.run(run())
+    assert first is again and first is not other
+    assert first.is_closed
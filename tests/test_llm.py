@@ -0,0 +1,144 @@
+"""LLM provider wrappers against mocked HTTP transports."""
+
+import asyncio
+import json
+import time
+
+import httpx
+
+from src.rag import http_pool, llm
+
+
+def test_gemini_astream_parses_sse_and_falls_back_to_v1beta(monkeypatch):
+    """Text parts are yielded per SSE event; a v1 400 retries on v1beta and sticks."""
+
+    def handler(request):
+        if "/v1/" in str(request.url):
+            return httpx.Response(400, text="Unknown name systemInstruction")
+        assert "systemInstruction" in json.loads(request.content)
+        events = "".join(
+            "data: " + json.dumps({"candidates": [{"content": {"parts": [{"text": t}]}}]}) + "\n\n"
+            for t in ("线性", "规划")
+        )
+        return httpx.Response(200, text=events)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(llm, "async_client", lambda name: client)
+    gemini = llm.GeminiLLM("key", "gemini-2.5-pro")
+
+    async def collect():
+        return [delta async for delta in gemini.astream("问题", [{"content": "c"}])]
+
+    assert asyncio.run(collect()) == ["线性", "规划"]
+    assert gemini._use_beta_by_default
+
+
+def test_ollama_sends_keep_alive_and_options_and_reports_timings(monkeypatch):
+    """Streamed chat requests carry keep_alive/options; the final line's timings are emitted."""
+    monkeypatch.setenv("OLLAMA_NUM_CTX", "8192")
+    seen, metrics = [], []
+
+    def handler(request):
+        seen.append(json.loads(request.content))
+        lines = [
+            {"message": {"content": "线性"}, "done": False},
+            {"message": {"content": "规划"}, "done": False},
+            {"done": True, "total_duration": 9e8, "load_duration": 5e8, "eval_count": 2},
+        ]
+        return httpx.Response(200, text="\n".join(json.dumps(x) for x in lines))
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(llm, "async_client", lambda name: client)
+    monkeypatch.setattr(llm, "emit_metric", lambda name, **kw: metrics.append((name, kw)))
+    ollama = llm.OllamaLLM("qwen2.5:7b", keep_alive="1h", options={"num_thread": 4})
+
+    assert asyncio.run(ollama.acomplete("问题", [{"content": "c"}], stream=True)) == "线性规划"
+    payload = seen[0]
+    assert payload["keep_alive"] == "1h"
+    assert payload["options"] == {"num_ctx": 8192, "num_thread": 4}
+    assert payload["messages"][0] == {"role": "system", "content": llm.SYSTEM_PROMPT}
+    assert metrics == [("ollama_timing", metrics[0][1])] and metrics[0][1]["load_ms"] == 500.0
+
+
+def test_ollama_keep_warm_is_opt_in_and_pauses_when_idle(monkeypatch):
+    """Only keep_warm() starts pinging; pings stop when idle and resume on the next ask."""
+    pings = []
+
+    def handler(request):
+        pings.append(json.loads(request.content))
+        return httpx.Response(200, json={"load_duration": 0})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(http_pool, "sync_client", lambda name: client)
+    monkeypatch.setenv("OLLAMA_PING_INTERVAL", "0.02")
+    monkeypatch.setenv("OLLAMA_KEEPWARM_IDLE", "0.1")
+    base = "http://keepwarm-test:11434"
+    key = (base, "qwen2.5:7b")
+
+    ollama = llm.OllamaLLM("qwen2.5:7b", base_url=base)
+    assert key not in llm._OllamaKeepWarm._threads, "one-shot use starts no thread"
+
+    ollama.keep_warm()
+    thread = llm._OllamaKeepWarm._threads[key]
+    thread.join(2)
+    assert not thread.is_alive(), "pinging stops after the idle period"
+    assert pings and pings[0] == {"model": "qwen2.5:7b", "keep_alive": "30m"}
+
+    count = len(pings)
+    llm._OllamaKeepWarm.touch(base, "qwen2.5:7b")
+    assert llm._OllamaKeepWarm._threads[key].is_alive(), "a real request resumes it"
+    time.sleep(0.06)
+    assert len(pings) > count
+
+
+class _SpyLimiter:
+    completion_reserve = 100
+
+    def __init__(self):
+        self.acquired, self.settled = [], []
+
+    async def acquire(self, tokens):
+        self.acquired.append(tokens)
+
+    def observe(self, headers, status_code=200):
+        pass
+
+    def settle(self, estimated, actual):
+        self.settled.append((estimated, actual))
+
+
+def test_streamed_answers_settle_their_token_estimate(monkeypatch):
+    """Streams are admitted once and settle with reported usage, else emitted tokens."""
+    spy = _SpyLimiter()
+    monkeypatch.setattr(llm, "get_limiter", lambda provider: spy)
+
+    def gemini(request):
+        if "/v1/" in str(request.url):
+            return httpx.Response(400, text="Unknown name systemInstruction")
+        events = [
+            {"candidates": [{"content": {"parts": [{"text": "线性"}]}}]},
+            {"candidates": [{"content": {"parts": []}}], "usageMetadata": {"totalTokenCount": 42}},
+        ]
+        return httpx.Response(200, text="".join(f"data: {json.dumps(e)}\n\n" for e in events))
+
+    def openrouter(request):
+        events = [{"choices": [{"delta": {"content": t}}]} for t in ("线性", "规划")]
+        lines = [f"data: {json.dumps(e)}" for e in events] + ["data: [DONE]"]
+        return httpx.Response(200, text="\n".join(lines))
+
+    clients = {
+        "gemini": httpx.AsyncClient(transport=httpx.MockTransport(gemini)),
+        "openrouter": httpx.AsyncClient(transport=httpx.MockTransport(openrouter)),
+    }
+    monkeypatch.setattr(llm, "async_client", lambda name: clients[name])
+
+    async def collect(model):
+        return "".join([d async for d in model.astream("问题", [{"content": "c"}])])
+
+    assert asyncio.run(collect(llm.GeminiLLM("key", "gemini-2.5-pro"))) == "线性"
+    assert len(spy.acquired) == 1, "the v1beta retry is not charged again"
+    assert spy.settled == [(spy.acquired[0], 42)]
+
+    assert asyncio.run(collect(llm.OpenRouterLLM("key", "m"))) == "线性规划"
+    estimated, actual = spy.settled[1]
+    assert estimated == spy.acquired[1] and actual < estimated, "counted from emitted tokens"
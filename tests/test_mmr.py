@@ -0,0 +1,14 @@
+"""Maximal marginal relevance selection."""
+
+import numpy as np
+
+from src.rag.mmr import mmr_select
+
+
+def test_mmr_select_prefers_diverse_candidates():
+    """MMR skips a near-copy of the top hit in favour of a different relevant one."""
+    vectors = np.array([[1.0, 0.0], [0.999, 0.045], [0.0, 1.0]], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    relevance = np.array([0.9, 0.89, 0.6], dtype=np.float32)
+    assert mmr_select(relevance, vectors, 2, lam=0.5) == [0, 2]
+    assert mmr_select(relevance, vectors, 2, lam=1.0) == [0, 1], "lambda=1 is pure relevance"
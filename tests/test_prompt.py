@@ -0,0 +1,17 @@
+"""Prompt building and context packing."""
+
+from src.rag.prompt import build_user_prompt, estimate_tokens, pack_contexts
+
+
+def test_prompt_packs_best_contexts_into_budget_at_sentence_ends():
+    """Higher-scoring contexts go in first, trimmed after a full stop; refs keep positions."""
+    contexts = [
+        {"content": "线性规划研究约束下的最优解。" * 40, "source": "a", "score": 0.5},
+        {"content": "层次分析法用于综合评价。", "source": "b", "score": 0.9},
+        {"content": "x" * 4000, "source": "c", "score": 0.1},
+    ]
+    packed = pack_contexts(contexts, budget=200, per_context=150)
+    assert [(ref, src) for ref, src, _ in packed] == [(1, "a"), (2, "b")]
+    assert packed[0][2].endswith("。") and estimate_tokens(packed[0][2]) <= 150
+    prompt = build_user_prompt("很长的问题" * 100, contexts, budget=200)
+    assert "很长的问题" * 100 in prompt, "the question is never truncated"
@@ -0,0 +1,51 @@
+"""Per-provider LLM rate limiting."""
+
+import asyncio
+import threading
+import time
+
+from src.rag.rate_limit import BATCH, ProviderLimiter, priority
+
+
+def test_rate_limiter_serves_interactive_before_batch_and_honors_429():
+    """Queued interactive calls outrank batch calls; Retry-After blocks the provider."""
+
+    async def run():
+        limiter = ProviderLimiter("test", rpm=1200)  # one request per 50ms once drained
+        limiter.requests.level = 0
+        order = []
+
+        async def call(tag, level):
+            with priority(level):
+                await limiter.acquire(10)
+            order.append(tag)
+
+        batch = [asyncio.create_task(call(f"b{i}", BATCH)) for i in range(3)]
+        await asyncio.sleep(0)
+        await asyncio.gather(*batch, call("interactive", 0))
+        limiter.observe({"Retry-After": "0.2"}, 429)
+        t0 = time.monotonic()
+        await limiter.acquire()
+        return order, time.monotonic() - t0
+
+    order, blocked = asyncio.run(run())
+    assert order[0] == "interactive"
+    assert blocked >= 0.15
+
+
+def test_rate_limiter_queues_per_event_loop():
+    """Callers waiting on different event loops (threads) are each woken on their own loop."""
+    limiter = ProviderLimiter("loops", rpm=1200)  # one request per 50ms once drained
+    limiter.requests.level = 0
+    waited = {}
+
+    def worker(name):
+        waited[name] = asyncio.run(asyncio.wait_for(limiter.acquire(), timeout=2))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in ("a", "b", "c")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert sorted(waited) == ["a", "b", "c"] and max(waited.values()) < 1
+    assert limiter.stats()["queued"] == 0
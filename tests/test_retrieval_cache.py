@@ -0,0 +1,49 @@
+"""Retrieval result cache keyed by query and store generation."""
+
+import asyncio
+import json
+
+from src.rag.retrieval_cache import RetrievalCache, make_key
+
+
+def test_retrieval_cache_lru_ttl_and_generation():
+    """Cache keys change with the store generation; LRU and TTL bounds are enforced."""
+    assert make_key("层次 分析法", 6, 0.35, None, "3-a") == make_key(
+        " 层次  分析法 ", 6, 0.35, None, "3-a"
+    )
+    assert make_key("层次分析法", 6, 0.35, None, "3-a") != make_key(
+        "层次分析法", 6, 0.35, None, "4-b"
+    )
+
+    cache = RetrievalCache(max_entries=2, ttl=60)
+    docs = [{"hash": "h1", "content": "x", "vector": [0.1] * 8}]
+
+    async def run():
+        await cache.aset("a", docs)
+        await cache.aset("b", docs)
+        assert await cache.aget("a") == [{"hash": "h1", "content": "x"}], "vectors are not cached"
+        await cache.aset("c", docs)  # evicts least recently used "b"
+        assert await cache.aget("b") is None
+        cache.ttl = -1
+        await cache.aset("d", docs)
+        assert await cache.aget("d") is None, "expired entries should miss"
+
+    asyncio.run(run())
+    assert cache.stats()["hits"] == 1
+
+
+def test_retrieval_cache_byte_bound_counts_encoded_bytes():
+    """CJK content takes three UTF-8 bytes per character against the byte bound."""
+    docs = [{"hash": "h", "content": "层次分析法" * 20}]
+    size = len(RetrievalCache._dumps(docs))
+    assert size > len(json.dumps(docs, ensure_ascii=False)) + 150
+
+    cache = RetrievalCache(max_bytes=size * 2 - 1)
+
+    async def run():
+        await cache.aset("a", docs)
+        await cache.aset("b", docs)
+        return await cache.aget("a"), await cache.aget("b")
+
+    assert asyncio.run(run()) == (None, docs), "two entries exceed the byte bound"
+    assert cache.stats()["bytes"] == size
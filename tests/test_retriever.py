@@ -0,0 +1,213 @@
+"""Retriever query planning and budgeted hybrid retrieval."""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.rag import retriever as retriever_module
+from src.rag.retriever import Retriever
+from src.rag.vector_store import FaissStore
+
+
+def _store(tmp_path):
+    store = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl")
+    texts = ["线性规划求解优化问题", "层次分析法构造判断矩阵", "时间序列预测方法"]
+    store.add(np.eye(3, 4).tolist(), [{"hash": f"h{i}", "content": t} for i, t in enumerate(texts)])
+    return store
+
+
+def test_query_plan_single_pass_and_cached():
+    """A question is analyzed once; stages share the plan and repeats hit the LRU."""
+    retriever = Retriever(SimpleNamespace(_metas=[]), embed=None, k=4)
+    plan = retriever.plan("如何建立优化模型？")
+    assert plan.normalized == "如何建立优化模型"
+    assert plan.search_tokens and plan.tokens, "tokens should be computed up front"
+    assert "线性规划" in plan.expansion_terms
+    assert plan.vector_text.startswith(plan.normalized)
+    assert 4 <= plan.adaptive_k <= 8
+    assert retriever.plan("如何建立优化模型？") is plan, "repeat queries reuse the cached plan"
+
+    filtered = retriever.plan("优化", filters={"source": ["a.pdf", "b.pdf"]})
+    assert filtered.matches({"source": "a.pdf"}) and not filtered.matches({"source": "c.pdf"})
+
+
+def test_retrieval_degrades_to_bm25_when_embedding_misses_budget(tmp_path):
+    """A late query embedding yields BM25-only contexts flagged as degraded."""
+
+    class SlowEmbed:
+        def embed_query(self, text):
+            time.sleep(0.5)
+            return [1.0, 0.0, 0.0, 0.0]
+
+    retriever = Retriever(_store(tmp_path), SlowEmbed(), k=2)
+
+    start = time.perf_counter()
+    hits = retriever.get_relevant("层次分析法", budget=0.05)
+    assert time.perf_counter() - start < 0.4, "retrieval should not wait for the embedding"
+    assert hits.degraded == "embed_timeout"
+    assert hits and hits[0]["hash"] == "h1"
+
+
+def test_embedding_and_bm25_stages_overlap(tmp_path, monkeypatch):
+    """Slow embedding and BM25 stages run side by side and are reported separately."""
+
+    class SlowEmbed:
+        def embed_query(self, text):
+            time.sleep(0.2)
+            return [0.0, 1.0, 0.0, 0.0]
+
+    retriever = Retriever(_store(tmp_path), SlowEmbed(), k=2)
+    lexical = retriever._lexical_stage
+
+    def slow_lexical(*args):
+        time.sleep(0.2)
+        return lexical(*args)
+
+    metrics = []
+    monkeypatch.setattr(retriever, "_lexical_stage", slow_lexical)
+    monkeypatch.setattr(
+        retriever_module, "emit_metric", lambda name, **kw: metrics.append((name, kw))
+    )
+
+    for run in (
+        lambda: retriever.get_relevant("层次分析法"),
+        lambda: asyncio.run(retriever.aget_relevant("判断矩阵")),
+    ):
+        start = time.perf_counter()
+        hits = run()
+        wall = time.perf_counter() - start
+        assert hits and wall < 0.35, "stages should overlap, not add up to 0.4s"
+        timings = metrics[-1][1]
+        assert timings["embed_ms"] >= 190 and timings["bm25_ms"] >= 190
+        assert timings["parallel_ms"] < timings["embed_ms"] + timings["bm25_ms"]
+        assert timings["overlap_ms"] >= 100
+
+
+def test_aget_relevant_matches_sync_and_degrades_within_budget(tmp_path):
+    """The async path ranks like the sync one and cancels an embedding past its slice."""
+
+    class Embed:
+        delay = 0.0
+
+        async def aembed_query(self, text):
+            await asyncio.sleep(self.delay)
+            return [0.0, 1.0, 0.0, 0.0]
+
+        def embed_query(self, text):
+            return [0.0, 1.0, 0.0, 0.0]
+
+    embed = Embed()
+    retriever = Retriever(_store(tmp_path), embed, k=2)
+    sync_hits = retriever.get_relevant("层次分析法")
+    retriever._qvec_cache = type(retriever._qvec_cache)(256)
+    async_hits = asyncio.run(retriever.aget_relevant("层次分析法"))
+    assert [h["hash"] for h in async_hits] == [h["hash"] for h in sync_hits]
+
+    embed.delay = 1.0
+    start = time.perf_counter()
+    hits = asyncio.run(retriever.aget_relevant("时间序列", budget=0.05))
+    assert time.perf_counter() - start < 0.5
+    assert hits.degraded == "embed_timeout" and hits[0]["hash"] == "h2"
+
+
+def test_aget_relevant_embed_slice_counts_planning_time(tmp_path):
+    """Time spent planning is taken out of the embedding's slice, as in the sync path."""
+
+    class Embed:
+        async def aembed_query(self, text):
+            await asyncio.sleep(0.1)
+            return [0.0, 1.0, 0.0, 0.0]
+
+    retriever = Retriever(_store(tmp_path), Embed(), k=2)
+    plan = retriever.plan
+
+    def slow_plan(*args):
+        time.sleep(0.2)
+        return plan(*args)
+
+    retriever.plan = slow_plan
+    hits = asyncio.run(retriever.aget_relevant("时间序列", budget=0.25))
+    assert hits.degraded == "embed_timeout"
+
+
+def test_selective_filter_finds_low_ranked_matches(tmp_path):
+    """Filters restrict candidate generation, so matches below the unfiltered top-k count."""
+    store = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl")
+    vectors = [[1.0, 0.1 * i, 0.0, 0.0] for i in range(10)] + [[0.3, 0.0, 1.0, 0.0]] * 2
+    metas = [{"hash": f"a{i}", "content": f"优化模型第{i}章", "source": "a.pdf"} for i in range(10)]
+    metas += [
+        {"hash": f"b{i}", "content": f"附录{i}：数据说明", "source": "b.pdf"} for i in range(2)
+    ]
+    store.add(vectors, metas)
+
+    class Embed:
+        def embed_query(self, text):
+            return [1.0, 0.0, 0.0, 0.0]
+
+    retriever = Retriever(store, Embed(), k=2)
+    filters = {"source": "b.pdf"}
+    for bm25_weight in (0.0, 0.3):
+        hits = retriever.get_relevant("优化模型", bm25_weight=bm25_weight, filters=filters)
+        assert sorted(h["hash"] for h in hits) == ["b0", "b1"], bm25_weight
+        hits = asyncio.run(
+            retriever.aget_relevant("优化模型", bm25_weight=bm25_weight, filters=filters)
+        )
+        assert sorted(h["hash"] for h in hits) == ["b0", "b1"], bm25_weight
+
+
+def test_hung_embeddings_do_not_starve_cpu_stages(tmp_path, monkeypatch):
+    """Embeddings past their budget keep only embed workers busy; BM25 still runs."""
+    release = threading.Event()
+
+    class HungEmbed:
+        def embed_query(self, text):
+            release.wait(5)
+            return [1.0, 0.0, 0.0, 0.0]
+
+    monkeypatch.setattr(retriever_module, "_SEARCH_POOL", ThreadPoolExecutor(1))
+    monkeypatch.setattr(retriever_module, "_EMBED_POOL", ThreadPoolExecutor(4))
+    retriever = Retriever(_store(tmp_path), HungEmbed(), k=2)
+    try:
+        for question in ("层次分析法", "判断矩阵", "时间序列"):
+            start = time.perf_counter()
+            hits = asyncio.run(retriever.aget_relevant(question, budget=0.05))
+            assert time.perf_counter() - start < 0.5
+            assert hits.degraded == "embed_timeout" and hits
+    finally:
+        release.set()
+
+
+def test_vector_only_skips_bm25_unless_falling_back(tmp_path, monkeypatch):
+    """bm25_weight=0 runs no lexical stage, except to rescue a missed embedding."""
+
+    class Embed:
+        delay = 0.0
+
+        def embed_query(self, text):
+            time.sleep(self.delay)
+            return [0.0, 1.0, 0.0, 0.0]
+
+    embed = Embed()
+    retriever = Retriever(_store(tmp_path), embed, k=2)
+    calls = []
+    lexical = retriever._lexical_stage
+
+    def counting_lexical(*args):
+        calls.append(args)
+        return lexical(*args)
+
+    monkeypatch.setattr(retriever, "_lexical_stage", counting_lexical)
+    assert retriever.get_relevant("层次分析法", bm25_weight=0)[0]["hash"] == "h1"
+    assert asyncio.run(retriever.aget_relevant("判断矩阵", bm25_weight=0))[0]["hash"] == "h1"
+    assert calls == []
+
+    embed.delay = 0.3
+    hits = retriever.get_relevant("时间序列", bm25_weight=0, budget=0.05)
+    assert hits.degraded == "embed_timeout" and hits[0]["hash"] == "h2"
+    hits = asyncio.run(retriever.aget_relevant("时间序列预测", bm25_weight=0, budget=0.05))
+    assert hits.degraded == "embed_timeout" and hits[0]["hash"] == "h2"
+    assert len(calls) == 2
@@ -0,0 +1,26 @@
+"""Semantic near-duplicate answer cache."""
+
+from src.rag.semantic_cache import SemanticCache
+
+
+def test_semantic_cache_threshold_and_context_set():
+    """Near-duplicate queries reuse answers only when the retrieved context set matches."""
+    cache = SemanticCache(threshold=0.9, max_entries=2)
+    cache.add([1.0, 0.0, 0.0], ["h1", "h2"], "answer-a")
+    assert cache.lookup([0.99, 0.05, 0.0], ["h2", "h1"]) == "answer-a"
+    assert cache.lookup([0.99, 0.05, 0.0], ["h1", "h3"]) is None, "contexts changed"
+    assert cache.lookup([0.0, 1.0, 0.0], ["h1", "h2"]) is None, "below threshold"
+
+    cache.add([0.0, 1.0, 0.0], ["h1"], "answer-b")
+    cache.add([0.0, 0.0, 1.0], ["h1"], "answer-c")  # evicts the least recently used entry
+    assert len(cache) == 2
+    assert cache.lookup([1.0, 0.0, 0.0], ["h1", "h2"]) is None
+    assert cache.lookup([0.0, 1.0, 0.0], ["h1"]) == "answer-b"
+
+
+def test_semantic_cache_entries_are_scoped_to_the_model():
+    """An answer cached for one provider/model is never served for another."""
+    cache = SemanticCache(threshold=0.9)
+    cache.add([1.0, 0.0], ["h1"], "from-a", scope="model-a")
+    assert cache.lookup([1.0, 0.0], ["h1"], scope="model-a") == "from-a"
+    assert cache.lookup([1.0, 0.0], ["h1"], scope="model-b") is None
@@ -0,0 +1,73 @@
+"""In-flight request coalescing."""
+
+import asyncio
+
+from src.rag.singleflight import SingleFlight, StreamFlight
+
+
+def test_singleflight_coalesces_calls_and_fans_out_streams():
+    """Concurrent identical calls run once; stream subscribers all see every delta."""
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def tokens():
+        calls.append(1)
+        for t in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield t
+
+    async def run():
+        flight = SingleFlight("t")
+        results = await asyncio.gather(*[flight.do("k", work) for _ in range(5)])
+        streams = StreamFlight("t")
+
+        async def collect(delay):
+            await asyncio.sleep(delay)
+            return "".join([t async for t in streams.subscribe("k", tokens)])
+
+        joined = await asyncio.gather(*[collect(d) for d in (0, 0, 0.015)])
+        return results, joined, flight.stats(), streams.stats()
+
+    results, joined, flight_stats, stream_stats = asyncio.run(run())
+    assert results == ["answer"] * 5 and joined == ["abc"] * 3, "late subscriber replays"
+    assert len(calls) == 2
+    assert flight_stats == {"leaders": 1, "followers": 4, "inflight": 0}
+    assert stream_stats["followers"] == 2
+
+
+def test_shared_stream_waits_for_its_slowest_subscriber():
+    """The upstream runs at most ``buffer`` items ahead of the slowest live reader."""
+    produced = []
+
+    async def tokens():
+        for i in range(50):
+            produced.append(i)
+            yield i
+
+    async def run():
+        streams = StreamFlight("t", buffer=4)
+        fast = streams.subscribe("k", tokens)
+        slow = streams.subscribe("k", tokens)
+        ahead = []
+
+        async def read_fast():
+            return [t async for t in fast]
+
+        async def read_slow():
+            out = []
+            async for t in slow:
+                out.append(t)
+                await asyncio.sleep(0.001)
+                ahead.append(len(produced) - len(out))
+            return out
+
+        results = await asyncio.gather(read_fast(), read_slow())
+        return results, max(ahead)
+
+    (fast, slow), max_ahead = asyncio.run(run())
+    assert fast == slow == list(range(50))
+    assert max_ahead <= 5, "bounded by the buffer (plus the item being handed over)"
@@ -0,0 +1,119 @@
+"""FAISS store: memory-mapped vectors, binary codes, PCA and the kNN graph."""
+
+import json
+
+import numpy as np
+import pytest
+
+from src.rag.vector_store import FaissStore, build_or_update
+
+
+def test_two_stage_exact_scoring_on_memmapped_vectors(tmp_path):
+    """Stage two scores only candidate rows and agrees with the flat index on them."""
+    rng = np.random.default_rng(0)
+    store = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl")
+    vecs = rng.normal(size=(20, 8)).astype("float32")
+    store.add(vecs.tolist(), [{"hash": f"h{i}", "content": str(i)} for i in range(20)])
+    store.persist()
+
+    reloaded = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl")
+    assert isinstance(reloaded.matrix(), np.memmap), "vectors should be memory-mapped on load"
+    query = vecs[3].tolist()
+    flat = {r["row"]: r["score"] for r in reloaded.search(query, 20)}
+    rows = np.array([3, 7, 11])
+    exact = reloaded.score_rows(query, rows)
+    assert np.allclose(exact, [flat[3], flat[7], flat[11]], atol=1e-5)
+
+
+def test_binary_prefilter_codes_persist_and_find_neighbours(tmp_path):
+    """Sign-bit codes are 1/32 of the float size, persisted, and rank the query's row first."""
+    rng = np.random.default_rng(1)
+    vecs = rng.normal(size=(50, 64)).astype("float32")
+    store = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl", binary=True)
+    store.add(vecs.tolist(), [{"hash": f"h{i}"} for i in range(50)])
+    store.persist()
+    assert store.binary_path.exists()
+
+    reloaded = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl")
+    assert reloaded.binary_index().code_size == 64 // 8
+    assert reloaded.binary_search(vecs[7].tolist(), 5)[0] == 7
+
+
+def test_pca_reduction_trains_persists_and_reranks(tmp_path):
+    """A PCA first pass keeps recall on low-rank data and is reloaded with the index."""
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(600, 8)) @ rng.normal(size=(8, 64))
+    store = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl", reduce="pca:16")
+    store.add(vecs.tolist(), [{"hash": f"h{i}"} for i in range(600)])
+    assert store.train_reduction(recall_queries=50) > 0.9
+    store.persist()
+
+    reloaded = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl", reduce="pca:16")
+    assert reloaded._reduced is not None and reloaded.dim == 64
+    rows, scores = reloaded.search_rows(vecs[3].tolist(), 3)
+    assert rows[0] == 3 and scores[0] == pytest.approx(1.0, abs=1e-4), "scores are full-width"
+
+
+def test_knn_graph_neighbors_exclude_self(tmp_path):
+    """The offline graph stores int32 ids / float16 scores and answers by chunk hash."""
+    vecs = np.array([[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [0, 0.9, 0.1]], dtype="float32")
+    store = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl")
+    store.add(vecs.tolist(), [{"hash": f"h{i}", "content": str(i)} for i in range(4)])
+    assert store.neighbors("h0") is None, "no graph built yet"
+    assert store.build_neighbors(n=2, batch=3) == 4
+    assert np.load(store.knn_ids_path).dtype == np.int32
+    assert np.load(store.knn_scores_path).dtype == np.float16
+    related = store.neighbors("h2", 1)
+    assert [h["hash"] for h in related] == ["h3"]
+    assert store.neighbors("missing") is None
+
+
+def test_knn_graph_is_remapped_after_a_rebuild_elsewhere(tmp_path):
+    """A graph rebuilt by another process (``cli knn``) is served without a restart."""
+    vecs = np.array([[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [0, 0.9, 0.1]], dtype="float32")
+    store = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl")
+    store.add(vecs.tolist(), [{"hash": f"h{i}", "content": str(i)} for i in range(4)])
+    store.persist()
+    store.build_neighbors(n=1)
+    assert len(store.neighbors("h0", 3)) == 1
+
+    FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl").build_neighbors(n=3)
+    assert len(store.neighbors("h0", 3)) == 3
+
+
+def test_legacy_chunks_get_signatures_backfilled_once(tmp_path):
+    """Chunks stored without a MinHash signature are signed at ingest and written back,
+    while plain loads leave the metadata file alone."""
+    store = FaissStore(tmp_path / "index.faiss", tmp_path / "meta.jsonl")
+    store.add(np.eye(2, 4).tolist(), [{"hash": "h0", "content": "线性规划"}, {"hash": "h1"}])
+    store.persist()
+    meta_path = tmp_path / "meta.jsonl"
+    before = meta_path.stat().st_mtime_ns
+
+    reloaded = FaissStore(tmp_path / "index.faiss", meta_path)
+    assert not any("minhash" in m for m in reloaded._metas)
+    assert meta_path.stat().st_mtime_ns == before, "loading must not rewrite metadata"
+
+    assert build_or_update([], reloaded, embed_model=None) == 0
+    assert all("minhash" in m for m in reloaded._metas)
+    saved = meta_path.read_text(encoding="utf-8").splitlines()
+    assert all("minhash" in json.loads(line) for line in saved), "persisted for the next load"
+    assert reloaded.backfill_signatures() == 0
+
+
+def test_generation_changes_on_rebuild_and_matches_across_loads(tmp_path):
+    """Rebuilding with the same chunks in another order still yields a new generation."""
+    paths = (tmp_path / "index.faiss", tmp_path / "meta.jsonl")
+    first = FaissStore(*paths)
+    metas = [{"hash": "a", "minhash": ""}, {"hash": "z", "minhash": ""}]
+    first.add(np.eye(2, 4).tolist(), metas)
+    unpersisted = first.generation
+    first.persist()
+    assert first.generation != unpersisted
+    assert FaissStore(*paths).generation == first.generation, "same files, same generation"
+
+    rebuilt = FaissStore(tmp_path / "other.faiss", tmp_path / "other.jsonl")
+    rebuilt.add(np.eye(2, 4)[::-1].tolist(), [dict(m) for m in metas])
+    rebuilt.index_path, rebuilt.meta_path = paths
+    rebuilt.persist()
+    assert FaissStore(*paths).generation != first.generation
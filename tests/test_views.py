@@ -0,0 +1,189 @@
+"""Async ask views: authentication, throttling and answer caching."""
+
+import asyncio
+import json
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import cache
+from django.test import RequestFactory
+from jose import jwt
+
+from backend.rag_api import auth, views
+from src.rag.retriever import Retriever
+from src.rag.semantic_cache import SemanticCache
+from src.rag.singleflight import StreamFlight
+
+
+@pytest.fixture
+def users_db(tmp_path, monkeypatch):
+    path = tmp_path / "users.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (username TEXT, is_admin INTEGER, is_active INTEGER)")
+    conn.execute("CREATE TABLE revoked_tokens (jti TEXT)")
+    conn.execute("INSERT INTO users VALUES ('alice', 0, 1)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv("AUTH_DB_PATH", str(path))
+    cache.clear()
+
+
+def _get(path, token=None):
+    headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+    return RequestFactory().get(path, **headers)
+
+
+def _post(token=None):
+    headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+    return RequestFactory().post("/api/ask", data="{}", content_type="application/json", **headers)
+
+
+def test_jwt_callers_get_the_user_throttle_scope(users_db):
+    """Logged-in callers are throttled at the user rate, anonymous ones per IP."""
+    view = views.AskView()
+    token = jwt.encode({"sub": "alice"}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+
+    requests = [_post(token) for _ in range(4)]
+    assert [views._guard(r, view) is None for r in requests] == [True, True, True, False]
+    assert requests[0].user.username == "alice"
+
+    assert views._guard(_post(), view) is None
+    assert views._guard(_post(), view).status_code == 429, "anon rate is 1/min in tests"
+    assert views._guard(_post("not-a-jwt"), view).status_code == 403
+
+
+def test_semantic_probe_reuses_the_retrieval_vector(monkeypatch):
+    """The semantic cache is only probed with a vector retrieval already embedded."""
+
+    class CountingEmbed:
+        calls = 0
+
+        def embed_query(self, text):
+            CountingEmbed.calls += 1
+            return [1.0, 0.0]
+
+    retriever = Retriever(SimpleNamespace(_metas=[]), CountingEmbed(), k=2)
+    monkeypatch.setattr(views, "_get_retriever", lambda: retriever)
+    monkeypatch.setitem(views._GLOBAL, "semantic_cache", SemanticCache())
+
+    # a retrieval-cache hit: nothing was embedded, so the semantic tier is skipped
+    assert asyncio.run(views._semantic_vector("线性规划", [])) is None
+    assert CountingEmbed.calls == 0
+
+    retriever.query_vector("线性规划")
+    assert asyncio.run(views._semantic_vector("线性规划", [])) == [1.0, 0.0]
+    assert CountingEmbed.calls == 1
+
+
+def test_related_is_authenticated_and_throttled(users_db, monkeypatch):
+    """The related-chunks endpoint goes through DRF auth and throttling like its peers."""
+    store = SimpleNamespace(
+        row_of=lambda h: 0 if h == "h0" else None,
+        neighbors=lambda h, n: [],
+    )
+    monkeypatch.setattr(views, "_ensure_components", lambda: None)
+    monkeypatch.setitem(views._GLOBAL, "store", store)
+
+    assert views.related(_get("/api/related/h0"), chunk_hash="h0").status_code == 200
+    assert views.related(_get("/api/related/h0"), chunk_hash="h0").status_code == 429
+    assert views.related(_get("/api/related/h0", "bad"), chunk_hash="h0").status_code == 403
+    token = jwt.encode({"sub": "alice"}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+    assert views.related(_get("/api/related/x", token), chunk_hash="x").status_code == 404
+
+
+class ScriptedLLM:
+    """``astream`` yields each delta after its delay and records when it is closed."""
+
+    provider, model = "scripted", "test"
+
+    def __init__(self, script):
+        self.script = script
+        self.closed = False
+
+    async def astream(self, question, docs):
+        try:
+            for delay, delta in self.script:
+                await asyncio.sleep(delay)
+                yield delta
+        finally:
+            self.closed = True
+
+
+@pytest.fixture
+def stream_llm(monkeypatch):
+    def install(script):
+        llm = ScriptedLLM(script)
+        for name, value in (
+            ("llm", llm),
+            ("answer_cache", None),
+            ("semantic_cache", None),
+            ("stream_flight", StreamFlight("test")),
+        ):
+            monkeypatch.setitem(views._GLOBAL, name, value)
+        return llm
+
+    monkeypatch.setenv("ASK_STREAM_PING_SECONDS", "0.05")
+    return install
+
+
+def _event(raw):
+    return json.loads(raw[len("data: ") :]) if raw.startswith("data: ") else raw.strip()
+
+
+def test_stream_events_forward_deltas_with_keepalive(stream_llm):
+    """Contexts come first, deltas are forwarded as they arrive, pings fill the gaps."""
+    stream_llm([(0, "线性"), (0.2, "规划")])
+
+    async def collect():
+        t0 = time.perf_counter()
+        out = []
+        async for raw in views._stream_events("q", [], {"type": "contexts", "data": []}):
+            out.append((time.perf_counter() - t0, _event(raw)))
+        return out
+
+    events = asyncio.run(collect())
+    kinds = [e if isinstance(e, str) else e["type"] for _, e in events]
+    assert kinds[0] == "contexts" and kinds[-1] == "end"
+    chunks = [(t, e["data"]) for t, e in events if isinstance(e, dict) and e["type"] == "chunk"]
+    assert [d for _, d in chunks] == ["线性", "规划"]
+    assert chunks[0][0] < 0.1, "the first delta is not held back for the rest"
+    first, second = kinds.index("chunk"), len(kinds) - 2
+    assert ": ping" in kinds[first:second], "keep-alive while the LLM is silent"
+
+
+def test_stream_events_disconnect_cancels_the_producer(stream_llm):
+    """Closing the SSE body mid-answer stops the upstream LLM stream."""
+    llm = stream_llm([(0, "a"), (10, "b")])
+
+    async def disconnect_after_first_chunk():
+        events = views._stream_events("q", [], {"type": "contexts", "data": []})
+        async for raw in events:
+            if _event(raw) != ": ping" and _event(raw)["type"] == "chunk":
+                break
+        await events.aclose()
+        for _ in range(50):
+            if llm.closed:
+                break
+            await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    asyncio.run(disconnect_after_first_chunk())
+    assert llm.closed and time.perf_counter() - start < 1
+
+
+def test_stream_events_timeout_ends_with_an_error_event(stream_llm, monkeypatch):
+    """ASK_TIMEOUT bounds the whole answer and is reported as an error event."""
+    monkeypatch.setenv("ASK_TIMEOUT", "1")
+    stream_llm([(0, "a"), (10, "b")])
+
+    async def collect():
+        return [
+            _event(raw)
+            async for raw in views._stream_events("q", [], {"type": "contexts", "data": []})
+        ]
+
+    events = [e for e in asyncio.run(collect()) if e != ": ping"]
+    assert [e["type"] for e in events] == ["contexts", "chunk", "error", "end"]
+    assert events[2]["detail"] == "llm_timeout after 1s"